@@ -0,0 +1,311 @@
+"""
+Client-side admission control for Groq's per-minute request (RPM) and token (TPM) quotas.
+
+Every upstream call reserves one request and its estimated token cost (prompt tokens
+plus max_tokens) from two token buckets before it is sent. A call that fits is sent at
+once; one that would fit within the caller's wait budget is queued for exactly that
+long; anything else is rejected locally with a Retry-After instead of spending a
+round-trip on a 429. Once the call returns, the reservation is settled against the
+token usage Groq reports.
+
+The buckets learn from Groq's response headers: x-ratelimit-limit-tokens sets the TPM
+capacity, x-ratelimit-remaining-tokens pulls the local level down to the server's view,
+and an exhausted window (remaining 0, or a 429 with retry-after) blocks admission until
+it resets. Groq reports its request window per day, so the RPM capacity itself always
+comes from GROQ_RPM_LIMIT. The headers of a response arrive before its usage is known, so
+the server's view is kept (refilling like the bucket) and applied again after every
+settlement: tokens the server has already counted are never credited back a second time.
+
+Groq's quotas are per model, so ModelAdmission keeps one controller per model. Each
+controller's bucket state lives in a small file guarded by fcntl.flock, so all gunicorn
+workers on a host draw from the same budget. Where fcntl is unavailable the state is
+kept per process.
+"""
+import contextlib
+import json
+import os
+import struct
+import logging
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+    SHARED_STATE_AVAILABLE = True
+except ImportError:
+    SHARED_STATE_AVAILABLE = False
+
+from prompt_budget import estimate_tokens
+from upstream_retry import headers_retry_after, parse_duration
+
+log = logging.getLogger("edugen.admission")
+
+# requests level, tokens level, last refill, RPM capacity, TPM capacity, blocked until,
+# last x-ratelimit-remaining-tokens, when it was seen
+_STATE = struct.Struct("<8d")
+
+
+def estimate_request_tokens(request_kwargs):
+    """Estimated quota cost of a chat completion call: prompt tokens plus max_tokens."""
+    prompt_tokens = sum(estimate_tokens(message["content"]) for message in request_kwargs["messages"])
+    return prompt_tokens + request_kwargs.get("max_tokens", 0)
+
+
+def estimate_usage(request_kwargs, completion_text):
+    """Estimated tokens used by a finished call whose usage Groq did not report."""
+    return estimate_request_tokens(dict(request_kwargs, max_tokens=0)) + estimate_tokens(completion_text)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a call cannot be admitted within the caller's wait budget."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"upstream quota exhausted locally; retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class _LocalState:
+    """In-process fallback for platforms without fcntl."""
+
+    def __init__(self):
+        self._values = None
+
+    def read(self):
+        return self._values
+
+    def write(self, values):
+        self._values = values
+
+    def locked(self):
+        return contextlib.nullcontext()
+
+
+class _FileState:
+    """Bucket state in a fixed-size file, locked with flock across processes."""
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+
+    def read(self):
+        data = os.pread(self._fd, _STATE.size, 0)
+        return _STATE.unpack(data) if len(data) == _STATE.size else None
+
+    def write(self, values):
+        os.pwrite(self._fd, _STATE.pack(*values), 0)
+
+    def locked(self):
+        return _FileLock(self._fd)
+
+
+class _FileLock:
+    def __init__(self, fd):
+        self._fd = fd
+
+    def __enter__(self):
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return False
+
+
+class AdmissionController:
+    """Two token buckets (requests and tokens per minute), optionally shared through a file."""
+
+    def __init__(self, rpm_limit, tpm_limit, state_file=None):
+        self.default_rpm = float(rpm_limit)
+        self.default_tpm = float(tpm_limit)
+        # flock is held per open file, so threads of one process also need their own lock.
+        self._lock = threading.Lock()
+        if state_file and SHARED_STATE_AVAILABLE:
+            self._state = _FileState(state_file)
+            self.state_file = state_file
+        else:
+            if state_file:
+                log.warning("fcntl is not available; upstream admission state is per process")
+            self._state = _LocalState()
+            self.state_file = None
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.queue_wait = 0.0
+
+    @property
+    def enabled(self):
+        return self.default_rpm > 0 and self.default_tpm > 0
+
+    def _load(self, now):
+        """Reads the state and refills both buckets up to now. Caller holds the locks."""
+        values = self._state.read()
+        if values is None:
+            return [self.default_rpm, self.default_tpm, now, self.default_rpm, self.default_tpm, 0.0,
+                    self.default_tpm, 0.0]
+        requests, tokens, updated, _, tpm, blocked_until, server_tokens, server_seen = values
+        rpm = self.default_rpm  # never learned, so the configured value always wins
+        elapsed = max(0.0, now - updated)
+        requests = min(rpm, requests + elapsed * rpm / 60)
+        tokens = min(tpm, tokens + elapsed * tpm / 60)
+        return [requests, tokens, now, rpm, tpm, blocked_until, server_tokens, server_seen]
+
+    def reserve(self, tokens, max_wait):
+        """Reserves one request and `tokens` tokens and returns how long the caller must wait
+        before sending, or raises AdmissionRejected if that would exceed max_wait seconds."""
+        if not self.enabled:
+            return 0.0
+        with self._lock, self._state.locked():
+            now = time.time()
+            state = self._load(now)
+            requests_level, tokens_level, _, rpm, tpm, blocked_until = state[:6]
+            tokens = min(tokens, tpm)  # a single oversized call must still be admissible
+            wait = max(
+                blocked_until - now,
+                (1 - requests_level) * 60 / rpm,
+                (tokens - tokens_level) * 60 / tpm,
+                0.0,
+            )
+            if wait > max_wait:
+                self._state.write(state)
+                self.rejected += 1
+                raise AdmissionRejected(wait)
+            state[0] -= 1
+            state[1] -= tokens
+            self._state.write(state)
+            self.admitted += 1
+            if wait > 0:
+                self.queued += 1
+                self.queue_wait += wait
+            return wait
+
+    def settle(self, reserved_tokens, used_tokens):
+        """Returns unused reserved tokens to the bucket (or charges the overrun).
+
+        The level never ends above the server's last reported remaining tokens (refilled
+        since): once observe() has pulled the level down to a view that already counts this
+        call, its reservation must not be credited back on top.
+        """
+        if not self.enabled or used_tokens is None:
+            return
+        with self._lock, self._state.locked():
+            now = time.time()
+            state = self._load(now)
+            server_level = state[6] + max(0.0, now - state[7]) * state[4] / 60
+            state[1] = min(state[4], server_level, state[1] + min(reserved_tokens, state[4]) - used_tokens)
+            self._state.write(state)
+
+    def observe(self, status_code, headers):
+        """Updates the buckets from the rate-limit headers of any Groq response."""
+        if not self.enabled or ("x-ratelimit-remaining-tokens" not in headers and status_code != 429):
+            return
+        with self._lock, self._state.locked():
+            now = time.time()
+            state = self._load(now)
+            limit_tokens = headers.get("x-ratelimit-limit-tokens")
+            if limit_tokens:
+                try:
+                    state[4] = max(1.0, float(limit_tokens))
+                except ValueError:
+                    pass
+            remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+            if remaining_tokens:
+                try:
+                    state[6], state[7] = float(remaining_tokens), now
+                    state[1] = min(state[1], state[6])
+                except ValueError:
+                    pass
+            for window in ("requests", "tokens"):
+                reset = parse_duration(headers.get(f"x-ratelimit-reset-{window}"))
+                if headers.get(f"x-ratelimit-remaining-{window}", "").strip() == "0" and reset is not None:
+                    state[5] = max(state[5], now + reset)
+            if status_code == 429:
+                retry_after = headers_retry_after(headers)
+                if retry_after is not None:
+                    state[5] = max(state[5], now + retry_after)
+            self._state.write(state)
+
+    def tpm_capacity(self):
+        """Current (possibly learned) tokens-per-minute limit; a single call can never cost more."""
+        if not self.enabled:
+            return float("inf")
+        with self._lock, self._state.locked():
+            return self._load(time.time())[4]
+
+    def stats(self):
+        if not self.enabled:
+            return {"enabled": False}
+        with self._lock, self._state.locked():
+            now = time.time()
+            requests_level, tokens_level, _, rpm, tpm, blocked_until = self._load(now)[:6]
+        return {
+            "enabled": True,
+            "shared_state": self.state_file,
+            "rpm_limit": rpm,
+            "tpm_limit": tpm,
+            "requests_available": round(requests_level, 2),
+            "tokens_available": round(tokens_level),
+            "blocked_for_seconds": round(max(0.0, blocked_until - now), 3),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "queue_wait_seconds": round(self.queue_wait, 3),
+        }
+
+
+def default_state_file():
+    return os.getenv("GROQ_ADMISSION_STATE_FILE") or os.path.join(tempfile.gettempdir(), "edugen-groq-admission.bin")
+
+
+def _request_model(request):
+    try:
+        return json.loads(request.content).get("model")
+    except (ValueError, AttributeError):
+        return None
+
+
+class ModelAdmission:
+    """One AdmissionController per Groq model, created on first use.
+
+    limits maps a model to {"rpm": ..., "tpm": ...}; other models use the defaults. With a
+    state_file, each model's state goes to "<state_file>.<model>".
+    """
+
+    def __init__(self, rpm_limit, tpm_limit, state_file=None, limits=None):
+        self.rpm_limit = rpm_limit
+        self.tpm_limit = tpm_limit
+        self.state_file = state_file
+        self.limits = limits or {}
+        self._controllers = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.rpm_limit > 0 and self.tpm_limit > 0
+
+    def for_model(self, model):
+        controller = self._controllers.get(model)
+        if controller is None:
+            with self._lock:
+                controller = self._controllers.get(model)
+                if controller is None:
+                    limits = self.limits.get(model, {})
+                    state_file = f"{self.state_file}.{model.replace('/', '_')}" if self.state_file else None
+                    controller = AdmissionController(
+                        rpm_limit=limits.get("rpm", self.rpm_limit) if self.enabled else 0,
+                        tpm_limit=limits.get("tpm", self.tpm_limit) if self.enabled else 0,
+                        state_file=state_file,
+                    )
+                    self._controllers[model] = controller
+        return controller
+
+    def observe_response(self, response):
+        """httpx response hook: feeds rate-limit headers to the controller of the request's model."""
+        if not self.enabled:
+            return
+        model = _request_model(response.request)
+        if model:
+            self.for_model(model).observe(response.status_code, response.headers)
+
+    def stats(self):
+        return {model: controller.stats() for model, controller in list(self._controllers.items())}
@@ -1,29 +1,87 @@
-from flask import Flask, request, jsonify
+from flask import Flask, g, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 import os
+import asyncio
+import contextvars
+import functools
+import hmac
 import json
-import io
-import base64
-import random
+import logging
+import math
+import time
+import tempfile
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from groq import Groq
-
-# Document processing imports
-try:
-    import PyPDF2
-    from docx import Document
-    DOCUMENT_PROCESSING_ENABLED = True
-except ImportError:
-    DOCUMENT_PROCESSING_ENABLED = False
-    print("WARNING: PyPDF2 or python-docx not found. PDF/DOCX features will be disabled.")
-    print("Install them with: pip install PyPDF2 python-docx")
+from groq import Groq, AsyncGroq
+
+from partial_json import IncrementalArrayParser
+from prompt_budget import PromptTooLarge, estimate_tokens, fit_to_budget
+from sampling_profiler import ProfilerBusy, SamplingProfiler
+from quiz_pool import QuizPool
+from quiz_warmer import QuizPoolWarmer
+import document_extraction
+import metrics
+import request_timing
+import structured_logging
+from circuit_breaker import CircuitBreaker, CircuitOpen
+from document_extraction import (
+    UnsupportedDocument,
+    decode_upload,
+    document_kind,
+    document_text,
+    load_document_modules,
+    parse_document,
+)
+from hedging import HedgeBudget, Hedger
+from model_router import ModelRouter, routing_table_from_env
+from near_duplicate import NearDuplicateIndex
+from output_budget import OutputBudget, OutputBudgets
+from response_cache import ResponseCache, cache_bypassed, make_cache_key
+from singleflight import AsyncSingleFlight, SingleFlight
+from admission import (
+    AdmissionRejected,
+    ModelAdmission,
+    default_state_file,
+    estimate_request_tokens,
+    estimate_usage,
+)
+from upstream_retry import (
+    CONNECTION,
+    RATE_LIMIT,
+    SERVER_ERROR,
+    TIMEOUT,
+    RetriesExhausted,
+    RetryPolicy,
+    begin_request,
+    classify_error,
+    current_attempt,
+    current_record,
+    end_request,
+    note_retry_after,
+    retry_after_hint,
+)
+from upstream_transport import build_async_http_client, build_http_client
+
+# Document processing libraries are only imported on first use (see
+# document_extraction.load_document_modules) to keep worker boot fast; here we just check
+# that they are installed.
+DOCUMENT_PROCESSING_ENABLED = document_extraction.AVAILABLE
 
 # Load environment variables
 from dotenv import load_dotenv
 load_dotenv()
 
+# Logs are queued to a background writer thread as JSON lines (see structured_logging.py).
+structured_logging.configure()
+log = logging.getLogger("edugen.app")
+
+if not DOCUMENT_PROCESSING_ENABLED:
+    log.warning("PyPDF2 or python-docx not found; PDF/DOCX features are disabled "
+                "(install them with: pip install PyPDF2 python-docx)")
+
 app = Flask(__name__)
 
 # --- Groq API Configuration ---
@@ -31,71 +89,101 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 if not GROQ_API_KEY:
     raise ValueError("Error: GROQ_API_KEY environment variable is not set.")
 
-# Aggressive proxy cleanup for Render deployment
-import os
-proxy_vars = [
-    'HTTP_PROXY', 'HTTPS_PROXY', 'http_proxy', 'https_proxy', 
-    'ALL_PROXY', 'all_proxy', 'NO_PROXY', 'no_proxy',
-    'REQUESTS_CA_BUNDLE', 'CURL_CA_BUNDLE'
-]
-for var in proxy_vars:
-    if var in os.environ:
-        del os.environ[var]
+# Models per call class (classify, chat, quiz, long_document); see model_router.py.
+routing_table = routing_table_from_env()
+
+# Client-side RPM/TPM budget per model, shared by all workers on this host. It learns the
+# real TPM limit and remaining quota from Groq's response headers; the routing table may
+# set "rpm"/"tpm" per model. GROQ_ADMISSION_ENABLED=false turns it off.
+GROQ_RPM_LIMIT = float(os.getenv("GROQ_RPM_LIMIT", "30"))
+GROQ_TPM_LIMIT = float(os.getenv("GROQ_TPM_LIMIT", "6000"))
+GROQ_ADMISSION_ENABLED = os.getenv("GROQ_ADMISSION_ENABLED", "true").lower() != "false"
+admission = ModelAdmission(
+    rpm_limit=GROQ_RPM_LIMIT if GROQ_ADMISSION_ENABLED else 0,
+    tpm_limit=GROQ_TPM_LIMIT if GROQ_ADMISSION_ENABLED else 0,
+    state_file=default_state_file(),
+    limits=routing_table["models"],
+)
+
+# A model only fits a call whose prompt plus max_tokens is within its per-minute token quota.
+model_router = ModelRouter(routing_table, fits=lambda model, tokens: tokens <= admission.for_model(model).tpm_capacity())
+
+# Shared, explicitly configured connection pools for the Groq clients. Proxy env vars
+# (which broke client creation on Render) are ignored by these clients instead of being
+# deleted from the environment.
+http_client, upstream_transport_stats = build_http_client(on_response=admission.observe_response)
+async_http_client, async_upstream_transport_stats = build_async_http_client(on_response=admission.observe_response)
 
 # Initialize Groq client
 def initialize_groq_client():
-    """Initialize Groq client with comprehensive error handling"""
+    """Initialize Groq client with comprehensive error handling. Makes no network call."""
     try:
-        print("🔧 Starting Groq client initialization...")
-        
         # Check API key
         if not GROQ_API_KEY:
             raise ValueError("GROQ_API_KEY is empty or None")
-        
-        print(f"✅ API key found (length: {len(GROQ_API_KEY)})")
-        
-        # Clear any proxy-related environment variables that might interfere
-        cleared_vars = []
-        for key in list(os.environ.keys()):
-            if 'proxy' in key.lower():
-                cleared_vars.append(key)
-                del os.environ[key]
-        
-        if cleared_vars:
-            print(f"🧹 Cleared proxy env vars: {cleared_vars}")
-        
-        # Import and check Groq version
-        from groq import Groq
+
         import groq
-        print(f"📦 Groq library version: {getattr(groq, '__version__', 'unknown')}")
-        
-        # Initialize with minimal parameters only
-        client = Groq(api_key=GROQ_API_KEY)
-        print("✅ Groq client initialized successfully")
-        
-        # Test with a simple call
-        test_response = client.chat.completions.create(
+
+        # Retries are scheduled by upstream_retry.RetryPolicy, not by the SDK.
+        client = Groq(api_key=GROQ_API_KEY, http_client=http_client, max_retries=0)
+        log.info("Groq client initialized", extra={"fields": {
+            "groq_version": getattr(groq, "__version__", "unknown"), "api_key_length": len(GROQ_API_KEY)}})
+        return client
+
+    except Exception:
+        log.exception("Groq client initialization failed")
+        raise
+
+client = initialize_groq_client()
+
+# Async client for the ASGI serving path (see asgi.py). Constructing it makes no network call.
+async_client = AsyncGroq(api_key=GROQ_API_KEY, http_client=async_http_client, max_retries=0)
+
+# --- Upstream Readiness ---
+# GROQ_WARMUP controls the first upstream round-trip, which used to block every boot:
+#   background (default) - test call on a daemon thread while the app already serves traffic
+#   lazy                 - no test call; the first successful real call marks the upstream ready
+#   blocking             - test call during import; boot fails if it fails
+#   off                  - never probe
+GROQ_WARMUP = os.getenv("GROQ_WARMUP", "background").lower()
+upstream_readiness = {"state": "pending", "warmup": GROQ_WARMUP, "error": None, "since": datetime.now().isoformat()}
+
+def _set_upstream_readiness(state, error=None):
+    upstream_readiness.update(state=state, error=error, since=datetime.now().isoformat())
+
+def mark_upstream_ready():
+    if upstream_readiness["state"] != "ready":
+        _set_upstream_readiness("ready")
+
+def warm_up_groq_client():
+    """Makes one tiny completion call and records the outcome in upstream_readiness."""
+    _set_upstream_readiness("warming")
+    started = time.perf_counter()
+    try:
+        client.chat.completions.create(
             model="llama-3.1-8b-instant",
             messages=[{"role": "user", "content": "test"}],
             max_tokens=5
         )
-        print("✅ Groq API test call successful")
-        
-        return client
-        
     except Exception as e:
-        print(f"❌ Groq initialization failed: {e}")
-        print(f"Error type: {type(e).__name__}")
-        print(f"Error details: {str(e)}")
-        import traceback
-        print(f"Full traceback: {traceback.format_exc()}")
-        raise
+        log.warning("Groq API warm-up call failed: %s", e)
+        _set_upstream_readiness("failed", str(e))
+        return False
+    log.info("Groq API warm-up call succeeded", extra={"fields": {"seconds": round(time.perf_counter() - started, 3)}})
+    mark_upstream_ready()
+    return True
+
+def _background_warm_up():
+    warm_up_groq_client()
+    # Import the document libraries now so the first upload does not pay for it.
+    if DOCUMENT_PROCESSING_ENABLED:
+        load_document_modules()
 
-try:
-    client = initialize_groq_client()
-except Exception as e:
-    print(f"❌ Failed to initialize Groq client: {e}")
-    raise
+if GROQ_WARMUP == "blocking":
+    if not warm_up_groq_client():
+        raise RuntimeError(f"Groq API warm-up call failed: {upstream_readiness['error']}")
+elif GROQ_WARMUP == "background":
+    threading.Thread(target=_background_warm_up, name="groq-warm-up", daemon=True).start()
 
 
 # --- Prompts ---
@@ -161,6 +249,43 @@ Your task is to answer the user's question accurately based *only* on the provid
 CORS(app, origins=["https://edugen-ai-zeta.vercel.app", "http://localhost:3000"],
      methods=["GET", "POST", "OPTIONS"], allow_headers=["Content-Type", "Authorization"])
 
+# Set RATELIMIT_ENABLED=false to turn off per-IP limits (e.g. for local load tests).
+app.config["RATELIMIT_ENABLED"] = os.getenv("RATELIMIT_ENABLED", "true").lower() != "false"
+
+# Per-request state is reset by before_request hooks registered here, ahead of the limiter's
+# own check: a request the limiter rejects skips every hook registered after it, and would
+# otherwise be answered with the state the previous request left on this thread.
+@app.before_request
+def start_request_log_context():
+    structured_logging.begin_request(request.headers.get("X-Request-ID"))
+
+@app.teardown_request
+def end_request_log_context(exc):
+    structured_logging.end_request()
+
+@app.before_request
+def start_retry_record():
+    begin_request()
+
+@app.teardown_request
+def end_retry_record(exc):
+    end_request()
+
+@app.before_request
+def start_request_timing():
+    request_timing.begin_request()
+
+@app.teardown_request
+def end_request_timing(exc):
+    request_timing.end_request()
+
+@app.before_request
+def start_request_metrics():
+    if metrics.ENABLED:
+        g.metrics_route = request.url_rule.rule if request.url_rule else "unmatched"
+        g.metrics_started = time.perf_counter()
+        metrics.request_started(g.metrics_route)
+
 limiter = Limiter(key_func=get_remote_address, app=app, default_limits=["200 per day", "50 per hour"])
 
 
@@ -169,58 +294,936 @@ def extract_text_from_file(file_data, filename):
     """Extracts text from a base64 encoded PDF or DOCX file."""
     if not DOCUMENT_PROCESSING_ENABLED:
         return None, "Document processing libraries are not installed on the server."
+    started = time.perf_counter()
+    text, error = _extract_text(file_data, filename)
+    try:
+        file_type = document_kind(filename)
+    except UnsupportedDocument:
+        file_type = "other"
+    metrics.EXTRACTION_SECONDS.labels(file_type, "error" if error else "ok").observe(time.perf_counter() - started)
+    return text, error
+
+def _extract_text(file_data, filename):
+    PyPDF2, _ = load_document_modules()
 
     try:
         if ',' not in file_data:
             return None, "Invalid base64 file data."
-        header, encoded = file_data.split(",", 1)
-        decoded_data = base64.b64decode(encoded)
-        file_stream = io.BytesIO(decoded_data)
-
-        if filename.lower().endswith('.pdf'):
-            pdf_reader = PyPDF2.PdfReader(file_stream)
-            return "".join(page.extract_text() for page in pdf_reader.pages if page.extract_text()), None
-        elif filename.lower().endswith('.docx'):
-            doc = Document(file_stream)
-            return "\n".join(para.text for para in doc.paragraphs if para.text), None
-        else:
-            return None, "Unsupported file type. Please upload a PDF or DOCX file."
+        with request_timing.stage("decode"):
+            decoded_data = decode_upload(file_data)
+        kind = document_kind(filename)
+        metrics.EXTRACTION_BYTES.labels(kind).observe(len(decoded_data))
+        with request_timing.stage("parse"):
+            document = parse_document(decoded_data, kind)
+        with request_timing.stage("extract"):
+            return document_text(document, kind, decoded_data), None
+    except UnsupportedDocument:
+        return None, "Unsupported file type. Please upload a PDF or DOCX file."
     except PyPDF2.errors.PdfReadError:
         return None, "Could not read the PDF file. It may be corrupted or encrypted."
-    except Exception as e:
-        print(f"Error extracting text: {e}")
+    except Exception:
+        log.exception("Error extracting text", extra={"fields": {"filename": filename}})
         return None, f"An unexpected error occurred while processing the file."
 
-def get_groq_response(prompt):
-    """Sends a prompt to the Groq API with retry logic for rate limiting."""
-    max_retries = 3
-    base_delay = 1
-    for attempt in range(max_retries):
+GROQ_MODEL = "llama-3.1-8b-instant"  # Updated to current model
+GROQ_TEMPERATURE = 0.7
+GROQ_MAX_TOKENS = 2048
+GROQ_MAX_RETRIES = 3
+GROQ_BASE_DELAY = 1
+
+def _count_retry(kind):
+    metrics.UPSTREAM_RETRIES.labels(kind).inc()
+
+# Retry schedules for upstream calls. The sync path only waits GROQ_RETRY_MAX_WAIT seconds
+# in total, so a long Retry-After is passed on to the client instead of holding the worker;
+# the async path sleeps without holding anything and may wait GROQ_ASYNC_RETRY_MAX_WAIT.
+retry_policy = RetryPolicy(
+    max_attempts=GROQ_MAX_RETRIES,
+    base_delay=GROQ_BASE_DELAY,
+    max_delay=float(os.getenv("GROQ_RETRY_MAX_DELAY", "8")),
+    max_wait=float(os.getenv("GROQ_RETRY_MAX_WAIT", "2")),
+    on_retry=_count_retry,
+)
+async_retry_policy = RetryPolicy(
+    max_attempts=GROQ_MAX_RETRIES,
+    base_delay=GROQ_BASE_DELAY,
+    max_delay=float(os.getenv("GROQ_RETRY_MAX_DELAY", "8")),
+    max_wait=float(os.getenv("GROQ_ASYNC_RETRY_MAX_WAIT", "30")),
+    on_retry=_count_retry,
+)
+
+# Fails upstream calls fast (503 with Retry-After) while Groq is failing or too slow.
+circuit_breaker = CircuitBreaker(
+    window=float(os.getenv("GROQ_BREAKER_WINDOW", "60")),
+    min_calls=int(os.getenv("GROQ_BREAKER_MIN_CALLS", "10")),
+    failure_rate=float(os.getenv("GROQ_BREAKER_FAILURE_RATE", "0.5")),
+    slow_call_seconds=float(os.getenv("GROQ_BREAKER_SLOW_CALL_SECONDS", "30")),
+    slow_call_rate=float(os.getenv("GROQ_BREAKER_SLOW_CALL_RATE", "0.8")),
+    open_seconds=float(os.getenv("GROQ_BREAKER_OPEN_SECONDS", "30")),
+    trial_calls=int(os.getenv("GROQ_BREAKER_TRIAL_CALLS", "3")),
+    enabled=os.getenv("GROQ_BREAKER_ENABLED", "true").lower() != "false",
+)
+
+# Completions cache shared by every cacheable call site. RESPONSE_CACHE_SIZE=0 disables it.
+response_cache = ResponseCache(
+    max_size=int(os.getenv("RESPONSE_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+)
+
+# Near-duplicate index over plain /api/chat questions. NEAR_DUPLICATE_MAX_ENTRIES=0 disables it.
+near_duplicate_cache = NearDuplicateIndex(
+    threshold=float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.8")),
+    max_entries=int(os.getenv("NEAR_DUPLICATE_MAX_ENTRIES", "100000")),
+)
+
+# Per-topic pools of generated quiz questions. QUIZ_POOL_MAX_TOPICS=0 disables them.
+quiz_pool = QuizPool(
+    max_questions=int(os.getenv("QUIZ_POOL_MAX_QUESTIONS", "50")),
+    ttl=float(os.getenv("QUIZ_POOL_TTL", "86400")),
+    max_topics=int(os.getenv("QUIZ_POOL_MAX_TOPICS", "500")),
+)
+
+# Fallback replies returned to the user when the upstream call fails; never cached.
+UPSTREAM_ERROR_REPLY = "Sorry, an error occurred while connecting to the AI service."
+UPSTREAM_BUSY_REPLY = "The service is currently busy. Please try again in a moment."
+UPSTREAM_FALLBACK_REPLIES = (UPSTREAM_ERROR_REPLY, UPSTREAM_BUSY_REPLY)
+UPSTREAM_UNAVAILABLE_MESSAGE = "The AI service is temporarily unavailable. Please try again shortly."
+
+def circuit_open_headers(error):
+    return {"Retry-After": str(math.ceil(error.retry_after))}
+
+# max_tokens per call site, learned from the completion lengths each site actually
+# produces (p99 + GROQ_OUTPUT_BUDGET_MARGIN) and never above GROQ_MAX_TOKENS. Quiz budgets
+# are per question. GROQ_ADAPTIVE_MAX_TOKENS=false sends GROQ_MAX_TOKENS everywhere.
+GROQ_ADAPTIVE_MAX_TOKENS = os.getenv("GROQ_ADAPTIVE_MAX_TOKENS", "true").lower() != "false"
+GROQ_OUTPUT_BUDGET_MARGIN = float(os.getenv("GROQ_OUTPUT_BUDGET_MARGIN", "0.25"))
+output_budgets = OutputBudgets({
+    "classify": OutputBudget(prior=5, floor=2, ceiling=16, margin=GROQ_OUTPUT_BUDGET_MARGIN),
+    "chat": OutputBudget(prior=GROQ_MAX_TOKENS, floor=256, ceiling=GROQ_MAX_TOKENS, margin=GROQ_OUTPUT_BUDGET_MARGIN),
+    "document": OutputBudget(prior=GROQ_MAX_TOKENS, floor=512, ceiling=GROQ_MAX_TOKENS, margin=GROQ_OUTPUT_BUDGET_MARGIN),
+    "quiz": OutputBudget(prior=150, floor=256, ceiling=GROQ_MAX_TOKENS, margin=GROQ_OUTPUT_BUDGET_MARGIN, overhead=16),
+})
+
+def _groq_request_kwargs(prompt, call_site="chat", units=1):
+    max_tokens = output_budgets[call_site].max_tokens(units) if GROQ_ADAPTIVE_MAX_TOKENS else GROQ_MAX_TOKENS
+    return {
+        "model": GROQ_MODEL,
+        "messages": [
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": GROQ_TEMPERATURE,
+        "max_tokens": max_tokens,
+    }
+
+# Document text is fitted into DOCUMENT_TOKEN_BUDGET tokens before it is put in a prompt,
+# and no prompt above GROQ_MAX_PROMPT_TOKENS is ever sent upstream.
+DOCUMENT_TOKEN_BUDGET = int(os.getenv("DOCUMENT_TOKEN_BUDGET", "3500"))
+GROQ_MAX_PROMPT_TOKENS = int(os.getenv("GROQ_MAX_PROMPT_TOKENS", "6000"))
+
+def prompt_too_large(prompt):
+    return estimate_tokens(prompt) > GROQ_MAX_PROMPT_TOKENS
+
+def _admission_cost(request_kwargs):
+    """Estimated quota cost of a call; raises PromptTooLarge for prompts that must not be sent."""
+    cost = estimate_request_tokens(request_kwargs)
+    prompt_tokens = cost - request_kwargs["max_tokens"]
+    if prompt_tokens > GROQ_MAX_PROMPT_TOKENS:
+        raise PromptTooLarge(prompt_tokens, GROQ_MAX_PROMPT_TOKENS)
+    return cost
+
+def _reserve_model(call_class, request_kwargs, max_wait, exclude):
+    """Picks the model for one attempt and reserves its quota; returns (model, wait) or None.
+
+    The router's candidates are tried in order for budget that is available now; failing
+    that, the one that frees up soonest is used if the caller can wait that long. Models
+    that cannot are marked rate-limited, and AdmissionRejected is raised.
+    """
+    cost = _admission_cost(request_kwargs)
+    candidates = [model for model in model_router.candidates(call_class, cost - request_kwargs["max_tokens"], cost)
+                  if model not in exclude]
+    if not candidates:
+        return None
+    rejections = []
+    for model in candidates:
+        try:
+            return model, admission.for_model(model).reserve(cost, max_wait=0)
+        except AdmissionRejected as e:
+            rejections.append((e.retry_after, model))
+    for retry_after, model in sorted(rejections):
+        try:
+            return model, admission.for_model(model).reserve(cost, max_wait=max_wait)
+        except AdmissionRejected:
+            model_router.mark_rate_limited(model, retry_after)
+    raise AdmissionRejected(min(retry_after for retry_after, _ in rejections))
+
+def _attempt_failed(model, call_class, request_kwargs, started, error, tried, trial):
+    """Records a failed upstream call; returns True if another model should be tried at once."""
+    latency = time.perf_counter() - started
+    model_router.record(model, call_class, latency, ok=False)
+    kind = classify_error(error)
+    metrics.UPSTREAM_SECONDS.labels(model, call_class, current_attempt(), "error").observe(latency)
+    metrics.UPSTREAM_ERRORS.labels(model, kind).inc()
+    if kind in (SERVER_ERROR, TIMEOUT, CONNECTION):
+        circuit_breaker.record_failure(trial)
+    else:
+        circuit_breaker.release(trial)
+    if kind != RATE_LIMIT:
+        return False
+    # A 429 consumed no tokens; the model stays blocked through the observed headers.
+    admission.for_model(model).settle(estimate_request_tokens(request_kwargs), 0)
+    model_router.mark_rate_limited(model, retry_after_hint(error))
+    tried.append(model)
+    return True
+
+def _reserve_attempt(call_class, request_kwargs, max_wait, tried):
+    """Passes the circuit breaker and reserves a model; returns (model, wait, trial) or None.
+
+    A half-open circuit has only a few trial slots, so one taken here is given back on every
+    path that does not end in an upstream call (AdmissionRejected, PromptTooLarge, ...).
+    """
+    trial = circuit_breaker.allow()
+    try:
+        picked = _reserve_model(call_class, request_kwargs, max_wait, exclude=tried)
+    except BaseException:
+        circuit_breaker.release(trial)
+        raise
+    if picked is None:
+        circuit_breaker.release(trial)
+        return None
+    return picked + (trial,)
+
+def _abandon_reservation(request_kwargs, reservation):
+    """Done callback of a reservation whose caller was cancelled: gives back its trial slot and tokens."""
+    if reservation.cancelled() or reservation.exception() is not None or reservation.result() is None:
+        return
+    model, _, trial = reservation.result()
+    circuit_breaker.release(trial)
+    asyncio.get_running_loop().run_in_executor(
+        None, admission.for_model(model).settle, estimate_request_tokens(request_kwargs), 0)
+
+def _attempt_succeeded(model, call_class, started, stream, trial):
+    latency = time.perf_counter() - started
+    circuit_breaker.record_success(latency, trial)
+    metrics.UPSTREAM_SECONDS.labels(model, call_class, current_attempt(), "ok").observe(latency)
+    if not stream:
+        model_router.record(model, call_class, latency, ok=True)
+
+def _create_completion(request_kwargs, call_class, stream=False, max_wait=None):
+    """One upstream attempt, on the model the router picks, once admission has budget for it.
+
+    A model that answers 429 is marked rate-limited and the next candidate is tried at
+    once; the error is only raised (for the retry policy) when no candidate is left.
+    max_wait bounds the admission queueing (default: the retry policy's wait budget).
+    Returns (response, model, started).
+    """
+    tried, last_error = [], None
+    max_wait = retry_policy.max_wait if max_wait is None else max_wait
+    while True:
+        picked = _reserve_attempt(call_class, request_kwargs, max_wait, tried)
+        if picked is None:
+            raise last_error
+        model, wait, trial = picked
+        if wait > 0:
+            request_timing.record("admission_wait", wait)
+            time.sleep(wait)
+        started = time.perf_counter()
+        try:
+            response = client.chat.completions.create(**dict(request_kwargs, model=model), stream=stream)
+        except Exception as e:
+            if not _attempt_failed(model, call_class, request_kwargs, started, e, tried, trial):
+                raise
+            last_error = e
+            continue
+        _attempt_succeeded(model, call_class, started, stream, trial)
+        return response, model, started
+
+async def _create_completion_async(request_kwargs, call_class, stream=False, max_wait=None):
+    """Async counterpart of _create_completion().
+
+    Admission bookkeeping takes a thread lock and the shared state file's flock, so it runs
+    in a worker thread instead of blocking the event loop while another worker holds them.
+    """
+    tried, last_error = [], None
+    max_wait = async_retry_policy.max_wait if max_wait is None else max_wait
+    while True:
+        reservation = asyncio.ensure_future(
+            asyncio.to_thread(_reserve_attempt, call_class, request_kwargs, max_wait, tried))
+        try:
+            picked = await asyncio.shield(reservation)
+        except asyncio.CancelledError:
+            # The reservation thread runs on; whatever it takes is handed back when it ends.
+            reservation.add_done_callback(functools.partial(_abandon_reservation, request_kwargs))
+            raise
+        if picked is None:
+            raise last_error
+        model, wait, trial = picked
+        try:
+            if wait > 0:
+                request_timing.record("admission_wait", wait)
+                await asyncio.sleep(wait)
+            started = time.perf_counter()
+            response = await async_client.chat.completions.create(**dict(request_kwargs, model=model), stream=stream)
+        except asyncio.CancelledError:
+            circuit_breaker.release(trial)  # e.g. a hedge that lost the race
+            raise
+        except Exception as e:
+            if not await asyncio.to_thread(_attempt_failed, model, call_class, request_kwargs, started, e, tried, trial):
+                raise
+            last_error = e
+            continue
+        _attempt_succeeded(model, call_class, started, stream, trial)
+        return response, model, started
+
+# A non-streaming call still pending after the live p95 of its call class gets one
+# duplicate; GROQ_HEDGE_BUDGET caps duplicates as a share of calls. Duplicates are only
+# sent when admission has budget for them right away.
+GROQ_HEDGING_ENABLED = os.getenv("GROQ_HEDGING_ENABLED", "false").lower() == "true"
+GROQ_HEDGE_BUDGET = float(os.getenv("GROQ_HEDGE_BUDGET", "0.05"))
+GROQ_HEDGE_MIN_DELAY = float(os.getenv("GROQ_HEDGE_MIN_DELAY", "0.5"))
+GROQ_HEDGE_MIN_SAMPLES = int(os.getenv("GROQ_HEDGE_MIN_SAMPLES", "20"))
+hedger = Hedger(HedgeBudget(ratio=GROQ_HEDGE_BUDGET))
+
+def _hedge_delay(call_class):
+    """Seconds after which a call gets a duplicate, or None to not hedge it."""
+    if not GROQ_HEDGING_ENABLED:
+        return None
+    p95 = model_router.class_percentile(call_class, 0.95, min_samples=GROQ_HEDGE_MIN_SAMPLES)
+    return max(GROQ_HEDGE_MIN_DELAY, p95) if p95 is not None else None
+
+def _discard_completion(request_kwargs, result):
+    """Settles the reservation of a hedged attempt that lost the race but still completed."""
+    response, model, _ = result
+    usage = response.usage
+    admission.for_model(model).settle(estimate_request_tokens(request_kwargs), usage.total_tokens if usage else None)
+
+def _hedged_completion(request_kwargs, call_class):
+    return hedger.call(
+        lambda: _create_completion(request_kwargs, call_class),
+        delay=_hedge_delay(call_class),
+        hedge_fn=lambda: _create_completion(request_kwargs, call_class, max_wait=0),
+        discard=lambda result: _discard_completion(request_kwargs, result),
+    )
+
+async def _hedged_completion_async(request_kwargs, call_class):
+    return await hedger.acall(
+        lambda: _create_completion_async(request_kwargs, call_class),
+        delay=_hedge_delay(call_class),
+        hedge_fn=lambda: _create_completion_async(request_kwargs, call_class, max_wait=0),
+        discard=lambda result: asyncio.get_running_loop().run_in_executor(
+            None, _discard_completion, request_kwargs, result),
+    )
+
+def _chunk_usage(chunk):
+    """Usage reported in the final chunk of a Groq stream, if any."""
+    return getattr(getattr(chunk, "x_groq", None), "usage", None)
+
+def _record_completion(call_site, units, model, request_kwargs, usage, finish_reason, text):
+    """Settles the model's admission reservation and feeds the call site's output budget.
+
+    Usage is estimated from the text when Groq did not report it.
+    """
+    if usage is not None:
+        used_tokens, completion_tokens = usage.total_tokens, usage.completion_tokens
+    else:
+        used_tokens, completion_tokens = estimate_usage(request_kwargs, text), estimate_tokens(text)
+    admission.for_model(model).settle(estimate_request_tokens(request_kwargs), used_tokens)
+    output_budgets[call_site].observe(completion_tokens, units, request_kwargs["max_tokens"], finish_reason)
+
+def _call_class(call_site, request_kwargs):
+    return model_router.call_class(call_site, estimate_request_tokens(request_kwargs) - request_kwargs["max_tokens"])
+
+# Live upstream calls in flight in this process; the quiz pool warmer only runs when it is zero.
+_upstream_in_flight = 0
+_upstream_in_flight_lock = threading.Lock()
+
+@contextmanager
+def track_upstream_call():
+    global _upstream_in_flight
+    with _upstream_in_flight_lock:
+        _upstream_in_flight += 1
+    metrics.UPSTREAM_IN_FLIGHT.inc()
+    try:
+        yield
+    finally:
+        with _upstream_in_flight_lock:
+            _upstream_in_flight -= 1
+        metrics.UPSTREAM_IN_FLIGHT.dec()
+
+def upstream_idle():
+    return _upstream_in_flight == 0
+
+# Identical prompts in flight at the same time share one upstream request.
+upstream_flights = SingleFlight()
+async_upstream_flights = AsyncSingleFlight()
+
+def single_flight_stats():
+    sync_stats, async_stats = upstream_flights.stats(), async_upstream_flights.stats()
+    return {name: sync_stats[name] + async_stats[name] for name in sync_stats}
+
+def _cache_key(prompt, call_class, use_cache):
+    """Response cache key of a call class's answer to a prompt.
+
+    Only answers from the class's preferred model that ran to their end are stored (see
+    _reusable), so the key names that model. max_tokens did not limit such an answer and is
+    left out, which keeps entries valid while the learned budget moves.
+    """
+    if not use_cache or not response_cache.enabled:
+        return None
+    return make_cache_key(prompt, model_router.preferred(call_class), GROQ_TEMPERATURE)
+
+def _flight_key(prompt, call_class, request_kwargs):
+    """Calls coalesced under this key share one routing decision and one output budget."""
+    return make_cache_key(prompt, call_class, GROQ_TEMPERATURE, request_kwargs["max_tokens"])
+
+# Calls whose answer is parsed as JSON. A cut-off JSON answer is useless, so one truncated
+# by a learned output budget is asked for once more at GROQ_MAX_TOKENS.
+JSON_CALL_SITES = {"quiz"}
+
+def _reusable(content, finish_reason, model, call_class):
+    """True for an answer later callers may be given: a real completion from the call class's
+    preferred model that ran to its end. Fallback-model and cut-off answers are served once."""
+    return (bool(content) and content not in UPSTREAM_FALLBACK_REPLIES and finish_reason != "length"
+            and model == model_router.preferred(call_class))
+
+def _retry_at_ceiling(call_site, request_kwargs, finish_reason):
+    if finish_reason != "length" or call_site not in JSON_CALL_SITES or request_kwargs["max_tokens"] >= GROQ_MAX_TOKENS:
+        return False
+    log.info("Completion cut off at max_tokens=%d; retrying at %d", request_kwargs["max_tokens"], GROQ_MAX_TOKENS,
+             extra={"fields": {"call_site": call_site}})
+    return True
+
+def get_groq_response(prompt, use_cache=False, call_site="chat", units=1, on_complete=None):
+    """Sends a prompt to the Groq API, retrying rate limits and transient errors.
+
+    call_site selects the learned output budget (see output_budgets); units scales it,
+    e.g. the number of quiz questions requested. With use_cache=True a cached completion for the same normalized prompt is returned
+    without calling the API, and successful completions are stored for later callers.
+    Concurrent calls with an identical prompt share a single upstream request.
+    on_complete(text), if given, is called with an answer that is worth remembering: not a
+    fallback reply, not cut off at max_tokens and from the call class's preferred model
+    (other answers are never cached either).
+    The call is timed as a request stage named after call_site.
+    """
+    with request_timing.stage(call_site):
+        return _get_groq_response(prompt, use_cache, call_site, units, on_complete)
+
+def _get_groq_response(prompt, use_cache, call_site, units, on_complete):
+    request_kwargs = _groq_request_kwargs(prompt, call_site, units)
+    call_class = _call_class(call_site, request_kwargs)
+    cache_key = _cache_key(prompt, call_class, use_cache)
+    if cache_key:
+        cached = response_cache.get(cache_key)
+        metrics.cache_lookup("response", cached is not None)
+        if cached is not None:
+            if on_complete:
+                on_complete(cached)
+            return cached
+    content, finish_reason, model = upstream_flights.do(
+        _flight_key(prompt, call_class, request_kwargs),
+        lambda: _fetch_groq_response(request_kwargs, call_class, call_site, units))
+    if _reusable(content, finish_reason, model, call_class):
+        if cache_key:
+            response_cache.set(cache_key, content)
+        if on_complete:
+            on_complete(content)
+    return content
+
+def _fetch_groq_response(request_kwargs, call_class, call_site, units):
+    """Returns (content, finish_reason, model); fallback replies come with None for both."""
+    result = _fetch_groq_completion(request_kwargs, call_class, call_site, units)
+    if _retry_at_ceiling(call_site, request_kwargs, result[1]):
+        result = _fetch_groq_completion(dict(request_kwargs, max_tokens=GROQ_MAX_TOKENS), call_class, call_site, units)
+    return result
+
+def _fetch_groq_completion(request_kwargs, call_class, call_site, units):
+    with track_upstream_call():
         try:
-            response = client.chat.completions.create(
-                model="llama-3.1-8b-instant",  # Updated to current model
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=2048
-            )
-            return response.choices[0].message.content
+            response, model, _ = retry_policy.call(lambda: _hedged_completion(request_kwargs, call_class))
+        except RetriesExhausted:
+            return UPSTREAM_BUSY_REPLY, None, None
+        except AdmissionRejected as e:
+            log.info("Groq call not admitted: %s", e, extra={"fields": {"call_site": call_site}})
+            note_retry_after(e.retry_after)
+            return UPSTREAM_BUSY_REPLY, None, None
+        except CircuitOpen:
+            raise
         except Exception as e:
-            print(f"Groq API error (attempt {attempt + 1}): {e}")
-            print(f"Error type: {type(e)}")
-            if "429" in str(e) and attempt < max_retries - 1:
-                import time
-                delay = (base_delay * 2 ** attempt) + random.uniform(0, 1)
-                print(f"Rate limit exceeded. Retrying in {delay:.2f}s...")
-                time.sleep(delay)
-            else:
-                print(f"Final Groq API error: {e}")
-                return "Sorry, an error occurred while connecting to the AI service."
-    return "The service is currently busy. Please try again in a moment."
+            log.error("Final Groq API error: %s", e, extra={"fields": {"call_site": call_site}})
+            return UPSTREAM_ERROR_REPLY, None, None
+        mark_upstream_ready()
+        choice = response.choices[0]
+        _record_completion(call_site, units, model, request_kwargs, response.usage, choice.finish_reason, choice.message.content or "")
+        return choice.message.content, choice.finish_reason, model
 
+async def get_groq_response_async(prompt, use_cache=False, call_site="chat", units=1, on_complete=None):
+    """Async counterpart of get_groq_response() used by the ASGI serving path."""
+    with request_timing.stage(call_site):
+        return await _get_groq_response_async(prompt, use_cache, call_site, units, on_complete)
+
+async def _get_groq_response_async(prompt, use_cache, call_site, units, on_complete):
+    request_kwargs = _groq_request_kwargs(prompt, call_site, units)
+    call_class = _call_class(call_site, request_kwargs)
+    cache_key = _cache_key(prompt, call_class, use_cache)
+    if cache_key:
+        cached = response_cache.get(cache_key)
+        metrics.cache_lookup("response", cached is not None)
+        if cached is not None:
+            if on_complete:
+                on_complete(cached)
+            return cached
+    content, finish_reason, model = await async_upstream_flights.do(
+        _flight_key(prompt, call_class, request_kwargs),
+        lambda: _fetch_groq_response_async(request_kwargs, call_class, call_site, units))
+    if _reusable(content, finish_reason, model, call_class):
+        if cache_key:
+            response_cache.set(cache_key, content)
+        if on_complete:
+            on_complete(content)
+    return content
+
+async def _fetch_groq_response_async(request_kwargs, call_class, call_site, units):
+    result = await _fetch_groq_completion_async(request_kwargs, call_class, call_site, units)
+    if _retry_at_ceiling(call_site, request_kwargs, result[1]):
+        result = await _fetch_groq_completion_async(
+            dict(request_kwargs, max_tokens=GROQ_MAX_TOKENS), call_class, call_site, units)
+    return result
+
+async def _fetch_groq_completion_async(request_kwargs, call_class, call_site, units):
+    with track_upstream_call():
+        try:
+            response, model, _ = await async_retry_policy.acall(lambda: _hedged_completion_async(request_kwargs, call_class))
+        except RetriesExhausted:
+            return UPSTREAM_BUSY_REPLY, None, None
+        except AdmissionRejected as e:
+            log.info("Groq call not admitted: %s", e, extra={"fields": {"call_site": call_site}})
+            note_retry_after(e.retry_after)
+            return UPSTREAM_BUSY_REPLY, None, None
+        except CircuitOpen:
+            raise
+        except Exception as e:
+            log.error("Final Groq API error: %s", e, extra={"fields": {"call_site": call_site}})
+            return UPSTREAM_ERROR_REPLY, None, None
+        mark_upstream_ready()
+        choice = response.choices[0]
+        await asyncio.to_thread(_record_completion, call_site, units, model, request_kwargs, response.usage,
+                                choice.finish_reason, choice.message.content or "")
+        return choice.message.content, choice.finish_reason, model
+
+
+def stream_groq_response(prompt, use_cache=False, call_site="chat", units=1, on_complete=None):
+    """Yields completion text from the Groq API as it is generated.
+
+    Retries only apply until the stream is opened; errors after the first
+    token propagate to the caller. A cache hit is yielded as a single chunk, and a
+    stream that runs to completion without hitting max_tokens is stored in the cache and
+    passed to on_complete(text). A stream cannot be retried once its text has been sent, so
+    a cut-off one is only reported to the output budget. The time to the first token and
+    the whole stream are recorded as request stages.
+    """
+    request_kwargs = _groq_request_kwargs(prompt, call_site, units)
+    call_class = _call_class(call_site, request_kwargs)
+    cache_key = _cache_key(prompt, call_class, use_cache)
+    if cache_key:
+        cached = response_cache.get(cache_key)
+        metrics.cache_lookup("response", cached is not None)
+        if cached is not None:
+            yield cached
+            if on_complete:
+                on_complete(cached)
+            return
+    requested = time.perf_counter()
+    with request_timing.stage(call_site), track_upstream_call():
+        stream, model, started = retry_policy.call(lambda: _create_completion(request_kwargs, call_class, stream=True))
+        mark_upstream_ready()
+        parts, usage, finish_reason = [], None, None
+        for chunk in stream:
+            usage = _chunk_usage(chunk) or usage
+            if chunk.choices and chunk.choices[0].finish_reason:
+                finish_reason = chunk.choices[0].finish_reason
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                if not parts:
+                    request_timing.record(f"{call_site}_first_token", time.perf_counter() - requested)
+                parts.append(delta)
+                yield delta
+        model_router.record(model, call_class, time.perf_counter() - started, ok=True)
+        text = "".join(parts)
+        _record_completion(call_site, units, model, request_kwargs, usage, finish_reason, text)
+        if _reusable(text, finish_reason, model, call_class):
+            if cache_key:
+                response_cache.set(cache_key, text)
+            if on_complete:
+                on_complete(text)
+
+async def stream_groq_response_async(prompt, use_cache=False, call_site="chat", units=1, on_complete=None):
+    """Async counterpart of stream_groq_response()."""
+    request_kwargs = _groq_request_kwargs(prompt, call_site, units)
+    call_class = _call_class(call_site, request_kwargs)
+    cache_key = _cache_key(prompt, call_class, use_cache)
+    if cache_key:
+        cached = response_cache.get(cache_key)
+        metrics.cache_lookup("response", cached is not None)
+        if cached is not None:
+            yield cached
+            if on_complete:
+                on_complete(cached)
+            return
+    requested = time.perf_counter()
+    with request_timing.stage(call_site), track_upstream_call():
+        stream, model, started = await async_retry_policy.acall(
+            lambda: _create_completion_async(request_kwargs, call_class, stream=True))
+        mark_upstream_ready()
+        parts, usage, finish_reason = [], None, None
+        async for chunk in stream:
+            usage = _chunk_usage(chunk) or usage
+            if chunk.choices and chunk.choices[0].finish_reason:
+                finish_reason = chunk.choices[0].finish_reason
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                if not parts:
+                    request_timing.record(f"{call_site}_first_token", time.perf_counter() - requested)
+                parts.append(delta)
+                yield delta
+        model_router.record(model, call_class, time.perf_counter() - started, ok=True)
+        text = "".join(parts)
+        await asyncio.to_thread(_record_completion, call_site, units, model, request_kwargs, usage, finish_reason, text)
+        if _reusable(text, finish_reason, model, call_class):
+            if cache_key:
+                response_cache.set(cache_key, text)
+            if on_complete:
+                on_complete(text)
+
+
+def remember_near_duplicate(message):
+    """on_complete callback that indexes a chat answer under the question it answers."""
+    return lambda reply: near_duplicate_cache.add(message, reply)
+
+
+# --- Server-Sent Events ---
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+STREAM_ERROR_MESSAGE = UPSTREAM_ERROR_REPLY
+
+def wants_event_stream(data, accept_header):
+    """Streaming is opt-in via {"stream": true} or an Accept: text/event-stream header."""
+    return data.get("stream") is True or "text/event-stream" in (accept_header or "")
+
+def sse_event(data, event=None):
+    """Formats one SSE frame. Data is JSON-encoded so newlines in tokens never break framing."""
+    frame = f"event: {event}\n" if event else ""
+    return f"{frame}data: {json.dumps(data)}\n\n"
+
+def sse_from_deltas(deltas):
+    """Wraps completion text deltas as `token` events, ending with `error` (if any) and `done`."""
+    try:
+        for delta in deltas:
+            yield sse_event({"content": delta}, event="token")
+    except Exception as e:
+        log.error("Groq streaming error: %s", e)
+        yield sse_event({"error": STREAM_ERROR_MESSAGE}, event="error")
+    yield sse_event({}, event="done")
+
+async def sse_from_deltas_async(deltas):
+    """Async counterpart of sse_from_deltas()."""
+    try:
+        async for delta in deltas:
+            yield sse_event({"content": delta}, event="token")
+    except Exception as e:
+        log.error("Groq streaming error: %s", e)
+        yield sse_event({"error": STREAM_ERROR_MESSAGE}, event="error")
+    yield sse_event({}, event="done")
+
+
+QUIZ_ERROR_MESSAGE = "Failed to generate quiz"
+
+def sse_quiz_from_deltas(deltas, on_complete=None):
+    """Parses a streamed quiz array and emits each question object as soon as it closes.
+
+    on_complete, if given, is called with the full question list once the array is closed.
+    """
+    parser = IncrementalArrayParser()
+    questions = []
+    try:
+        for delta in deltas:
+            for question in parser.feed(delta):
+                yield sse_event({"index": len(questions), "question": question}, event="question")
+                questions.append(question)
+        if not parser.closed:
+            raise ValueError("Failed to parse quiz data from the model's response.")
+        if on_complete:
+            on_complete(questions)
+    except Exception as e:
+        log.error("Quiz streaming error: %s", e)
+        yield sse_event({"error": QUIZ_ERROR_MESSAGE, "message": str(e)}, event="error")
+    yield sse_event({"count": len(questions)}, event="done")
+
+async def sse_quiz_from_deltas_async(deltas, on_complete=None):
+    """Async counterpart of sse_quiz_from_deltas()."""
+    parser = IncrementalArrayParser()
+    questions = []
+    try:
+        async for delta in deltas:
+            for question in parser.feed(delta):
+                yield sse_event({"index": len(questions), "question": question}, event="question")
+                questions.append(question)
+        if not parser.closed:
+            raise ValueError("Failed to parse quiz data from the model's response.")
+        if on_complete:
+            on_complete(questions)
+    except Exception as e:
+        log.error("Quiz streaming error: %s", e)
+        yield sse_event({"error": QUIZ_ERROR_MESSAGE, "message": str(e)}, event="error")
+    yield sse_event({"count": len(questions)}, event="done")
+
+
+# --- Prompt Builders ---
+# Shared by the Flask routes below and the async routes in asgi.py.
+def build_chat_prompt(message):
+    return f"{GENERAL_CHAT_PROMPT}\n\nUser's question: {message}"
+
+def build_classification_prompt(extracted_text):
+    return f"Is the following text a resume or CV? Answer with only 'yes' or 'no'.\n\n{extracted_text[:1000]}"
+
+def build_document_prompt(extracted_text, message, is_resume_response):
+    """Picks the resume analysis or document Q&A prompt based on the classifier's answer.
+
+    The document is fitted into DOCUMENT_TOKEN_BUDGET tokens first (head and tail are
+    kept); returns (prompt, FittedText) so callers can report the dropped tokens.
+    """
+    document = fit_to_budget(extracted_text, DOCUMENT_TOKEN_BUDGET)
+    if document.dropped_tokens:
+        log.info("Document truncated to fit the prompt budget",
+                 extra={"fields": {"tokens": document.tokens, "dropped_tokens": document.dropped_tokens}})
+    if 'yes' in is_resume_response.strip().lower():
+        # If the document is identified as a resume, always use the analysis prompt.
+        # This ensures a structured review is given, which is the primary goal.
+        return f"{RESUME_ANALYSIS_PROMPT}\n\n--- RESUME CONTENT ---\n{document.text}", document
+    # For any other document, answer the user's question using the text as context.
+    # If no question is asked, provide a summary as a default action.
+    user_question = message if message else "Summarize this document."
+    return GENERAL_DOC_PROMPT.format(document_text=document.text, user_question=user_question), document
+
+def document_headers(document):
+    return {"X-Document-Tokens": str(document.tokens), "X-Document-Tokens-Dropped": str(document.dropped_tokens)}
+
+PROMPT_TOO_LARGE_MESSAGE = "Your message is too long. Please shorten it and try again."
+
+def validate_quiz_request(data):
+    """Returns (topic, question_count, error_message) for a /api/generate-quiz payload."""
+    topic = data.get("topic")
+    count = data.get("count")
+    if not topic or not isinstance(topic, str) or not topic.strip():
+        return None, None, "Please provide a valid topic for the quiz"
+    try:
+        question_count = int(count)
+        if not 3 <= question_count <= 10: raise ValueError()
+    except (ValueError, TypeError):
+        return None, None, "Please request between 3 and 10 questions"
+    return topic, question_count, None
+
+def build_quiz_prompt(topic, question_count):
+    prompt = f"""Generate exactly {question_count} multiple choice quiz questions on the topic "{topic}". 
+        
+        Follow these strict rules:
+        1. Each question must have: "text", "options" (an array of 4 strings), and "correctAnswer" (the full string of the correct option).
+        2. Return ONLY a valid JSON array. Do not include any introductory text, explanations, or markdown fences like ```json.
+        
+        Example:
+        [
+          {{"text": "What is the capital of France?", "options": ["A) London", "B) Paris", "C) Berlin", "D) Madrid"], "correctAnswer": "B) Paris"}}
+        ]
+        
+        Now generate the quiz."""
+
+    return f"You are a quiz generator. Generate engaging quiz questions using subject-relevant emojis in the question text. {prompt}"
+
+def parse_quiz_content(content):
+    """Parses the model's quiz output into a list of question dicts."""
+    if not content: raise Exception("Failed to get a valid response from the AI model.")
+    
+    content = content.strip()
+    
+    try:
+        questions = json.loads(content)
+        if not isinstance(questions, list): raise ValueError("Response is not a valid JSON array.")
+    except json.JSONDecodeError:
+        raise Exception(f"Failed to parse quiz data from the model's response.")
+    return questions
+
+
+# --- Quiz Pool Warmer ---
+# Refills the pools of the most requested topics while the upstream is idle, using at most
+# QUIZ_WARMER_BUDGET_SHARE of the GROQ_RPM_LIMIT request budget.
+WARMER_BATCH_SIZE = 10
+
+def generate_pool_questions(topic):
+    return parse_quiz_content(get_groq_response(build_quiz_prompt(topic, WARMER_BATCH_SIZE), call_site="quiz", units=WARMER_BATCH_SIZE))
+
+def warmable_topic(topic):
+    return not prompt_too_large(build_quiz_prompt(topic, WARMER_BATCH_SIZE))
+
+quiz_warmer = QuizPoolWarmer(
+    quiz_pool,
+    generate=generate_pool_questions,
+    accepts=warmable_topic,
+    is_idle=upstream_idle,
+    calls_per_minute=GROQ_RPM_LIMIT * float(os.getenv("QUIZ_WARMER_BUDGET_SHARE", "0.1")),
+    target_size=int(os.getenv("QUIZ_WARMER_TARGET_SIZE", "20")),
+)
+if quiz_pool.enabled and os.getenv("QUIZ_WARMER_ENABLED", "true").lower() != "false":
+    quiz_warmer.start()
+
+
+# On-demand stack sampling through POST /admin/profile; only served when
+# PROFILER_ADMIN_TOKEN is set, to callers presenting it as a bearer token. Session results
+# go to PROFILER_RESULTS_DIR, where every worker on the host can read them.
+PROFILER_ADMIN_TOKEN = os.getenv("PROFILER_ADMIN_TOKEN", "")
+profiler = SamplingProfiler(
+    excluded_routes={"/admin/profile"},
+    results_dir=os.getenv("PROFILER_RESULTS_DIR") or os.path.join(tempfile.gettempdir(), "edugen-profiles"),
+)
 
 # --- API Routes ---
+@app.after_request
+def add_request_id(response):
+    """Echoes the correlation id that this request's log lines carry."""
+    request_id = structured_logging.current_request_id()
+    if request_id:
+        response.headers["X-Request-ID"] = request_id
+    return response
+
+@app.after_request
+def add_retry_headers(response):
+    """Reports the upstream retries and total retry wait of this request."""
+    record = current_record()
+    if record is not None:
+        response.headers.update(record.headers())
+    return response
+
+@app.after_request
+def add_server_timing(response):
+    """Sends the stages timed so far as Server-Timing and logs them once the response is done.
+
+    A streamed body is generated after the headers are sent, so its stages only appear
+    in the log line, which is written when the stream closes.
+    """
+    timer = request_timing.current_timer()
+    if timer is not None:
+        response.headers["Server-Timing"] = timer.header()
+        log = functools.partial(timer.log, request.method, request.path, response.status_code)
+        if response.is_streamed:
+            # Runs after teardown has cleared the request's log context, so it logs in a copy.
+            response.call_on_close(functools.partial(contextvars.copy_context().run, log))
+        else:
+            log()
+    return response
+
+@app.after_request
+def record_request_metrics(response):
+    """Counts and times the request; a streamed one once its body has been sent."""
+    started = g.pop("metrics_started", None)
+    if started is not None:
+        done = functools.partial(metrics.request_finished, g.metrics_route, request.method, response.status_code, started)
+        if response.is_streamed:
+            response.call_on_close(done)
+        else:
+            done()
+    return response
+
+@app.before_request
+def start_request_profiling():
+    token = profiler.request_started(request.path)
+    if token is not None:
+        g.profile_token = token
+
+@app.after_request
+def finish_request_profiling(response):
+    token = g.pop("profile_token", None)
+    if token is not None:
+        done = functools.partial(profiler.request_finished, token)
+        if response.is_streamed:
+            response.call_on_close(done)
+        else:
+            done()
+    return response
+
+def _admin_authorized():
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(token.encode(), PROFILER_ADMIN_TOKEN.encode())
+
+def _admin_guard():
+    """An error response for callers that may not use the profiler, or None."""
+    if not PROFILER_ADMIN_TOKEN:
+        return jsonify({"error": "Not Found"}), 404
+    if not _admin_authorized():
+        return jsonify({"error": "Unauthorized"}), 401
+    return None
+
+@app.route("/admin/profile", methods=["POST"])
+def profile():
+    """Starts sampling the Python stacks of live requests; answers 202 with the session's URL.
+
+    Body: "seconds" to profile for that long, and/or "requests" to stop after that many
+    requests matching "route" have finished (then "seconds", default 60, is the timeout).
+    Optional: "interval_ms" (default 10) and "all_threads". The call returns at once, so
+    even a single-threaded worker goes on serving the requests being profiled; the result
+    is fetched from GET /admin/profile/<id>.
+    """
+    denied = _admin_guard()
+    if denied:
+        return denied
+    data = request.get_json(silent=True) or {}
+    try:
+        requests_wanted = int(data.get("requests") or 0)
+        seconds = float(data.get("seconds") or (60 if requests_wanted else 0))
+        interval = float(data.get("interval_ms", 10)) / 1000
+        if seconds < 0 or requests_wanted < 0 or interval <= 0:
+            raise ValueError("seconds, requests and interval_ms must be positive")
+        session = profiler.start(interval=interval, seconds=seconds, requests=requests_wanted or None,
+                                 route=data.get("route"), all_threads=bool(data.get("all_threads")))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": "Invalid input", "message": str(e)}), 400
+    except ProfilerBusy:
+        return jsonify({"error": "A profiling session is already running in this worker."}), 409
+    url = f"/admin/profile/{session.id}"
+    log.info("Profiling session started", extra={"fields": {"id": session.id, "route": session.route,
+                                                              "seconds": seconds, "requests": requests_wanted}})
+    return jsonify({"id": session.id, "status": "running", "url": url,
+                    "ends_in_s": round(session.deadline_at - time.time(), 3)}), 202, {"Location": url}
+
+@app.route("/admin/profile/<session_id>", methods=["GET"])
+def profile_result(session_id):
+    """The result of a profiling session: 202 while it runs, then collapsed stacks (or a
+    speedscope document with ?format=speedscope). Any worker on the host can answer."""
+    denied = _admin_guard()
+    if denied:
+        return denied
+    output_format = request.args.get("format", "collapsed")
+    if output_format not in ("collapsed", "speedscope"):
+        return jsonify({"error": "Invalid input", "message": "format must be 'collapsed' or 'speedscope'"}), 400
+    result = profiler.result(session_id)
+    if result is None:
+        return jsonify({"error": "Not Found"}), 404
+    summary = {key: value for key, value in result.items() if key not in ("collapsed", "speedscope")}
+    if result["status"] == "running":
+        return jsonify(summary), 202, {"Retry-After": "1"}
+    if result["status"] == "lost":
+        return jsonify(dict(summary, error="The worker running this session exited before it finished.")), 410
+    headers = {f"X-Profile-{key.replace('_', '-').title()}": str(result[key])
+               for key in ("id", "samples", "distinct_stacks", "interval_ms", "duration_s", "completed_requests", "route")
+               if result.get(key) is not None}
+    if output_format == "speedscope":
+        return jsonify(result["speedscope"]), 200, headers
+    return Response(result["collapsed"], mimetype="text/plain", headers=headers)
+
+@app.route("/metrics", methods=["GET"])
+@limiter.exempt
+def metrics_endpoint():
+    """Prometheus scrape endpoint, aggregated over all gunicorn workers (see metrics.py)."""
+    if not metrics.ENABLED:
+        return jsonify({"error": "Not Found"}), 404
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
 @app.route("/api/health", methods=["GET"])
 def health_check():
     """Provides a simple health check endpoint."""
@@ -229,7 +1232,28 @@ def health_check():
         "version": "2.0.0",
         "timestamp": datetime.now().isoformat(),
         "features": {
-            "document_processing": DOCUMENT_PROCESSING_ENABLED
+            "document_processing": DOCUMENT_PROCESSING_ENABLED,
+            "metrics": metrics.ENABLED
+        },
+        "upstream": upstream_readiness,
+        "response_cache": response_cache.stats(),
+        "near_duplicate_cache": near_duplicate_cache.stats(),
+        "quiz_pool": quiz_pool.stats(),
+        "quiz_warmer": quiz_warmer.stats(),
+        "single_flight": single_flight_stats(),
+        "admission": admission.stats(),
+        "models": model_router.stats(),
+        "circuit_breaker": circuit_breaker.stats(),
+        "logging": structured_logging.stats(),
+        "hedging": dict(hedger.stats(), enabled=GROQ_HEDGING_ENABLED),
+        "output_budgets": output_budgets.stats(),
+        "upstream_retries": {
+            "sync": retry_policy.stats(),
+            "async": async_retry_policy.stats()
+        },
+        "upstream_transport": {
+            "sync": upstream_transport_stats.snapshot(),
+            "async": async_upstream_transport_stats.snapshot()
         }
     })
 
@@ -245,6 +1269,8 @@ def chat():
         message = data.get("message", "").strip()
         file_data = data.get("fileData")
         filename = data.get("filename")
+        stream = wants_event_stream(data, request.headers.get("Accept"))
+        use_cache = not cache_bypassed(request.headers)
 
         if not message and not (file_data and filename):
             return jsonify({"error": "No message or file was provided."}), 400
@@ -258,29 +1284,49 @@ def chat():
                 return jsonify({"response": "Sorry, I could not extract any text from the document. It might be empty or an image-based file."})
 
             # Use the LLM to classify the document
-            classification_prompt = f"Is the following text a resume or CV? Answer with only 'yes' or 'no'.\n\n{extracted_text[:1000]}"
-            is_resume_response = get_groq_response(classification_prompt).strip().lower()
-
-            if 'yes' in is_resume_response:
-                # If the document is identified as a resume, always use the analysis prompt.
-                # This ensures a structured review is given, which is the primary goal.
-                final_prompt = f"{RESUME_ANALYSIS_PROMPT}\n\n--- RESUME CONTENT ---\n{extracted_text}"
-            else:
-                # For any other document, answer the user's question using the text as context.
-                # If no question is asked, provide a summary as a default action.
-                user_question = message if message else "Summarize this document."
-                final_prompt = GENERAL_DOC_PROMPT.format(document_text=extracted_text, user_question=user_question)
-
-            reply = get_groq_response(final_prompt)
-            return jsonify({"response": reply})
+            is_resume_response = get_groq_response(build_classification_prompt(extracted_text), use_cache=use_cache, call_site="classify")
+            final_prompt, document = build_document_prompt(extracted_text, message, is_resume_response)
+            if prompt_too_large(final_prompt):
+                return jsonify({"error": PROMPT_TOO_LARGE_MESSAGE}), 413
+
+            if stream:
+                circuit_breaker.check()
+                events = sse_from_deltas(stream_groq_response(final_prompt, use_cache=use_cache, call_site="document"))
+                return Response(stream_with_context(events), mimetype="text/event-stream",
+                                headers={**SSE_HEADERS, **document_headers(document)})
+
+            reply = get_groq_response(final_prompt, use_cache=use_cache, call_site="document")
+            return jsonify({"response": reply}), 200, document_headers(document)
 
         # --- Standard Chat Logic (No File) ---
-        final_prompt = f"{GENERAL_CHAT_PROMPT}\n\nUser's question: {message}"
-        reply = get_groq_response(final_prompt)
+        final_prompt = build_chat_prompt(message)
+        if prompt_too_large(final_prompt):
+            return jsonify({"error": PROMPT_TOO_LARGE_MESSAGE}), 413
+
+        # A near-identical earlier question is answered from the local index.
+        if use_cache:
+            with request_timing.stage("near_duplicate"):
+                cached_reply, _ = near_duplicate_cache.lookup(message)
+            metrics.cache_lookup("near_duplicate", cached_reply is not None)
+            if cached_reply is not None:
+                if stream:
+                    return Response(sse_from_deltas([cached_reply]), mimetype="text/event-stream", headers=SSE_HEADERS)
+                return jsonify({"response": cached_reply})
+
+        on_complete = remember_near_duplicate(message) if use_cache else None
+        if stream:
+            circuit_breaker.check()
+            deltas = stream_groq_response(final_prompt, use_cache=use_cache, on_complete=on_complete)
+            events = sse_from_deltas(deltas)
+            return Response(stream_with_context(events), mimetype="text/event-stream", headers=SSE_HEADERS)
+
+        reply = get_groq_response(final_prompt, use_cache=use_cache, on_complete=on_complete)
         return jsonify({"response": reply})
 
+    except CircuitOpen as e:
+        return jsonify({"error": UPSTREAM_UNAVAILABLE_MESSAGE}), 503, circuit_open_headers(e)
     except Exception as e:
-        print(f"An unexpected error occurred in /api/chat: {str(e)}")
+        log.exception("Unexpected error in /api/chat")
         return jsonify({"error": "An internal server error occurred.", "message": str(e)}), 500
 
 @limiter.limit("5 per minute")
@@ -288,47 +1334,46 @@ def chat():
 def generate_quiz():
     try:
         data = request.get_json()
-        topic = data.get("topic")
-        count = data.get("count")
-        if not topic or not isinstance(topic, str) or not topic.strip():
-            return jsonify({"error": "Invalid input", "message": "Please provide a valid topic for the quiz"}), 400
-        try:
-            question_count = int(count)
-            if not 3 <= question_count <= 10: raise ValueError()
-        except (ValueError, TypeError):
-            return jsonify({"error": "Invalid input", "message": "Please request between 3 and 10 questions"}), 400
-        
-        prompt = f"""Generate exactly {question_count} multiple choice quiz questions on the topic "{topic}". 
-        
-        Follow these strict rules:
-        1. Each question must have: "text", "options" (an array of 4 strings), and "correctAnswer" (the full string of the correct option).
-        2. Return ONLY a valid JSON array. Do not include any introductory text, explanations, or markdown fences like ```json.
-        
-        Example:
-        [
-          {{"text": "What is the capital of France?", "options": ["A) London", "B) Paris", "C) Berlin", "D) Madrid"], "correctAnswer": "B) Paris"}}
-        ]
-        
-        Now generate the quiz."""
+        topic, question_count, error = validate_quiz_request(data)
+        if error:
+            return jsonify({"error": "Invalid input", "message": error}), 400
+        prompt = build_quiz_prompt(topic, question_count)
+        if prompt_too_large(prompt):
+            return jsonify({"error": PROMPT_TOO_LARGE_MESSAGE}), 413
 
-        gemini_prompt = f"You are a quiz generator. Generate engaging quiz questions using subject-relevant emojis in the question text. {prompt}"
-        
-        content = get_groq_response(gemini_prompt)
-        if not content: raise Exception("Failed to get a valid response from the AI model.")
-        
-        content = content.strip()
-        
-        try:
-            questions = json.loads(content)
-            if not isinstance(questions, list): raise ValueError("Response is not a valid JSON array.")
-        except json.JSONDecodeError:
-            raise Exception(f"Failed to parse quiz data from the model's response.")
+        quiz_warmer.record(topic)
+        use_cache = not cache_bypassed(request.headers)
+        stream = wants_event_stream(data, request.headers.get("Accept"))
+
+        # Serve from the topic's question pool while it is large and fresh enough.
+        pooled = quiz_pool.sample(topic, question_count) if use_cache else None
+        if use_cache and quiz_pool.enabled:
+            metrics.cache_lookup("quiz_pool", pooled is not None)
+        if pooled is not None:
+            if stream:
+                return Response(sse_quiz_from_deltas([json.dumps(pooled)]), mimetype="text/event-stream", headers=SSE_HEADERS)
+            return jsonify({"questions": pooled})
+
+        # Newly generated questions feed the pool. The exact-match response cache is skipped
+        # while pools are enabled, since it would keep returning the same quiz.
+        use_response_cache = use_cache and not quiz_pool.enabled
+        if stream:
+            circuit_breaker.check()
+            deltas = stream_groq_response(prompt, use_cache=use_response_cache, call_site="quiz", units=question_count)
+            events = sse_quiz_from_deltas(deltas, on_complete=lambda questions: quiz_pool.add(topic, questions))
+            return Response(stream_with_context(events), mimetype="text/event-stream", headers=SSE_HEADERS)
+
+        content = get_groq_response(prompt, use_cache=use_response_cache, call_site="quiz", units=question_count)
+        questions = parse_quiz_content(content)
+        quiz_pool.add(topic, questions)
             
         return jsonify({"questions": questions})
         
+    except CircuitOpen as e:
+        return jsonify({"error": UPSTREAM_UNAVAILABLE_MESSAGE}), 503, circuit_open_headers(e)
     except Exception as e:
-        print(f"Quiz generation error: {str(e)}")
-        return jsonify({"error": "Failed to generate quiz", "message": str(e)}), 500
+        log.exception("Quiz generation error")
+        return jsonify({"error": QUIZ_ERROR_MESSAGE, "message": str(e)}), 500
 
 
 @app.errorhandler(404)
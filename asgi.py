@@ -0,0 +1,305 @@
+"""
+ASGI entry point for the EduGen AI backend.
+
+/api/chat and /api/generate-quiz run as coroutines on the async Groq client, so a
+single process can keep hundreds of upstream LLM calls in flight instead of one per
+worker. Every other route is delegated to the existing Flask app.
+
+Run with:
+    uvicorn asgi:asgi_app --host 0.0.0.0 --port $PORT --timeout-keep-alive 120
+"""
+import functools
+import json
+import logging
+import time
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from app import (
+    PROMPT_TOO_LARGE_MESSAGE,
+    QUIZ_ERROR_MESSAGE,
+    SSE_HEADERS,
+    UPSTREAM_UNAVAILABLE_MESSAGE,
+    app as flask_app,
+    build_chat_prompt,
+    build_classification_prompt,
+    build_document_prompt,
+    build_quiz_prompt,
+    circuit_breaker,
+    circuit_open_headers,
+    document_headers,
+    extract_text_from_file,
+    get_groq_response_async,
+    near_duplicate_cache,
+    parse_quiz_content,
+    profiler,
+    prompt_too_large,
+    quiz_pool,
+    quiz_warmer,
+    remember_near_duplicate,
+    sse_from_deltas,
+    sse_from_deltas_async,
+    sse_quiz_from_deltas,
+    sse_quiz_from_deltas_async,
+    stream_groq_response_async,
+    validate_quiz_request,
+    wants_event_stream,
+)
+import metrics
+import request_timing
+import structured_logging
+from circuit_breaker import CircuitOpen
+from response_cache import cache_bypassed
+from upstream_retry import begin_request
+
+log = logging.getLogger("edugen.asgi")
+
+
+async def _read_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+def with_request_id(endpoint):
+    """Sets the log correlation id and echoes it, like app.add_request_id."""
+    @functools.wraps(endpoint)
+    async def wrapper(request):
+        request_id = structured_logging.begin_request(request.headers.get("x-request-id"))
+        response = await endpoint(request)
+        response.headers["X-Request-ID"] = request_id
+        return response
+    return wrapper
+
+
+def with_retry_headers(endpoint):
+    """Gives each request its own retry record and reports it on the response, like app.add_retry_headers."""
+    @functools.wraps(endpoint)
+    async def wrapper(request):
+        record = begin_request()
+        response = await endpoint(request)
+        response.headers.update(record.headers())
+        return response
+    return wrapper
+
+
+def when_sent(response, callback):
+    """Calls callback() now, or for a stream once its body has ended or was cancelled."""
+    if isinstance(response, StreamingResponse):
+        response.body_iterator = _then(response.body_iterator, callback)
+    else:
+        callback()
+
+
+async def _then(body_iterator, callback):
+    try:
+        async for chunk in body_iterator:
+            yield chunk
+    finally:
+        callback()
+
+
+def with_request_timing(endpoint):
+    """Times the request's stages like app.add_server_timing; streams are logged once sent."""
+    @functools.wraps(endpoint)
+    async def wrapper(request):
+        timer = request_timing.begin_request()
+        response = await endpoint(request)
+        if timer is not None:
+            response.headers["Server-Timing"] = timer.header()
+            when_sent(response, functools.partial(timer.log, request.method, request.url.path, response.status_code))
+        return response
+    return wrapper
+
+
+def with_profiling(endpoint):
+    """Lets a running profiling session sample this request, like app.start_request_profiling."""
+    @functools.wraps(endpoint)
+    async def wrapper(request):
+        token = profiler.request_started(request.url.path)
+        if token is None:
+            return await endpoint(request)
+        try:
+            response = await endpoint(request)
+        except BaseException:
+            profiler.request_finished(token)
+            raise
+        when_sent(response, functools.partial(profiler.request_finished, token))
+        return response
+    return wrapper
+
+
+def with_metrics(endpoint):
+    """Counts and times the request like app.record_request_metrics."""
+    if not metrics.ENABLED:
+        return endpoint
+
+    @functools.wraps(endpoint)
+    async def wrapper(request):
+        route, started = request.url.path, time.perf_counter()
+        metrics.request_started(route)
+        try:
+            response = await endpoint(request)
+        except BaseException:
+            metrics.request_finished(route, request.method, 500, started)
+            raise
+        when_sent(response, functools.partial(metrics.request_finished, route, request.method,
+                                              response.status_code, started))
+        return response
+    return wrapper
+
+
+@with_request_id
+@with_metrics
+@with_profiling
+@with_request_timing
+@with_retry_headers
+async def chat(request):
+    """Async version of app.chat()."""
+    try:
+        data = await _read_json(request)
+        if not data:
+            return JSONResponse({"error": "Invalid JSON input."}, status_code=400)
+
+        message = data.get("message", "").strip()
+        file_data = data.get("fileData")
+        filename = data.get("filename")
+        stream = wants_event_stream(data, request.headers.get("accept"))
+        use_cache = not cache_bypassed(request.headers)
+
+        if not message and not (file_data and filename):
+            return JSONResponse({"error": "No message or file was provided."}, status_code=400)
+
+        if file_data and filename:
+            # Extraction is CPU-bound, keep it off the event loop.
+            extracted_text, error = await run_in_threadpool(profiler.follow(extract_text_from_file), file_data, filename)
+            if error:
+                return JSONResponse({"response": error}, status_code=400)
+            if not extracted_text:
+                return JSONResponse({"response": "Sorry, I could not extract any text from the document. It might be empty or an image-based file."})
+
+            is_resume_response = await get_groq_response_async(build_classification_prompt(extracted_text), use_cache=use_cache, call_site="classify")
+            final_prompt, document = build_document_prompt(extracted_text, message, is_resume_response)
+            if prompt_too_large(final_prompt):
+                return JSONResponse({"error": PROMPT_TOO_LARGE_MESSAGE}, status_code=413)
+
+            if stream:
+                circuit_breaker.check()
+                events = sse_from_deltas_async(stream_groq_response_async(final_prompt, use_cache=use_cache, call_site="document"))
+                return StreamingResponse(events, media_type="text/event-stream",
+                                         headers={**SSE_HEADERS, **document_headers(document)})
+
+            reply = await get_groq_response_async(final_prompt, use_cache=use_cache, call_site="document")
+            return JSONResponse({"response": reply}, headers=document_headers(document))
+
+        final_prompt = build_chat_prompt(message)
+        if prompt_too_large(final_prompt):
+            return JSONResponse({"error": PROMPT_TOO_LARGE_MESSAGE}, status_code=413)
+
+        if use_cache:
+            with request_timing.stage("near_duplicate"):
+                cached_reply, _ = near_duplicate_cache.lookup(message)
+            metrics.cache_lookup("near_duplicate", cached_reply is not None)
+            if cached_reply is not None:
+                if stream:
+                    return StreamingResponse(sse_from_deltas([cached_reply]), media_type="text/event-stream", headers=SSE_HEADERS)
+                return JSONResponse({"response": cached_reply})
+
+        on_complete = remember_near_duplicate(message) if use_cache else None
+        if stream:
+            circuit_breaker.check()
+            deltas = stream_groq_response_async(final_prompt, use_cache=use_cache, on_complete=on_complete)
+            events = sse_from_deltas_async(deltas)
+            return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
+
+        reply = await get_groq_response_async(final_prompt, use_cache=use_cache, on_complete=on_complete)
+        return JSONResponse({"response": reply})
+
+    except CircuitOpen as e:
+        return JSONResponse({"error": UPSTREAM_UNAVAILABLE_MESSAGE}, status_code=503, headers=circuit_open_headers(e))
+    except Exception as e:
+        log.exception("Unexpected error in /api/chat")
+        return JSONResponse({"error": "An internal server error occurred.", "message": str(e)}, status_code=500)
+
+
+@with_request_id
+@with_metrics
+@with_profiling
+@with_request_timing
+@with_retry_headers
+async def generate_quiz(request):
+    """Async version of app.generate_quiz()."""
+    try:
+        data = await _read_json(request)
+        topic, question_count, error = validate_quiz_request(data)
+        if error:
+            return JSONResponse({"error": "Invalid input", "message": error}, status_code=400)
+        prompt = build_quiz_prompt(topic, question_count)
+        if prompt_too_large(prompt):
+            return JSONResponse({"error": PROMPT_TOO_LARGE_MESSAGE}, status_code=413)
+
+        quiz_warmer.record(topic)
+        use_cache = not cache_bypassed(request.headers)
+        stream = wants_event_stream(data, request.headers.get("accept"))
+
+        pooled = quiz_pool.sample(topic, question_count) if use_cache else None
+        if use_cache and quiz_pool.enabled:
+            metrics.cache_lookup("quiz_pool", pooled is not None)
+        if pooled is not None:
+            if stream:
+                return StreamingResponse(sse_quiz_from_deltas([json.dumps(pooled)]), media_type="text/event-stream", headers=SSE_HEADERS)
+            return JSONResponse({"questions": pooled})
+
+        use_response_cache = use_cache and not quiz_pool.enabled
+        if stream:
+            circuit_breaker.check()
+            deltas = stream_groq_response_async(prompt, use_cache=use_response_cache, call_site="quiz", units=question_count)
+            events = sse_quiz_from_deltas_async(deltas, on_complete=lambda questions: quiz_pool.add(topic, questions))
+            return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
+
+        content = await get_groq_response_async(prompt, use_cache=use_response_cache, call_site="quiz", units=question_count)
+        questions = parse_quiz_content(content)
+        quiz_pool.add(topic, questions)
+        return JSONResponse({"questions": questions})
+
+    except CircuitOpen as e:
+        return JSONResponse({"error": UPSTREAM_UNAVAILABLE_MESSAGE}, status_code=503, headers=circuit_open_headers(e))
+    except Exception as e:
+        log.exception("Quiz generation error")
+        return JSONResponse({"error": QUIZ_ERROR_MESSAGE, "message": str(e)}, status_code=500)
+
+
+# Same CORS policy as the Flask app. It is only applied to the async routes because
+# Flask-CORS already decorates the responses of everything delegated to Flask.
+async_api = Starlette(
+    routes=[
+        Route("/api/chat", chat, methods=["POST"]),
+        Route("/api/generate-quiz", generate_quiz, methods=["POST"]),
+    ],
+    middleware=[
+        Middleware(
+            CORSMiddleware,
+            allow_origins=["https://edugen-ai-zeta.vercel.app", "http://localhost:3000"],
+            allow_methods=["GET", "POST", "OPTIONS"],
+            allow_headers=["Content-Type", "Authorization"],
+        )
+    ],
+)
+ASYNC_PATHS = {route.path for route in async_api.routes}
+
+wsgi_fallback = WSGIMiddleware(flask_app)
+
+
+async def asgi_app(scope, receive, send):
+    """Routes the async endpoints to Starlette and everything else to Flask."""
+    if scope["type"] == "lifespan" or scope.get("path") in ASYNC_PATHS:
+        await async_api(scope, receive, send)
+    else:
+        await wsgi_fallback(scope, receive, send)
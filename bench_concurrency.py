@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Concurrent throughput benchmark: WSGI (gunicorn app:app, as in the Procfile) vs ASGI (uvicorn asgi:asgi_app).
+
+The local stand-in for the Groq API (fake_groq.py) answers every completion after a fixed
+delay, so the numbers measure how many in-flight LLM calls each serving path can carry, not Groq itself.
+Every request has its own prompt and sends X-Cache-Bypass, so none is answered by the response
+cache, the near-duplicate index or the quiz pools, or shares an upstream call with another.
+
+Usage:
+    python bench_concurrency.py --requests 100 --concurrency 50 --upstream-latency 0.5
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+from fake_groq import FakeGroqConfig, start_fake_groq
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode, port, upstream_url, workers=1, threads=1, extra_env=None):
+    """Starts gunicorn (wsgi) or uvicorn (asgi) against the stand-in and waits until it is healthy."""
+    env = dict(os.environ, GROQ_API_KEY="bench-key", GROQ_BASE_URL=upstream_url, RATELIMIT_ENABLED="false",
+               GROQ_ADMISSION_ENABLED="false", **(extra_env or {}))
+    if mode == "wsgi":
+        cmd = [sys.executable, "-m", "gunicorn", "app:app", "--bind", f"127.0.0.1:{port}",
+               "--workers", str(workers), "--threads", str(threads), "--timeout", "120", "--log-level", "warning"]
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "asgi:asgi_app", "--host", "127.0.0.1", "--port", str(port),
+               "--workers", str(workers), "--log-level", "warning"]
+    proc = subprocess.Popen(cmd, env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                            stdout=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/api/health", timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"{mode} server did not become healthy")
+
+
+def request_payload(endpoint, n):
+    if endpoint == "/api/chat":
+        return {"message": f"What is photosynthesis? (#{n})"}
+    return {"topic": f"Python basics (#{n})", "count": 5}
+
+
+async def run_load(base_url, endpoint, total, concurrency):
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=600) as http:
+        async def one(n):
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await http.post(endpoint, json=request_payload(endpoint, n),
+                                               headers={"X-Cache-Bypass": "1"})
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(n) for n in range(total)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2),
+        "p50_s": round(latencies[len(latencies) // 2], 3),
+        "p95_s": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--upstream-latency", type=float, default=0.5, help="seconds per stand-in completion")
+    parser.add_argument("--endpoint", choices=["/api/chat", "/api/generate-quiz"], default="/api/chat")
+    parser.add_argument("--modes", default="wsgi,asgi")
+    args = parser.parse_args()
+
+    upstream = start_fake_groq(FakeGroqConfig(latency=args.upstream_latency, tokens_per_second=0))
+    upstream_url = upstream.base_url
+    results = {}
+    for mode in args.modes.split(","):
+        port = free_port()
+        proc = start_server(mode, port, upstream_url)
+        try:
+            results[mode] = asyncio.run(run_load(f"http://127.0.0.1:{port}", args.endpoint, args.requests, args.concurrency))
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+        print(f"{mode}: {json.dumps(results[mode])}")
+
+    if "wsgi" in results and "asgi" in results:
+        speedup = results["asgi"]["throughput_rps"] / results["wsgi"]["throughput_rps"]
+        print(f"ASGI/WSGI throughput ratio: {speedup:.1f}x")
+    upstream.shutdown()
+
+
+if __name__ == "__main__":
+    main()
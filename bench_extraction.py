@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of document text extraction, the main CPU hot path of /api/chat uploads.
+
+A reproducible synthetic corpus (synthetic_docs.py) of PDFs and DOCX files with varying
+page counts, tables and encodings goes through the three stages of
+app.extract_text_from_file(), timed separately:
+
+    decode   base64 data URL -> bytes          (document_extraction.decode_upload)
+    parse    bytes -> PdfReader / Document      (document_extraction.parse_document)
+    extract  parsed document -> text            (document_extraction.document_text)
+
+PDFs with at least PDF_PARALLEL_MIN_PAGES pages are extracted by the page-parallel pool
+as in the app; --pdf-workers overrides PDF_EXTRACTION_WORKERS (0: extract in-process).
+The baseline records the worker count it was taken with.
+
+Times are the median of --repeat runs. Peak memory is measured per stage in one extra run
+under tracemalloc (Python allocations only, in-process extraction), since tracing slows everything down.
+
+--save writes the results as a baseline; --compare reports the change against one and
+exits with status 1 when any document got slower than --threshold (default 25%) and by
+more than --min-delta-ms. Compare against a baseline recorded on the same machine.
+
+Usage:
+    python bench_extraction.py --repeat 5
+    python bench_extraction.py --save baselines/extraction.json
+    python bench_extraction.py --compare baselines/extraction.json
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import document_extraction
+from document_extraction import decode_upload, document_kind, document_text, parse_document
+from synthetic_docs import data_url, make_docx, make_pdf
+
+STAGES = ("decode", "parse", "extract")
+
+# name -> (kind, generator keyword arguments)
+CORPUS = {
+    "pdf-1p": ("pdf", dict(pages=1)),
+    "pdf-10p": ("pdf", dict(pages=10)),
+    "pdf-50p": ("pdf", dict(pages=50)),
+    "pdf-200p": ("pdf", dict(pages=200)),
+    "pdf-20p-tables": ("pdf", dict(pages=20, table_rows_per_page=30)),
+    "pdf-20p-latin1": ("pdf", dict(pages=20, charset="latin1")),
+    "pdf-20p-flate": ("pdf", dict(pages=20, compress=True)),
+    "docx-20": ("docx", dict(paragraphs=20)),
+    "docx-200": ("docx", dict(paragraphs=200)),
+    "docx-1000": ("docx", dict(paragraphs=1000)),
+    "docx-200-tables": ("docx", dict(paragraphs=200, tables=10, rows_per_table=20)),
+    "docx-200-unicode": ("docx", dict(paragraphs=200, charset="unicode")),
+}
+
+
+def build_corpus(names=None):
+    """Returns {name: (filename, data URL)} for the selected corpus entries."""
+    corpus = {}
+    for name, (kind, options) in CORPUS.items():
+        if names and name not in names:
+            continue
+        content = make_pdf(seed=1, **options) if kind == "pdf" else make_docx(seed=1, **options)
+        corpus[name] = (f"{name}.{kind}", data_url(content, kind))
+    return corpus
+
+
+def run_stages(file_data, filename):
+    """Runs decode, parse and extract once; returns ({stage: seconds}, text)."""
+    kind = document_kind(filename)
+    seconds = {}
+
+    started = time.perf_counter()
+    data = decode_upload(file_data)
+    seconds["decode"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    document = parse_document(data, kind)
+    seconds["parse"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    text = document_text(document, kind, data)
+    seconds["extract"] = time.perf_counter() - started
+    return seconds, text
+
+
+def benchmark(corpus, repeat):
+    results = {}
+    for name, (filename, file_data) in corpus.items():
+        samples = {stage: [] for stage in STAGES}
+        _, text = run_stages(file_data, filename)  # warm-up: lazy imports, caches
+        for _ in range(repeat):
+            seconds, text = run_stages(file_data, filename)
+            for stage in STAGES:
+                samples[stage].append(seconds[stage])
+        memory = _stage_peaks(file_data, filename)
+        results[name] = {
+            "upload_bytes": len(file_data),
+            "text_chars": len(text),
+            **{f"{stage}_ms": round(statistics.median(samples[stage]) * 1000, 3) for stage in STAGES},
+            "total_ms": round(sum(statistics.median(samples[stage]) for stage in STAGES) * 1000, 3),
+            **{f"{stage}_peak_kb": round(memory[stage] / 1024, 1) for stage in STAGES},
+        }
+    return results
+
+
+def _stage_peaks(file_data, filename):
+    """Peak traced memory (bytes) allocated on top of what was live at the start of each stage."""
+    kind = document_kind(filename)
+    peaks = {}
+    tracemalloc.start()
+    try:
+        def stage(name, fn, *args):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            result = fn(*args)
+            peaks[name] = tracemalloc.get_traced_memory()[1] - base
+            return result
+
+        data = stage("decode", decode_upload, file_data)
+        document = stage("parse", parse_document, data, kind)
+        stage("extract", document_text, document, kind)
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+
+def environment():
+    PyPDF2, _ = document_extraction.load_document_modules()
+    import docx
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "PyPDF2": PyPDF2.__version__,
+        "python-docx": getattr(docx, "__version__", "unknown"),
+        "pdf_workers": document_extraction.PDF_EXTRACTION_WORKERS,
+    }
+
+
+def print_results(results, baseline=None):
+    columns = ["decode_ms", "parse_ms", "extract_ms", "total_ms", "parse_peak_kb", "extract_peak_kb"]
+    print(f"{'document':<18} {'upload KB':>10} " + " ".join(f"{c:>15}" for c in columns)
+          + (f" {'vs baseline':>12}" if baseline else ""))
+    for name, row in results.items():
+        line = f"{name:<18} {row['upload_bytes'] / 1024:>10.1f} " + " ".join(f"{row[c]:>15}" for c in columns)
+        if baseline and name in baseline:
+            line += f" {_change(row['total_ms'], baseline[name]['total_ms']):>12}"
+        print(line)
+
+
+def _change(value, reference):
+    return f"{(value / reference - 1) * 100:+.1f}%" if reference else "n/a"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", help="comma-separated corpus entries to run")
+    parser.add_argument("--save", help="write the results as a baseline JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="slowdown that counts as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0,
+                        help="ignore slowdowns smaller than this many milliseconds (timer noise)")
+    parser.add_argument("--pdf-workers", type=int,
+                        help="page-parallel PDF extraction processes (default: PDF_EXTRACTION_WORKERS)")
+    args = parser.parse_args()
+
+    if args.pdf_workers is not None:
+        document_extraction.PDF_EXTRACTION_WORKERS = args.pdf_workers
+    if not document_extraction.AVAILABLE:
+        sys.exit("PyPDF2 and python-docx are required")
+    corpus = build_corpus(args.only.split(",") if args.only else None)
+    results = benchmark(corpus, args.repeat)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as handle:
+            baseline = json.load(handle)["results"]
+    print_results(results, baseline)
+
+    if args.save:
+        with open(args.save, "w") as handle:
+            json.dump({"environment": environment(), "repeat": args.repeat, "results": results}, handle, indent=2)
+            handle.write("\n")
+    if baseline:
+        regressions = [name for name, row in results.items() if name in baseline
+                       and row["total_ms"] > baseline[name]["total_ms"] * (1 + args.threshold)
+                       and row["total_ms"] - baseline[name]["total_ms"] > args.min_delta_ms]
+        if regressions:
+            print(f"Slower than the baseline by more than {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Open-loop load test of the HTTP endpoints, driven by a JSON scenario file.
+
+A scenario describes the traffic mix (chat, streamed chat, quiz, PDF/DOCX uploads with
+weights), the arrival rate in requests per second (optionally in phases), the stand-in
+upstream (fake_groq.py settings) and one or more server configurations to compare
+(wsgi/asgi, workers, threads, extra environment such as cache sizes). See scenarios/.
+
+Arrivals are open-loop: requests are sent on a Poisson (or evenly spaced) schedule no
+matter how fast the server answers, and latency is measured from the scheduled send
+time, so a server that falls behind shows up as queueing delay instead of as a lower
+request rate. For each request type and endpoint the report gives throughput, latency
+percentiles, the error rate, the 429 rate and the share of responses carrying
+Retry-After (busy replies and circuit-breaker 503s).
+
+Usage:
+    python bench_load.py scenarios/mixed.json
+    python bench_load.py scenarios/caching.json --duration 20 --output results.json
+    python bench_load.py scenarios/mixed.json --target http://127.0.0.1:10000   # running server
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+
+import httpx
+
+from bench_concurrency import free_port, start_server
+from fake_groq import FakeGroqConfig, start_fake_groq
+from synthetic_docs import data_url, make_docx, make_pdf
+
+DEFAULT_CONFIGURATIONS = [{"name": "wsgi", "mode": "wsgi"}]
+
+
+class RequestType:
+    """One weighted entry of a scenario's traffic mix; builds the payload of each request."""
+
+    def __init__(self, spec, seed):
+        self.name = spec["name"]
+        self.endpoint = spec.get("endpoint", "/api/chat")
+        self.weight = spec.get("weight", 1)
+        self.spec = spec
+        self.headers = {"X-Cache-Bypass": "1"} if spec.get("cache_bypass") else {}
+        self._counter = itertools.count()
+        self._rng = random.Random(seed)
+        self._file = None
+        if "file" in spec:
+            kind = spec["file"]["type"]
+            content = (make_pdf(spec["file"].get("pages", 3), seed=seed) if kind == "pdf"
+                       else make_docx(spec["file"].get("paragraphs", 30), seed=seed))
+            self._file = {"fileData": data_url(content, kind), "filename": f"{self.name}.{kind}"}
+
+    def payload(self):
+        spec, n = self.spec, next(self._counter)
+        suffix = f" (#{n})" if spec.get("unique") else ""
+        if self.endpoint == "/api/generate-quiz":
+            topic = self._rng.choice(spec.get("topics", ["Python basics"]))
+            body = {"topic": topic + suffix, "count": spec.get("count", 5)}
+        else:
+            body = {"message": self._rng.choice(spec.get("messages", [""])) + suffix}
+            if self._file:
+                body.update(self._file)
+        if spec.get("stream"):
+            body["stream"] = True
+        return body
+
+
+def schedule(phases, rng, arrival="poisson"):
+    """Yields arrival offsets in seconds for a list of {"duration", "rate"} phases."""
+    start = 0.0
+    for phase in phases:
+        rate, end = phase["rate"], start + phase["duration"]
+        at = start
+        while rate > 0:
+            at += rng.expovariate(rate) if arrival == "poisson" else 1 / rate
+            if at >= end:
+                break
+            yield at
+        start = end
+
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] if ordered else None
+
+
+def summarize(samples, elapsed):
+    """samples: (latency, status, retry_after) per request; status None for transport errors."""
+    latencies = sorted(latency for latency, status, _ in samples if status is not None and status < 400)
+    total = len(samples)
+    errors = sum(1 for _, status, _ in samples if status is None or (status >= 400 and status != 429))
+    return {
+        "requests": total,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_s": _round(percentile(latencies, 0.5)),
+        "p90_s": _round(percentile(latencies, 0.9)),
+        "p99_s": _round(percentile(latencies, 0.99)),
+        "max_s": _round(latencies[-1] if latencies else None),
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "rate_429": round(sum(1 for _, status, _ in samples if status == 429) / total, 4) if total else 0.0,
+        "retry_after_rate": round(sum(1 for *_, retry_after in samples if retry_after) / total, 4) if total else 0.0,
+    }
+
+
+def _round(value):
+    return round(value, 3) if value is not None else None
+
+
+async def run_traffic(base_url, scenario, seed):
+    rng = random.Random(seed)
+    types = [RequestType(spec, seed + i) for i, spec in enumerate(scenario["requests"])]
+    weights = [t.weight for t in types]
+    phases = scenario.get("phases") or [{"duration": scenario.get("duration", 30), "rate": scenario.get("rate", 5)}]
+    arrivals = [(at, rng.choices(types, weights)[0]) for at in schedule(phases, rng, scenario.get("arrival", "poisson"))]
+    samples = {t.name: [] for t in types}
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=200)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=scenario.get("timeout", 130)) as http:
+        async def fire(request_type, payload, scheduled):
+            status = retry_after = None
+            try:
+                async with http.stream("POST", request_type.endpoint, json=payload, headers=request_type.headers) as response:
+                    await response.aread()
+                    status, retry_after = response.status_code, response.headers.get("retry-after")
+            except httpx.HTTPError:
+                pass
+            samples[request_type.name].append((time.perf_counter() - scheduled, status, retry_after))
+
+        tasks, started = [], time.perf_counter()
+        for at, request_type in arrivals:
+            payload = request_type.payload()
+            delay = started + at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(fire(request_type, payload, started + at)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+        try:
+            health = (await http.get("/api/health")).json()
+        except (httpx.HTTPError, ValueError):
+            health = {}
+
+    report = {"elapsed_s": round(elapsed, 3), "by_type": {}, "by_endpoint": {}}
+    for t in types:
+        report["by_type"][t.name] = dict(endpoint=t.endpoint, **summarize(samples[t.name], elapsed))
+    for endpoint in sorted({t.endpoint for t in types}):
+        merged = [s for t in types if t.endpoint == endpoint for s in samples[t.name]]
+        report["by_endpoint"][endpoint] = summarize(merged, elapsed)
+    report["all"] = summarize([s for values in samples.values() for s in values], elapsed)
+    # Cache statistics of whichever worker answered the health check.
+    report["server"] = {key: health[key] for key in ("response_cache", "near_duplicate_cache", "quiz_pool",
+                                                     "single_flight") if key in health}
+    return report
+
+
+def print_report(name, report):
+    print(f"\n== {name} ({report['elapsed_s']} s)")
+    header = f"{'request':<18} {'endpoint':<20} {'n':>6} {'rps':>8} {'p50':>8} {'p90':>8} {'p99':>8} {'err%':>6} {'429%':>6}"
+    print(header)
+    rows = [(key, value.get("endpoint", ""), value) for key, value in report["by_type"].items()]
+    rows += [("*", endpoint, value) for endpoint, value in report["by_endpoint"].items()]
+    rows.append(("all", "", report["all"]))
+    for key, endpoint, value in rows:
+        print(f"{key:<18} {endpoint:<20} {value['requests']:>6} {value['throughput_rps']:>8} "
+              f"{_fmt(value['p50_s'])} {_fmt(value['p90_s'])} {_fmt(value['p99_s'])} "
+              f"{value['error_rate'] * 100:>6.1f} {value['rate_429'] * 100:>6.1f}")
+
+
+def _fmt(value):
+    return f"{value:>8.3f}" if value is not None else f"{'-':>8}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenario", help="path of a scenario JSON file")
+    parser.add_argument("--duration", type=float, help="override the scenario duration (single-phase scenarios)")
+    parser.add_argument("--rate", type=float, help="override the arrival rate (single-phase scenarios)")
+    parser.add_argument("--configurations", help="comma-separated names of the configurations to run")
+    parser.add_argument("--target", help="load an already running server instead of starting one")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the full report as JSON")
+    args = parser.parse_args()
+
+    with open(args.scenario) as handle:
+        scenario = json.load(handle)
+    if args.duration is not None:
+        scenario["duration"] = args.duration
+    if args.rate is not None:
+        scenario["rate"] = args.rate
+
+    results = {}
+    if args.target:
+        results["target"] = asyncio.run(run_traffic(args.target, scenario, args.seed))
+        print_report(args.target, results["target"])
+    else:
+        upstream = start_fake_groq(FakeGroqConfig(**scenario.get("upstream", {})))
+        configurations = scenario.get("configurations") or DEFAULT_CONFIGURATIONS
+        if args.configurations:
+            wanted = args.configurations.split(",")
+            configurations = [c for c in configurations if c["name"] in wanted]
+        for configuration in configurations:
+            port = free_port()
+            proc = start_server(configuration.get("mode", "wsgi"), port, upstream.base_url,
+                                workers=configuration.get("workers", 1), threads=configuration.get("threads", 1),
+                                extra_env={key: str(value) for key, value in configuration.get("env", {}).items()})
+            try:
+                results[configuration["name"]] = asyncio.run(run_traffic(f"http://127.0.0.1:{port}", scenario, args.seed))
+            finally:
+                proc.terminate()
+                proc.wait(timeout=30)
+            print_report(configuration["name"], results[configuration["name"]])
+        upstream.shutdown()
+
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump({"scenario": scenario, "results": results}, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
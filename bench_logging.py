@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Per-request cost of logging on the request thread, for each way the app can log.
+
+Worker threads simulate requests: each one does --work-ms of (sleeping) work and logs a
+typical mix of lines (an upstream retry warning, a retry notice, the request timing
+line with structured fields, and every --error-every requests an exception with its
+traceback). The time spent in the logging calls is measured on the request thread, with
+the output going to a sink that takes --sink-latency-ms per line (a busy stdout pipe or
+log collector).
+
+    off     no logging (floor of the harness itself)
+    print   print() lines, as the app used to do
+    sync    logging with a StreamHandler and the JSON formatter on the request thread
+    queue   structured_logging: bounded queue, JSON formatting on a listener thread
+
+Usage:
+    python bench_logging.py
+    python bench_logging.py --threads 16 --sink-latency-ms 0.5 --modes sync,queue
+"""
+import argparse
+import logging
+import statistics
+import threading
+import time
+
+import structured_logging
+
+
+class SlowSink:
+    """File-like sink that spends `latency` seconds per line written."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.lines = 0
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        lines = text.count("\n")
+        if lines:
+            with self._lock:  # one writer at a time, like a pipe
+                self.lines += lines
+                if self.latency:
+                    time.sleep(self.latency * lines)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def _fail():
+    def parse(payload):
+        return payload["questions"][0]
+    return parse({})
+
+
+def request_lines(emit, n, error_every):
+    """Logs the lines of request n through emit(level, message, args, fields, exc)."""
+    emit(logging.WARNING, "Groq API error (attempt %d, %s): %s", (1, "rate_limit", "429 Too Many Requests"), None, False)
+    emit(logging.INFO, "Retrying in %.2fs%s", (0.53, " (server hint)"), None, False)
+    emit(logging.INFO, "request timing", (), {
+        "event": "request_timing", "method": "POST", "path": "/api/chat", "status": 200, "total_ms": 231.4,
+        "stages": [{"name": "decode", "ms": 0.1}, {"name": "parse", "ms": 0.3}, {"name": "classify", "ms": 94.9}],
+    }, False)
+    if error_every and n % error_every == 0:
+        try:
+            _fail()
+        except Exception:
+            emit(logging.ERROR, "Unexpected error in /api/chat", (), None, True)
+
+
+def make_emitter(mode, sink):
+    """Returns (emit, finish); finish() waits for the output and returns extra stats."""
+    if mode == "off":
+        return (lambda *args: None), dict
+
+    if mode == "print":
+        import traceback
+
+        def emit(level, message, args, fields, exc):
+            line = message % args if args else message
+            if fields:
+                line += f" {fields}"
+            print(line, file=sink)
+            if exc:
+                print(f"Full traceback: {traceback.format_exc()}", file=sink)
+        return emit, dict
+
+    logger = logging.getLogger(f"bench_logging.{mode}")
+    logger.handlers.clear()
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    if mode == "sync":
+        handler = logging.StreamHandler(sink)
+        handler.setFormatter(structured_logging.JsonFormatter())
+        logger.addHandler(handler)
+        listener = stats = None
+    else:
+        handler, listener, stats = structured_logging.build_queue_handler(
+            sink, structured_logging.JsonFormatter(), queue_size=10000)
+        logger.addHandler(handler)
+        listener.start()
+
+    def emit(level, message, args, fields, exc):
+        logger.log(level, message, *args, extra={"fields": fields} if fields else None, exc_info=exc)
+
+    def finish():
+        if listener is None:
+            return {}
+        started = time.perf_counter()
+        listener.stop()  # drains the queue
+        return dict(stats.snapshot(), drain_s=round(time.perf_counter() - started, 3))
+    return emit, finish
+
+
+def run_mode(mode, threads, requests, work, sink_latency, error_every):
+    sink = SlowSink(sink_latency)
+    emit, finish = make_emitter(mode, sink)
+    samples = [[] for _ in range(threads)]
+
+    def worker(index):
+        structured_logging.begin_request()
+        for n in range(requests):
+            if work:
+                time.sleep(work)
+            started = time.perf_counter()
+            request_lines(emit, n, error_every)
+            samples[index].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    extra = finish()
+
+    ordered = sorted(s for per_thread in samples for s in per_thread)
+    return {
+        "requests": len(ordered),
+        "elapsed_s": round(elapsed, 3),
+        "mean_us": round(statistics.fmean(ordered) * 1e6, 1),
+        "p50_us": round(ordered[len(ordered) // 2] * 1e6, 1),
+        "p99_us": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1e6, 1),
+        "max_us": round(ordered[-1] * 1e6, 1),
+        "lines_written": sink.lines,
+        **extra,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="off,print,sync,queue")
+    parser.add_argument("--threads", type=int, default=8, help="concurrent request threads")
+    parser.add_argument("--requests", type=int, default=500, help="requests per thread")
+    parser.add_argument("--work-ms", type=float, default=2.0, help="simulated work per request")
+    parser.add_argument("--sink-latency-ms", type=float, default=0.05, help="output cost per line")
+    parser.add_argument("--error-every", type=int, default=20, help="log an exception every N requests (0: never)")
+    args = parser.parse_args()
+
+    print(f"{'mode':<6} {'requests':>8} {'mean us':>9} {'p50 us':>9} {'p99 us':>9} {'max us':>10} "
+          f"{'lines':>7} {'dropped':>8} {'elapsed s':>10} {'drain s':>8}")
+    for mode in args.modes.split(","):
+        result = run_mode(mode, args.threads, args.requests, args.work_ms / 1000, args.sink_latency_ms / 1000,
+                          args.error_every)
+        print(f"{mode:<6} {result['requests']:>8} {result['mean_us']:>9} {result['p50_us']:>9} "
+              f"{result['p99_us']:>9} {result['max_us']:>10} {result['lines_written']:>7} "
+              f"{result.get('dropped', 0):>8} {result['elapsed_s']:>10} {result.get('drain_s', 0):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Lookup latency benchmark for the near-duplicate chat cache (near_duplicate.py).
+
+Fills the index with synthetic student questions, then times lookups of rephrased
+copies of indexed questions (expected hits) and of unseen questions (expected misses).
+
+Usage:
+    python bench_near_duplicate.py --entries 1000000 --lookups 20000
+"""
+import argparse
+import random
+import resource
+import string
+import time
+
+from near_duplicate import NearDuplicateIndex
+
+TEMPLATES = [
+    "what is {0} {1}",
+    "how does {0} affect {1}",
+    "difference between {0} and {1} in {2}",
+    "why is {0} important for {1}",
+    "give examples of {0} {1} used in {2}",
+    "how do i calculate {0} of {1}",
+]
+REPHRASINGS = ["{}??", "please explain {}", "Can you tell me {}", "{} briefly", "{}, explain"]
+
+
+def make_vocabulary(size, rng):
+    return ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10))) for _ in range(size)]
+
+
+def make_question(vocabulary, rng):
+    return rng.choice(TEMPLATES).format(*rng.sample(vocabulary, 3))
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def time_lookups(index, questions):
+    latencies, hits = [], 0
+    for question in questions:
+        started = time.perf_counter()
+        answer, _ = index.lookup(question)
+        latencies.append(time.perf_counter() - started)
+        hits += answer is not None
+    latencies.sort()
+    return {
+        "hit_rate": round(hits / len(questions), 4),
+        "p50_us": round(percentile(latencies, 0.50) * 1e6, 1),
+        "p99_us": round(percentile(latencies, 0.99) * 1e6, 1),
+        "max_us": round(latencies[-1] * 1e6, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=20_000)
+    parser.add_argument("--vocabulary", type=int, default=50_000)
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+    index = NearDuplicateIndex(threshold=args.threshold, max_entries=args.entries)
+    answer = "• Cached answer."
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    indexed = []
+    started = time.perf_counter()
+    for i in range(args.entries):
+        question = make_question(vocabulary, rng)
+        index.add(question, answer)
+        if i % max(1, args.entries // args.lookups) == 0:
+            indexed.append(question)
+    build_seconds = time.perf_counter() - started
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    rephrased = [rng.choice(REPHRASINGS).format(question) for question in indexed[:args.lookups]]
+    unseen = [make_question(vocabulary, rng) for _ in range(args.lookups)]
+
+    print(f"entries: {len(index):,}  build: {build_seconds:.1f}s "
+          f"({build_seconds / args.entries * 1e6:.1f} us/insert)  "
+          f"peak RSS growth: {(rss_after - rss_before) / 1024:.0f} MiB")
+    print(f"rephrased (expected hits): {time_lookups(index, rephrased)}")
+    print(f"unseen (expected misses):  {time_lookups(index, unseen)}")
+
+
+if __name__ == "__main__":
+    main()
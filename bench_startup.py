@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Startup-time benchmark for the EduGen AI backend.
+
+Reports, per stage:
+    interpreter      bare `python -c pass`
+    import:<module>  cumulative import cost of each top-level dependency of app.py (-X importtime)
+    import app       wall time of `import app` with no upstream warm-up
+    deferred imports PyPDF2 + python-docx, which are now loaded on first use
+    boot             gunicorn start -> first 200 from /api/health, per GROQ_WARMUP mode
+    upstream ready   gunicorn start -> /api/health reports the upstream as ready
+
+A local stand-in answers the warm-up call after --upstream-latency seconds, so the cost of
+a blocking warm-up is visible without a Groq key.
+
+Usage:
+    python bench_startup.py --runs 5 --upstream-latency 1.5
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from bench_concurrency import free_port
+from fake_groq import FakeGroqConfig, start_fake_groq
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def bench_env(upstream_url, warmup="off"):
+    return dict(os.environ, GROQ_API_KEY="bench-key", GROQ_BASE_URL=upstream_url,
+                GROQ_WARMUP=warmup, QUIZ_WARMER_ENABLED="false")
+
+
+def wall_time(cmd, env, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(cmd, env=env, cwd=HERE, check=True, capture_output=True)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def top_level_import_times(env):
+    """Returns {module: cumulative seconds} for modules imported directly by `import app`."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"],
+                            env=env, cwd=HERE, check=True, capture_output=True, text=True)
+    # -X importtime prints children (indented two spaces per level) before their parent, so
+    # direct imports are collected at depth 2 and kept once the parent turns out to be app.
+    times, pending = {}, {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        cumulative, indent, name = int(match.group(2)), len(match.group(3)), match.group(4)
+        if indent == 2:
+            package = name.split(".")[0]
+            pending[package] = pending.get(package, 0) + cumulative / 1e6
+        elif indent == 0:
+            if name == "app":
+                times = pending
+            pending = {}
+    return dict(sorted(times.items(), key=lambda item: item[1], reverse=True))
+
+
+def boot_times(upstream_url, warmup, timeout=120):
+    port = free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app:app", "--bind", f"127.0.0.1:{port}", "--workers", "1",
+         "--timeout", "120", "--log-level", "warning"],
+        env=bench_env(upstream_url, warmup), cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    healthy = ready = None
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                health = httpx.get(f"http://127.0.0.1:{port}/api/health", timeout=1)
+            except httpx.HTTPError:
+                time.sleep(0.02)
+                continue
+            if health.status_code == 200:
+                healthy = healthy or time.perf_counter() - started
+                if health.json()["upstream"]["state"] == "ready" or warmup in ("off", "lazy"):
+                    ready = time.perf_counter() - started if warmup not in ("off", "lazy") else None
+                    break
+            time.sleep(0.02)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+    return healthy, ready
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--upstream-latency", type=float, default=1.5, help="seconds the warm-up call takes")
+    parser.add_argument("--modes", default="blocking,background,lazy")
+    args = parser.parse_args()
+
+    upstream = start_fake_groq(FakeGroqConfig(latency=args.upstream_latency, tokens_per_second=0))
+    upstream_url = upstream.base_url
+    env = bench_env(upstream_url)
+
+    rows = [("interpreter", wall_time([sys.executable, "-c", "pass"], env, args.runs))]
+    rows += [(f"import:{name}", seconds) for name, seconds in top_level_import_times(env).items() if seconds >= 0.001]
+    rows.append(("import app (total)", wall_time([sys.executable, "-c", "import app"], env, args.runs)))
+    rows.append(("deferred: PyPDF2 + docx", wall_time([sys.executable, "-c", "import PyPDF2, docx"], env, args.runs)
+                 - rows[0][1]))
+    for mode in args.modes.split(","):
+        samples = [boot_times(upstream_url, mode) for _ in range(args.runs)]
+        rows.append((f"boot [{mode}] -> healthy", statistics.median(s[0] for s in samples)))
+        if mode not in ("off", "lazy"):
+            rows.append((f"boot [{mode}] -> upstream ready", statistics.median(s[1] for s in samples)))
+    upstream.shutdown()
+
+    width = max(len(name) for name, _ in rows)
+    for name, seconds in rows:
+        print(f"{name:<{width}}  {seconds * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
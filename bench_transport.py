@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Per-call upstream overhead microbenchmark for the Groq client transport.
+
+Runs the Groq SDK against a local stand-in server (zero model latency, optionally over
+TLS with a throwaway self-signed certificate) and compares:
+
+    fresh-client     a new client, and therefore a new connection, for every call
+    library-default  one client with the Groq SDK's default pool (5 s keep-alive)
+    managed-pool     one client built by upstream_transport.build_http_client()
+
+Each configuration runs sequential calls (pure per-call overhead) and then bursts of
+concurrent calls separated by an idle gap, which is where a short keep-alive forces
+new TCP/TLS handshakes.
+
+Usage:
+    python bench_transport.py --tls --calls 200 --bursts 4 --burst-size 20 --gap 6
+"""
+import argparse
+import os
+import ssl
+import statistics
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from groq import Groq
+
+from fake_groq import FakeGroqConfig, start_fake_groq
+from upstream_transport import build_http_client, transport_settings
+
+LIBRARY_DEFAULT_SETTINGS = dict(transport_settings(), max_connections=100, max_keepalive_connections=20,
+                                keepalive_expiry=5.0, http2=False)
+
+
+def self_signed_context(directory):
+    cert, key = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                    "-subj", "/CN=127.0.0.1", "-keyout", key, "-out", cert],
+                   check=True, capture_output=True)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    return context
+
+
+class Configuration:
+    def __init__(self, name, base_url, settings, verify, fresh=False):
+        self.name = name
+        self.base_url = base_url
+        self.settings = settings
+        self.verify = verify
+        self.fresh = fresh
+        self.connections_opened = 0
+        self.tls_handshakes = 0
+        self._shared = None if fresh else self._new_client()
+
+    def _new_client(self):
+        http_client, stats = build_http_client(self.settings, verify=self.verify)
+        client = Groq(api_key="bench-key", base_url=self.base_url, http_client=http_client, max_retries=0)
+        return client, http_client, stats
+
+    def call(self):
+        client, http_client, stats = self._new_client() if self.fresh else self._shared
+        started = time.perf_counter()
+        client.chat.completions.create(model="llama-3.1-8b-instant", max_tokens=5,
+                                       messages=[{"role": "user", "content": "ping"}])
+        elapsed = time.perf_counter() - started
+        if self.fresh:
+            http_client.close()
+            self._count(stats)
+        return elapsed
+
+    def _count(self, stats):
+        snapshot = stats.snapshot()
+        self.connections_opened += snapshot["connections_opened"]
+        self.tls_handshakes += snapshot["tls_handshakes"]
+
+    def totals(self):
+        if not self.fresh:
+            self.connections_opened, self.tls_handshakes = 0, 0
+            self._count(self._shared[2])
+        return {"connections_opened": self.connections_opened, "tls_handshakes": self.tls_handshakes}
+
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    return {
+        "mean_ms": round(statistics.mean(latencies) * 1000, 3),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 3),
+    }
+
+
+def run(configuration, calls, bursts, burst_size, gap):
+    configuration.call()  # warm-up: first connection / TLS session
+    sequential = summarize([configuration.call() for _ in range(calls)])
+    burst_latencies = []
+    with ThreadPoolExecutor(max_workers=burst_size) as pool:
+        for burst in range(bursts):
+            if burst:
+                time.sleep(gap)
+            burst_latencies.extend(pool.map(lambda _: configuration.call(), range(burst_size)))
+    return {"sequential": sequential, "bursty": summarize(burst_latencies), **configuration.totals()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200, help="sequential calls per configuration")
+    parser.add_argument("--bursts", type=int, default=4)
+    parser.add_argument("--burst-size", type=int, default=20)
+    parser.add_argument("--gap", type=float, default=6.0, help="idle seconds between bursts")
+    parser.add_argument("--tls", action="store_true", help="serve the stand-in over HTTPS")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        context = self_signed_context(directory) if args.tls else None
+        upstream = start_fake_groq(FakeGroqConfig(latency=0, tokens_per_second=0), ssl_context=context)
+        base_url = upstream.base_url
+        verify = False if args.tls else True
+
+        configurations = [
+            Configuration("fresh-client", base_url, LIBRARY_DEFAULT_SETTINGS, verify, fresh=True),
+            Configuration("library-default", base_url, LIBRARY_DEFAULT_SETTINGS, verify),
+            Configuration("managed-pool", base_url, transport_settings(), verify),
+        ]
+        for configuration in configurations:
+            print(f"{configuration.name}: {run(configuration, args.calls, args.bursts, args.burst_size, args.gap)}")
+        upstream.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Circuit breaker for the Groq upstream.
+
+The breaker watches the outcome of every upstream attempt over a rolling window.
+Server errors, timeouts and connection failures count as failures; calls slower than
+slow_call_seconds count as slow. Rate limits and bad requests say nothing about
+upstream health and are not counted.
+
+    closed     calls go through. Once the window holds min_calls outcomes and the
+               failure rate or the slow-call rate crosses its threshold, it opens.
+    open       calls fail fast with CircuitOpen (the web layer answers 503 with
+               Retry-After) for open_seconds.
+    half_open  up to trial_calls calls are let through at a time. A failed or slow
+               trial opens the circuit again; trial_calls successes close it.
+
+State is per process: each gunicorn worker learns about an outage from its own calls.
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+log = logging.getLogger("edugen.circuit_breaker")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling the upstream while the circuit is open."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"upstream circuit open; retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Closed / open / half-open state over a rolling window of upstream outcomes."""
+
+    def __init__(self, window=60, min_calls=10, failure_rate=0.5, slow_call_seconds=30, slow_call_rate=0.8,
+                 open_seconds=30, trial_calls=3, enabled=True):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.trial_calls = trial_calls
+        self.enabled = enabled
+        self._outcomes = deque()      # (timestamp, failed, slow)
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._trials_in_flight = 0
+        self._trial_successes = 0
+        self.opened = 0
+        self.rejected = 0
+
+    def _retry_after(self, now):
+        if self.state == OPEN:
+            return max(0.0, self._opened_at + self.open_seconds - now)
+        return 1.0  # half-open with every trial slot taken
+
+    def _advance(self, now):
+        """Moves an open circuit to half-open once open_seconds have passed. Caller holds the lock."""
+        if self.state == OPEN and now >= self._opened_at + self.open_seconds:
+            self.state = HALF_OPEN
+            self._trials_in_flight = 0
+            self._trial_successes = 0
+            log.info("Upstream circuit half-open: sending trial calls")
+
+    def _prune(self, now):
+        cutoff = now - self.window
+        while self._outcomes and self._outcomes[0][0] < cutoff:
+            self._outcomes.popleft()
+
+    def _open(self, now, reason):
+        self.state = OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        self.opened += 1
+        log.warning("Upstream circuit open for %ss: %s", self.open_seconds, reason)
+
+    def check(self):
+        """Raises CircuitOpen while calls would be refused, without taking a trial slot."""
+        if not self.enabled:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._advance(now)
+            if self.state == OPEN or (self.state == HALF_OPEN and self._trials_in_flight >= self.trial_calls):
+                raise CircuitOpen(self._retry_after(now))
+
+    def allow(self):
+        """Admits one upstream attempt and returns whether it is a trial call; raises CircuitOpen otherwise."""
+        if not self.enabled:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            self._advance(now)
+            if self.state == CLOSED:
+                return False
+            if self.state == HALF_OPEN and self._trials_in_flight < self.trial_calls:
+                self._trials_in_flight += 1
+                return True
+            self.rejected += 1
+            raise CircuitOpen(self._retry_after(now))
+
+    def record_success(self, latency, trial=False):
+        self._record(failed=False, slow=latency > self.slow_call_seconds, trial=trial)
+
+    def record_failure(self, trial=False):
+        self._record(failed=True, slow=False, trial=trial)
+
+    def release(self, trial=False):
+        """Ends an attempt whose outcome says nothing about upstream health (429, 4xx)."""
+        if trial:
+            with self._lock:
+                self._trials_in_flight = max(0, self._trials_in_flight - 1)
+
+    def _record(self, failed, slow, trial):
+        if not self.enabled:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if trial:
+                self._trials_in_flight = max(0, self._trials_in_flight - 1)
+                if self.state != HALF_OPEN:
+                    return
+                if failed or slow:
+                    self._open(now, "trial call " + ("failed" if failed else "too slow"))
+                    return
+                self._trial_successes += 1
+                if self._trial_successes >= self.trial_calls:
+                    self.state = CLOSED
+                    log.info("Upstream circuit closed: trial calls succeeded")
+                return
+            if self.state != CLOSED:
+                return
+            self._outcomes.append((now, failed, slow))
+            self._prune(now)
+            calls = len(self._outcomes)
+            if calls < self.min_calls:
+                return
+            failures = sum(1 for _, f, _ in self._outcomes if f)
+            slow_calls = sum(1 for _, _, s in self._outcomes if s)
+            if failures / calls >= self.failure_rate:
+                self._open(now, f"{failures}/{calls} calls failed")
+            elif slow_calls / calls >= self.slow_call_rate:
+                self._open(now, f"{slow_calls}/{calls} calls slower than {self.slow_call_seconds}s")
+
+    def stats(self):
+        if not self.enabled:
+            return {"enabled": False}
+        with self._lock:
+            now = time.monotonic()
+            self._advance(now)
+            self._prune(now)
+            calls = len(self._outcomes)
+            return {
+                "enabled": True,
+                "state": self.state,
+                "retry_after": round(self._retry_after(now), 3) if self.state == OPEN else None,
+                "window_calls": calls,
+                "window_failures": sum(1 for _, failed, _ in self._outcomes if failed),
+                "window_slow_calls": sum(1 for _, _, slow in self._outcomes if slow),
+                "trials_in_flight": self._trials_in_flight,
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
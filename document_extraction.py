@@ -0,0 +1,306 @@
+"""
+Text extraction from uploaded PDF and DOCX files, split into its stages.
+
+    decode_upload()  base64 data URL -> bytes
+    parse_document() bytes -> PyPDF2.PdfReader or docx.Document
+    document_text()  parsed document -> plain text
+
+app.extract_text_from_file() runs all three and turns failures into user-facing
+messages; bench_extraction.py times them one by one. PyPDF2 and python-docx are only
+imported on first use (load_document_modules) to keep worker boot fast.
+
+Text extraction is the expensive step, and it is pure Python. Each PDF page is extracted
+exactly once. PDFs of at least PDF_PARALLEL_MIN_PAGES pages are split into page ranges
+that up to PDF_EXTRACTION_WORKERS worker processes (default: the usable cores, 0 or 1
+disables it) extract in parallel; the text is reassembled in page order. The workers run
+this module (`python -m document_extraction`) and never import the app. In a worker a
+page that takes longer than PDF_PAGE_TIMEOUT seconds is skipped, and a worker that stops
+answering altogether is killed, so one pathological page cannot hold a request forever.
+"""
+import atexit
+import base64
+import concurrent.futures
+import importlib.util
+import io
+import logging
+import os
+import pickle
+import select
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+
+AVAILABLE = all(importlib.util.find_spec(name) for name in ("PyPDF2", "docx"))
+
+PDF = "pdf"
+DOCX = "docx"
+
+
+def _usable_cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+PDF_EXTRACTION_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", str(_usable_cores())))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "40"))
+PDF_PAGE_TIMEOUT = float(os.getenv("PDF_PAGE_TIMEOUT", "10"))
+# Page ranges per worker: small enough to balance uneven pages, large enough that each
+# task's round trip stays a small share of its work.
+CHUNKS_PER_WORKER = 4
+
+log = logging.getLogger("edugen.document_extraction")
+
+_document_modules = None
+_worker_reader = None  # (path, PdfReader) of the document a worker extracted last
+
+
+class UnsupportedDocument(ValueError):
+    """Raised for uploads that are neither PDF nor DOCX."""
+
+
+def load_document_modules():
+    """Imports PyPDF2 and python-docx on first use and returns (PyPDF2, Document)."""
+    global _document_modules
+    if _document_modules is None:
+        import PyPDF2
+        from docx import Document
+        _document_modules = (PyPDF2, Document)
+    return _document_modules
+
+
+def document_kind(filename):
+    """Returns PDF or DOCX from the file name; raises UnsupportedDocument otherwise."""
+    name = filename.lower()
+    if name.endswith(".pdf"):
+        return PDF
+    if name.endswith(".docx"):
+        return DOCX
+    raise UnsupportedDocument(filename)
+
+
+def decode_upload(file_data):
+    """Decodes a "data:<mime>;base64,<payload>" upload; raises ValueError if it has no payload."""
+    if "," not in file_data:
+        raise ValueError("missing base64 payload")
+    _, encoded = file_data.split(",", 1)
+    return base64.b64decode(encoded)
+
+
+def parse_document(data, kind):
+    PyPDF2, Document = load_document_modules()
+    if kind == PDF:
+        return PyPDF2.PdfReader(io.BytesIO(data))
+    return Document(io.BytesIO(data))
+
+
+def document_text(document, kind, data=None):
+    """Returns the text of a parsed document.
+
+    For a PDF, passing the document's bytes as data lets long documents be extracted
+    page-parallel in the worker processes.
+    """
+    if kind != PDF:
+        return "\n".join(para.text for para in document.paragraphs if para.text)
+    page_count = len(document.pages)
+    if data is not None and PDF_EXTRACTION_WORKERS > 1 and page_count >= PDF_PARALLEL_MIN_PAGES:
+        try:
+            return "".join(_extract_pages_parallel(data, page_count))
+        except WorkerFailed:
+            log.warning("PDF extraction worker failed; extracting in-process", exc_info=True)
+    return "".join(page.extract_text() or "" for page in document.pages)
+
+
+# --- Page-parallel PDF extraction ---
+class PageTimeout(BaseException):
+    """Raised by the page alarm; a BaseException so PyPDF2's `except Exception` blocks let it through."""
+
+
+def _on_page_timeout(signum, frame):
+    raise PageTimeout()
+
+
+def _worker_document(path):
+    """Returns the PdfReader for the PDF at path, parsed once per document per worker."""
+    global _worker_reader
+    if _worker_reader is None or _worker_reader[0] != path:
+        PyPDF2, _ = load_document_modules()
+        with open(path, "rb") as f:
+            _worker_reader = (path, PyPDF2.PdfReader(io.BytesIO(f.read())))
+    return _worker_reader[1]
+
+
+def _extract_page_range(path, first, last, page_timeout):
+    """Runs in a worker; returns the texts of pages first..last-1 and the skipped pages.
+
+    The per-page limit uses SIGALRM, which workers can use because they run their tasks
+    on the main thread; where it does not exist pages are not time-limited.
+    """
+    reader = _worker_document(path)
+    limit = page_timeout > 0 and hasattr(signal, "SIGALRM")
+    if limit:
+        signal.signal(signal.SIGALRM, _on_page_timeout)
+    texts, skipped = [], []
+    for index in range(first, last):
+        page = reader.pages[index]
+        try:
+            if limit:
+                signal.setitimer(signal.ITIMER_REAL, page_timeout)
+            try:
+                texts.append(page.extract_text() or "")
+            finally:
+                if limit:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+        except PageTimeout:
+            texts.append("")
+            skipped.append(index)
+    return texts, skipped
+
+
+class WorkerFailed(Exception):
+    """Raised when an extraction worker cannot be started or exits mid-task."""
+
+
+class _PageWorker:
+    """One `python -m document_extraction` process, fed page ranges on its stdin.
+
+    Workers are plain subprocesses rather than a multiprocessing pool: spawn and forkserver
+    children re-run the parent's main script (app.py under `python app.py`), while these
+    only ever import this module.
+    """
+
+    def __init__(self):
+        try:
+            self.process = subprocess.Popen(
+                [sys.executable, "-m", "document_extraction"],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                cwd=os.path.dirname(os.path.abspath(__file__)))
+        except OSError as e:
+            raise WorkerFailed(f"cannot start extraction worker: {e}") from e
+
+    def extract(self, task, timeout):
+        """Returns the worker's (texts, skipped) for one task; raises TimeoutError after timeout seconds."""
+        try:
+            pickle.dump(task, self.process.stdin, protocol=pickle.HIGHEST_PROTOCOL)
+            self.process.stdin.flush()
+            ready, _, _ = select.select([self.process.stdout], [], [], timeout)
+            if ready:
+                ok, result = pickle.load(self.process.stdout)
+        except (OSError, EOFError, pickle.UnpicklingError) as e:
+            raise WorkerFailed(f"extraction worker exited (code {self.process.poll()})") from e
+        if not ready:
+            raise TimeoutError()
+        if not ok:
+            raise result
+        return result
+
+    def kill(self):
+        self.process.kill()
+        self.process.wait()
+
+
+_dispatch = None
+_dispatch_lock = threading.Lock()
+_local = threading.local()
+_workers = set()
+
+
+def _get_dispatch():
+    """Threads that drive the workers; each owns at most one worker, so there are at most
+    PDF_EXTRACTION_WORKERS of them per process however many requests extract at once."""
+    global _dispatch
+    with _dispatch_lock:
+        if _dispatch is None:
+            _dispatch = concurrent.futures.ThreadPoolExecutor(
+                max_workers=PDF_EXTRACTION_WORKERS, thread_name_prefix="pdf-extraction")
+        return _dispatch
+
+
+def _run_chunk(path, first, last):
+    worker = getattr(_local, "worker", None)
+    if worker is None:
+        worker = _local.worker = _PageWorker()
+        with _dispatch_lock:
+            _workers.add(worker)
+    # Every page is limited by its own alarm; this only catches a worker stuck where the
+    # alarm cannot reach it (in C code). Such a worker is killed and replaced on next use.
+    timeout = PDF_PAGE_TIMEOUT * (last - first) + 10 if PDF_PAGE_TIMEOUT > 0 else None
+    try:
+        return worker.extract((path, first, last, PDF_PAGE_TIMEOUT), timeout)
+    except (TimeoutError, WorkerFailed):
+        _local.worker = None
+        with _dispatch_lock:
+            _workers.discard(worker)
+        worker.kill()
+        raise
+
+
+@atexit.register
+def _shutdown_workers():
+    with _dispatch_lock:
+        workers = list(_workers)
+        _workers.clear()
+    for worker in workers:
+        worker.kill()
+
+
+def _extract_pages_parallel(data, page_count):
+    """Extracts page ranges in the workers and returns the page texts in page order.
+
+    The bytes are written to a temporary file once; tasks only carry its path.
+    """
+    chunks = min(page_count, PDF_EXTRACTION_WORKERS * CHUNKS_PER_WORKER)
+    bounds = [page_count * i // chunks for i in range(chunks + 1)]
+    dispatch = _get_dispatch()
+    fd, path = tempfile.mkstemp(prefix="edugen-pdf-", suffix=".pdf")
+    futures = []
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        futures = [(first, last, dispatch.submit(_run_chunk, path, first, last))
+                   for first, last in zip(bounds, bounds[1:])]
+        texts, skipped = [], []
+        for first, last, future in futures:
+            try:
+                chunk_texts, chunk_skipped = future.result()
+            except TimeoutError:
+                chunk_texts, chunk_skipped = [""] * (last - first), list(range(first, last))
+            texts.extend(chunk_texts)
+            skipped.extend(chunk_skipped)
+    finally:
+        for _, _, future in futures:  # chunks still queued after a worker failed
+            future.cancel()
+        os.unlink(path)
+    if skipped:
+        log.warning("Skipped PDF pages that exceeded the extraction time limit",
+                    extra={"fields": {"pages": [index + 1 for index in skipped], "page_count": page_count}})
+    return texts
+
+
+def _serve():
+    """Worker loop: reads pickled (path, first, last, page_timeout) tasks from stdin and
+    writes (True, (texts, skipped)) or (False, exception) for each to stdout."""
+    tasks, results = sys.stdin.buffer, sys.stdout.buffer
+    sys.stdout = sys.stderr  # stray prints must not corrupt the result stream
+    while True:
+        try:
+            task = pickle.load(tasks)
+        except EOFError:
+            return
+        try:
+            reply = (True, _extract_page_range(*task))
+        except Exception as e:
+            reply = (False, e)
+        try:
+            payload = pickle.dumps(reply, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            payload = pickle.dumps((False, RuntimeError(repr(reply[1]))), protocol=pickle.HIGHEST_PROTOCOL)
+        results.write(payload)
+        results.flush()
+
+
+if __name__ == "__main__":
+    _serve()
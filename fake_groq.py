@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Groq chat completions API, for load tests without quota or network.
+
+Point the app at it through the base URL the Groq SDK already honours:
+
+    python fake_groq.py --port 8787 --latency lognormal:0.6:0.5 --rpm 30 --tpm 6000
+    GROQ_API_KEY=fake GROQ_BASE_URL=http://127.0.0.1:8787 GROQ_WARMUP=lazy gunicorn app:app
+
+It serves POST /openai/v1/chat/completions (plain and streamed), GET /openai/v1/models,
+GET /stats (request counters) and POST /config (change any setting while running, e.g.
+{"error_rate": 1.0} to simulate an outage).
+
+Replies are canned but shaped like the real thing: quiz prompts get a JSON array with
+the requested number of questions, resume classification prompts get "yes" or "no",
+everything else gets filler text. Usage is counted with prompt_budget.estimate_tokens and
+completions are cut at max_tokens (finish_reason "length").
+
+Latency is time to first token, drawn from a distribution:
+
+    0.5 / fixed:0.5          always 0.5 s
+    uniform:0.2:1.0          uniform between 0.2 and 1.0 s
+    lognormal:0.6:0.5        median 0.6 s, sigma 0.5 (long right tail)
+    exp:0.5                  exponential with mean 0.5 s
+
+plus an optional slow tail (--tail-rate of calls take --tail-multiplier times longer).
+The rest of the completion is generated at --tokens-per-second.
+
+Rate limits are enforced per model with the same x-ratelimit-* headers Groq sends (the
+request window is per minute here; Groq reports it per day). --rate-limit-rate and
+--error-rate inject 429s and 5xx errors at random on top of that.
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from prompt_budget import estimate_tokens
+
+MODELS = ("llama-3.1-8b-instant", "llama-3.3-70b-versatile")
+FILLER = ("The key idea is that each part builds on the previous one, so it helps to review the basics "
+          "first and then work through a few examples step by step. ").split()
+RESUME_WORDS = ("experience", "education", "skills", "resume", "curriculum vitae", "employment")
+QUIZ_COUNT = re.compile(r"Generate exactly (\d+)")
+QUIZ_TOPIC = re.compile(r'on the topic "([^"]*)"')
+
+
+def parse_latency(spec):
+    """Returns a function drawing latencies in seconds from a spec such as "lognormal:0.6:0.5"."""
+    kind, _, rest = str(spec).partition(":")
+    try:
+        if not rest:
+            value = float(kind)
+            return lambda: value
+        args = [float(part) for part in rest.split(":")]
+    except ValueError:
+        raise ValueError(f"invalid latency spec: {spec!r}") from None
+    if kind == "fixed":
+        return lambda: args[0]
+    if kind == "uniform":
+        return lambda: random.uniform(args[0], args[1])
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(math.log(args[0]), args[1])
+    if kind == "exp":
+        return lambda: random.expovariate(1 / args[0])
+    raise ValueError(f"unknown latency distribution: {kind!r}")
+
+
+class FakeGroqConfig:
+    """Settings of the stand-in server; every attribute can be changed at runtime."""
+
+    def __init__(self, latency="0.5", tail_rate=0.0, tail_multiplier=10.0, tokens_per_second=400.0,
+                 reply_words=80, rpm=0, tpm=0, rate_limit_rate=0.0, retry_after=2.0, error_rate=0.0,
+                 error_statuses=(500, 502, 503), classify_answer="auto"):
+        self.latency = latency
+        self.tail_rate = tail_rate
+        self.tail_multiplier = tail_multiplier
+        self.tokens_per_second = tokens_per_second
+        self.reply_words = reply_words
+        self.rpm = rpm                        # 0 = unlimited
+        self.tpm = tpm                        # 0 = unlimited
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.classify_answer = classify_answer  # "auto", "yes" or "no"
+
+    def update(self, values):
+        for name in values:
+            if not hasattr(self, name):
+                raise ValueError(f"unknown setting: {name}")
+        parse_latency(values.get("latency", self.latency))  # reject bad specs before applying anything
+        for name, value in values.items():
+            setattr(self, name, tuple(value) if name == "error_statuses" else value)
+
+    def as_dict(self):
+        return dict(vars(self))
+
+    def first_token_delay(self):
+        delay = parse_latency(self.latency)()
+        if self.tail_rate and random.random() < self.tail_rate:
+            delay *= self.tail_multiplier
+        return max(0.0, delay)
+
+
+class _Quota:
+    """Per-model requests and tokens per minute, refilled continuously like Groq's buckets."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = None
+        self._tokens = None
+        self._updated = time.monotonic()
+
+    def take(self, rpm, tpm, tokens):
+        """Charges one request and `tokens`; returns (admitted, headers)."""
+        with self._lock:
+            now = time.monotonic()
+            elapsed, self._updated = now - self._updated, now
+            self._requests = rpm if self._requests is None else min(rpm, self._requests + elapsed * rpm / 60)
+            self._tokens = tpm if self._tokens is None else min(tpm, self._tokens + elapsed * tpm / 60)
+            admitted = (not rpm or self._requests >= 1) and (not tpm or self._tokens >= min(tokens, tpm))
+            if admitted:
+                self._requests -= 1 if rpm else 0
+                self._tokens -= min(tokens, tpm) if tpm else 0
+            headers = {}
+            if rpm:
+                headers.update({
+                    "x-ratelimit-limit-requests": str(int(rpm)),
+                    "x-ratelimit-remaining-requests": str(max(0, int(self._requests))),
+                    "x-ratelimit-reset-requests": _duration((rpm - self._requests) * 60 / rpm),
+                })
+            if tpm:
+                headers.update({
+                    "x-ratelimit-limit-tokens": str(int(tpm)),
+                    "x-ratelimit-remaining-tokens": str(max(0, int(self._tokens))),
+                    "x-ratelimit-reset-tokens": _duration((tpm - self._tokens) * 60 / tpm),
+                })
+            if not admitted:
+                waits = [0.0]
+                if rpm:
+                    waits.append((1 - self._requests) * 60 / rpm)
+                if tpm:
+                    waits.append((min(tokens, tpm) - self._tokens) * 60 / tpm)
+                headers["retry-after"] = str(max(1, math.ceil(max(waits))))
+            return admitted, headers
+
+
+def _duration(seconds):
+    """Formats seconds the way Groq does: "7.66s", "2m59.56s"."""
+    seconds = max(0.0, seconds)
+    minutes, seconds = divmod(seconds, 60)
+    return f"{int(minutes)}m{seconds:.2f}s" if minutes else f"{seconds:.2f}s"
+
+
+def canned_reply(prompt, config):
+    """A reply shaped like what the app expects for this kind of prompt."""
+    if prompt.startswith("Is the following text a resume or CV?"):
+        if config.classify_answer in ("yes", "no"):
+            return config.classify_answer
+        return "yes" if any(word in prompt.lower() for word in RESUME_WORDS) else "no"
+    if "quiz generator" in prompt:
+        count = int(QUIZ_COUNT.search(prompt).group(1)) if QUIZ_COUNT.search(prompt) else 5
+        topic = QUIZ_TOPIC.search(prompt).group(1) if QUIZ_TOPIC.search(prompt) else "the topic"
+        return json.dumps([
+            {
+                "text": f"📘 Question {i + 1} about {topic}: which statement is correct?",
+                "options": [f"A) Statement {i}.1", f"B) Statement {i}.2", f"C) Statement {i}.3", f"D) Statement {i}.4"],
+                "correctAnswer": f"{'ABCD'[i % 4]}) Statement {i}.{i % 4 + 1}",
+            }
+            for i in range(count)
+        ])
+    words = [FILLER[i % len(FILLER)] for i in range(config.reply_words)]
+    return "• " + " ".join(words)
+
+
+def _truncate(text, max_tokens):
+    """Cuts text to about max_tokens; returns (text, finish_reason)."""
+    if not max_tokens or estimate_tokens(text) <= max_tokens:
+        return text, "stop"
+    pieces = re.findall(r"\S+\s*", text)
+    kept, used = [], 0
+    for piece in pieces:
+        cost = estimate_tokens(piece)
+        if used + cost > max_tokens:
+            break
+        kept.append(piece)
+        used += cost
+    return "".join(kept).rstrip(), "length"
+
+
+class FakeGroqServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, config):
+        super().__init__(address, _Handler)
+        self.config = config
+        self._quotas = {}
+        self._lock = threading.Lock()
+        self.counters = {}
+
+    @property
+    def base_url(self):
+        scheme = "https" if hasattr(self.socket, "context") else "http"
+        return f"{scheme}://{self.server_address[0]}:{self.server_address[1]}"
+
+    def quota(self, model):
+        with self._lock:
+            return self._quotas.setdefault(model, _Quota())
+
+    def count(self, key):
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # headers and body are separate writes
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message, headers=None):
+        kind = "rate_limit_exceeded" if status == 429 else "server_error"
+        self.server.count(str(status))
+        self._send_json(status, {"error": {"message": message, "type": kind, "code": kind}}, headers)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": model, "object": "model"} for model in MODELS]})
+        elif self.path == "/stats":
+            self._send_json(200, {"counters": self.server.counters, "config": self.server.config.as_dict()})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if self.path == "/config":
+            try:
+                self.server.config.update(self._read_json())
+            except ValueError as e:
+                self._send_json(400, {"error": {"message": str(e)}})
+                return
+            self._send_json(200, self.server.config.as_dict())
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        self._complete(self._read_json())
+
+    def _complete(self, body):
+        config = self.server.config
+        model = body.get("model", MODELS[0])
+        prompt = "\n".join(message.get("content") or "" for message in body.get("messages", []))
+        max_tokens = body.get("max_tokens") or 0
+        prompt_tokens = estimate_tokens(prompt)
+        self.server.count("requests")
+
+        if config.rate_limit_rate and random.random() < config.rate_limit_rate:
+            self._send_error(429, f"Rate limit reached for model `{model}` (injected)",
+                             {"retry-after": str(config.retry_after)})
+            return
+        admitted, headers = self.server.quota(model).take(config.rpm, config.tpm, prompt_tokens + max_tokens)
+        if not admitted:
+            self._send_error(429, f"Rate limit reached for model `{model}`", headers)
+            return
+        time.sleep(config.first_token_delay())
+        if config.error_rate and random.random() < config.error_rate:
+            status = random.choice(config.error_statuses)
+            self._send_error(status, f"Injected upstream error {status}")
+            return
+
+        text, finish_reason = _truncate(canned_reply(prompt, config), max_tokens)
+        completion_tokens = estimate_tokens(text)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        self.server.count("200")
+        if body.get("stream"):
+            self._stream(completion_id, model, text, finish_reason, usage, headers)
+            return
+        if completion_tokens and config.tokens_per_second:
+            time.sleep(completion_tokens / config.tokens_per_second)
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": finish_reason}],
+            "usage": usage,
+        }, headers)
+
+    def _stream(self, completion_id, model, text, finish_reason, usage, headers):
+        """Sends the completion as chat.completion.chunk events, a few tokens per chunk."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        def chunk(delta, finish=None, extra=None):
+            payload = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                       "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+            payload.update(extra or {})
+            self._write_chunk(f"data: {json.dumps(payload)}\n\n")
+
+        tokens_per_second = self.server.config.tokens_per_second
+        chunk({"role": "assistant", "content": ""})
+        for piece in re.findall(r"(?:\S+\s*){1,4}", text):
+            if tokens_per_second:
+                time.sleep(estimate_tokens(piece) / tokens_per_second)
+            chunk({"content": piece})
+        chunk({}, finish_reason, {"x_groq": {"id": completion_id, "usage": usage}})
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, text):
+        data = text.encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+def start_fake_groq(config=None, host="127.0.0.1", port=0, ssl_context=None):
+    """Starts the stand-in server on a daemon thread and returns it (see server.base_url)."""
+    server = FakeGroqServer((host, port), config or FakeGroqConfig())
+    if ssl_context is not None:
+        server.socket = ssl_context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", default="0.5", help="time-to-first-token distribution (see above)")
+    parser.add_argument("--tail-rate", type=float, default=0.0, help="share of calls in the slow tail")
+    parser.add_argument("--tail-multiplier", type=float, default=10.0)
+    parser.add_argument("--tokens-per-second", type=float, default=400.0, help="generation speed; 0 = instant")
+    parser.add_argument("--reply-words", type=int, default=80, help="length of filler chat replies")
+    parser.add_argument("--rpm", type=float, default=0, help="requests per minute per model; 0 = unlimited")
+    parser.add_argument("--tpm", type=float, default=0, help="tokens per minute per model; 0 = unlimited")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of calls answered with 429")
+    parser.add_argument("--retry-after", type=float, default=2.0, help="retry-after of injected 429s")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls answered with 5xx")
+    parser.add_argument("--classify-answer", choices=["auto", "yes", "no"], default="auto")
+    args = parser.parse_args()
+
+    config = FakeGroqConfig(
+        latency=args.latency, tail_rate=args.tail_rate, tail_multiplier=args.tail_multiplier,
+        tokens_per_second=args.tokens_per_second, reply_words=args.reply_words, rpm=args.rpm, tpm=args.tpm,
+        rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after, error_rate=args.error_rate,
+        classify_answer=args.classify_answer,
+    )
+    parse_latency(config.latency)
+    server = FakeGroqServer((args.host, args.port), config)
+    print(f"Fake Groq API on {server.base_url} (GROQ_BASE_URL={server.base_url})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
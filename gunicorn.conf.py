@@ -0,0 +1,26 @@
+"""
+gunicorn settings needed by /metrics; gunicorn reads this file from the working directory.
+
+Each worker writes its Prometheus samples to PROMETHEUS_MULTIPROC_DIR so a scrape of any
+worker reports the totals of all of them (see metrics.py). The directory is emptied when
+gunicorn starts, and the in-flight gauges of a worker that exits are dropped.
+"""
+import os
+import shutil
+import tempfile
+
+prometheus_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "edugen-prometheus"))
+
+
+def on_starting(server):
+    shutil.rmtree(prometheus_dir, ignore_errors=True)
+    os.makedirs(prometheus_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,148 @@
+"""
+Hedged upstream calls.
+
+A call that has not returned by the live p95 latency of its call class gets one
+duplicate, and whichever finishes first wins. On the async path the loser is
+cancelled; on the sync path a blocking HTTP call cannot be interrupted, so the loser
+runs to completion in its thread and its result is handed to a discard callback
+(which settles its quota reservation).
+
+Hedges are paid for from a budget: every primary call earns `ratio` hedge credits, up
+to `burst`, and a hedge spends one. Extra calls therefore stay at about ratio × calls
+(5% by default) no matter how slow the upstream gets.
+"""
+import asyncio
+import concurrent.futures
+import contextvars
+import threading
+
+
+class HedgeBudget:
+    """Hedge credits earned per primary call."""
+
+    def __init__(self, ratio=0.05, burst=2):
+        self.ratio = ratio
+        self.burst = burst
+        self._credits = float(burst)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedges = 0
+        self.denied = 0
+
+    def earn(self):
+        with self._lock:
+            self.calls += 1
+            self._credits = min(self.burst, self._credits + self.ratio)
+
+    def spend(self):
+        """Takes one credit for a hedge; False if the budget is exhausted."""
+        with self._lock:
+            if self._credits >= 1:
+                self._credits -= 1
+                self.hedges += 1
+                return True
+            self.denied += 1
+            return False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "ratio": self.ratio,
+                "calls": self.calls,
+                "hedges": self.hedges,
+                "denied": self.denied,
+                "credits": round(self._credits, 2),
+            }
+
+
+class Hedger:
+    """Runs a call and, if it is still pending after `delay` seconds, one duplicate."""
+
+    def __init__(self, budget, max_workers=64):
+        self.budget = budget
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self.hedge_wins = 0
+
+    def _pool(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = concurrent.futures.ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix="groq-hedge")
+        return self._executor
+
+    def _won(self, winner, hedge):
+        if winner is hedge:
+            with self._lock:
+                self.hedge_wins += 1
+
+    def call(self, fn, delay, hedge_fn=None, discard=None):
+        """Returns fn(), or the result of hedge_fn() (default fn) if that finishes first.
+
+        delay None disables hedging for this call. If both attempts fail, the first
+        error is raised.
+        """
+        if delay is None:
+            return fn()
+        self.budget.earn()
+        pool = self._pool()
+        primary = pool.submit(contextvars.copy_context().run, fn)
+        done, _ = concurrent.futures.wait([primary], timeout=delay)
+        if done or not self.budget.spend():
+            return primary.result()
+        hedge = pool.submit(contextvars.copy_context().run, hedge_fn or fn)
+        pending, errors = [primary, hedge], []
+        while pending:
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in (primary, hedge):
+                if future not in done or future not in pending:
+                    continue
+                pending.remove(future)
+                if future.exception() is not None:
+                    errors.append(future.exception())
+                    continue
+                self._won(future, hedge)
+                for loser in pending:
+                    if discard is not None:
+                        loser.add_done_callback(lambda f: f.exception() is None and discard(f.result()))
+                return future.result()
+        raise errors[0]
+
+    async def acall(self, fn, delay, hedge_fn=None, discard=None):
+        """Async counterpart of call(); the losing attempt is cancelled."""
+        if delay is None:
+            return await fn()
+        self.budget.earn()
+        primary = asyncio.ensure_future(fn())
+        hedge = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done or not self.budget.spend():
+                return await primary
+            hedge = asyncio.ensure_future((hedge_fn or fn)())
+            pending, errors = [primary, hedge], []
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in (primary, hedge):
+                    if task not in done or task not in pending:
+                        continue
+                    pending.remove(task)
+                    if task.exception() is not None:
+                        errors.append(task.exception())
+                        continue
+                    self._won(task, hedge)
+                    # A loser that finished in the same round cannot be cancelled any more.
+                    for loser in pending:
+                        if loser.done() and loser.exception() is None and discard is not None:
+                            discard(loser.result())
+                    return task.result()
+            raise errors[0]
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def stats(self):
+        return {**self.budget.stats(), "hedge_wins": self.hedge_wins}
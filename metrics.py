@@ -0,0 +1,114 @@
+"""
+Prometheus metrics served at /metrics.
+
+Everything is recorded as events where they happen (counters and histograms), never
+read back from the in-process stats objects, so the numbers can be summed across gunicorn
+workers: with PROMETHEUS_MULTIPROC_DIR set (gunicorn.conf.py does this), every worker
+writes its samples to files in that directory and a scrape of any worker aggregates all
+of them. In-flight gauges count only live processes.
+
+prometheus_client is optional. Without it, or with METRICS_ENABLED=false, every metric
+below is a no-op object and /metrics answers 404.
+"""
+import os
+import time
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+    METRICS_AVAILABLE = True
+except ImportError:
+    METRICS_AVAILABLE = False
+
+ENABLED = METRICS_AVAILABLE and os.getenv("METRICS_ENABLED", "true").lower() != "false"
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+HTTP_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+UPSTREAM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+EXTRACTION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BYTES_BUCKETS = (10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000, 10_000_000, 50_000_000)
+
+
+class _NoMetric:
+    """Stands in for every metric when metrics are disabled."""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def observe(self, amount):
+        pass
+
+
+def _counter(name, documentation, labels):
+    return prometheus_client.Counter(name, documentation, labels) if ENABLED else _NoMetric()
+
+
+def _histogram(name, documentation, labels, buckets):
+    return prometheus_client.Histogram(name, documentation, labels, buckets=buckets) if ENABLED else _NoMetric()
+
+
+def _in_flight_gauge(name, documentation, labels):
+    if not ENABLED:
+        return _NoMetric()
+    return prometheus_client.Gauge(name, documentation, labels, multiprocess_mode="livesum")
+
+
+HTTP_REQUESTS = _counter(
+    "edugen_http_requests_total", "HTTP requests answered.", ["route", "method", "status"])
+HTTP_REQUEST_SECONDS = _histogram(
+    "edugen_http_request_duration_seconds", "Time to answer an HTTP request (streams: until the body is sent).",
+    ["route", "method", "status"], HTTP_BUCKETS)
+HTTP_IN_FLIGHT = _in_flight_gauge(
+    "edugen_http_requests_in_flight", "HTTP requests being handled.", ["route"])
+
+UPSTREAM_SECONDS = _histogram(
+    "edugen_upstream_request_duration_seconds",
+    "Latency of one Groq call until its response (or stream) opens, by retry attempt and outcome.",
+    ["model", "call_class", "attempt", "outcome"], UPSTREAM_BUCKETS)
+UPSTREAM_ERRORS = _counter(
+    "edugen_upstream_errors_total", "Failed Groq calls by kind (rate_limit counts 429s).", ["model", "kind"])
+UPSTREAM_RETRIES = _counter(
+    "edugen_upstream_retries_total", "Groq calls retried after a transient error.", ["kind"])
+UPSTREAM_IN_FLIGHT = _in_flight_gauge(
+    "edugen_upstream_requests_in_flight", "Groq calls in flight, including retries and streams.", [])
+
+EXTRACTION_SECONDS = _histogram(
+    "edugen_extraction_duration_seconds", "Time to extract the text of an uploaded document.",
+    ["file_type", "outcome"], EXTRACTION_BUCKETS)
+EXTRACTION_BYTES = _histogram(
+    "edugen_extraction_bytes", "Decoded size of uploaded documents.", ["file_type"], BYTES_BUCKETS)
+
+CACHE_LOOKUPS = _counter(
+    "edugen_cache_lookups_total", "Lookups in the response cache, near-duplicate index and quiz pools.",
+    ["cache", "result"])
+
+
+def cache_lookup(cache, hit):
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def request_started(route):
+    HTTP_IN_FLIGHT.labels(route).inc()
+
+
+def request_finished(route, method, status, started):
+    """Records an answered request; started is its time.perf_counter() at request_started()."""
+    HTTP_IN_FLIGHT.labels(route).dec()
+    HTTP_REQUESTS.labels(route, method, status).inc()
+    HTTP_REQUEST_SECONDS.labels(route, method, status).observe(time.perf_counter() - started)
+
+
+def render():
+    """Returns (body, content type) of a scrape, aggregated over all workers in multiprocess mode."""
+    if MULTIPROCESS:
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
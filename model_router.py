@@ -0,0 +1,188 @@
+"""
+Latency-aware model routing for upstream Groq calls.
+
+Every call belongs to a call class (classify, chat, quiz, long_document). The routing
+table lists, per class, the candidate models in order of preference and a latency SLO.
+For each call the router returns the candidates in the order they should be tried:
+
+    1. preferred models that fit the request and are healthy (error rate and p95
+       latency over a rolling window within limits; models without enough samples
+       count as healthy),
+    2. the remaining fitting models, best observed latency first,
+    3. models currently rate-limited, earliest reset first.
+
+A model "fits" when prompt plus max_tokens stays within its context window and, via the
+fits callback, within what its quota allows in a single call. The caller falls through
+the list on local admission rejections and 429s, so a rate-limited model is skipped
+without waiting.
+
+The table can be replaced with GROQ_ROUTING_TABLE, either inline JSON or the path of a
+JSON file with the same shape as DEFAULT_ROUTING_TABLE.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+
+DEFAULT_ROUTING_TABLE = {
+    "models": {
+        "llama-3.1-8b-instant": {"context_tokens": 131072},
+        "llama-3.3-70b-versatile": {"context_tokens": 131072},
+    },
+    # document prompts above this many tokens are routed as long_document, the rest as chat
+    "long_document_tokens": 2000,
+    "routes": {
+        "classify": {"models": ["llama-3.1-8b-instant", "llama-3.3-70b-versatile"], "latency_slo": 2},
+        "chat": {"models": ["llama-3.1-8b-instant", "llama-3.3-70b-versatile"], "latency_slo": 10},
+        "quiz": {"models": ["llama-3.1-8b-instant", "llama-3.3-70b-versatile"], "latency_slo": 15},
+        "long_document": {"models": ["llama-3.3-70b-versatile", "llama-3.1-8b-instant"], "latency_slo": 30},
+    },
+}
+
+
+def load_routing_table(value=None):
+    """Returns the routing table from inline JSON, a JSON file path, or the default."""
+    if not value:
+        return DEFAULT_ROUTING_TABLE
+    if value.lstrip().startswith("{"):
+        loaded = json.loads(value)
+    else:
+        with open(value) as handle:
+            loaded = json.load(handle)
+    return {**DEFAULT_ROUTING_TABLE, **loaded}
+
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class LatencyWindow:
+    """Outcomes of the last `size` calls within `horizon` seconds: latency percentiles and error rate."""
+
+    def __init__(self, size=200, horizon=300):
+        self.horizon = horizon
+        self._outcomes = deque(maxlen=size)   # (timestamp, latency seconds, ok)
+        self._lock = threading.Lock()
+
+    def record(self, latency, ok):
+        with self._lock:
+            self._outcomes.append((time.monotonic(), latency, ok))
+
+    def _recent(self):
+        cutoff = time.monotonic() - self.horizon
+        with self._lock:
+            while self._outcomes and self._outcomes[0][0] < cutoff:
+                self._outcomes.popleft()
+            return list(self._outcomes)
+
+    def percentile(self, q, min_samples=1):
+        """Latency percentile of successful calls, or None with fewer than min_samples of them."""
+        latencies = sorted(latency for _, latency, ok in self._recent() if ok)
+        return _percentile(latencies, q) if latencies and len(latencies) >= min_samples else None
+
+    def snapshot(self):
+        outcomes = self._recent()
+        latencies = sorted(latency for _, latency, ok in outcomes if ok)
+        errors = sum(1 for _, _, ok in outcomes if not ok)
+        return {
+            "samples": len(outcomes),
+            "p50": round(_percentile(latencies, 0.5), 3) if latencies else None,
+            "p95": round(_percentile(latencies, 0.95), 3) if latencies else None,
+            "error_rate": round(errors / len(outcomes), 3) if outcomes else 0.0,
+        }
+
+
+class ModelRouter:
+    """Orders candidate models per call from the routing table and live per-model statistics."""
+
+    def __init__(self, table, fits=None, min_samples=5, max_error_rate=0.25):
+        self.table = table
+        self.fits = fits or (lambda model, tokens: True)
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self._model_windows = {model: LatencyWindow() for model in table["models"]}
+        self._class_windows = {call_class: LatencyWindow() for call_class in table["routes"]}
+        self._rate_limited_until = {}
+        self._lock = threading.Lock()
+        self.rate_limited_events = 0
+
+    def call_class(self, call_site, prompt_tokens):
+        if call_site == "document":
+            return "long_document" if prompt_tokens > self.table["long_document_tokens"] else "chat"
+        return call_site if call_site in self.table["routes"] else "chat"
+
+    def preferred(self, call_class):
+        """The call class's first-choice model, the one it is routed to while nothing is wrong."""
+        return self.table["routes"][call_class]["models"][0]
+
+    def _window(self, model):
+        window = self._model_windows.get(model)
+        if window is None:
+            with self._lock:
+                window = self._model_windows.setdefault(model, LatencyWindow())
+        return window
+
+    def _healthy(self, model, latency_slo):
+        snapshot = self._window(model).snapshot()
+        if snapshot["samples"] < self.min_samples:
+            return True
+        if snapshot["error_rate"] > self.max_error_rate:
+            return False
+        return snapshot["p95"] is None or latency_slo is None or snapshot["p95"] <= latency_slo
+
+    def candidates(self, call_class, prompt_tokens, total_tokens):
+        """Models to try for one call, best first."""
+        route = self.table["routes"][call_class]
+        context = {model: self.table["models"].get(model, {}).get("context_tokens", float("inf"))
+                   for model in route["models"]}
+        fitting = [model for model in route["models"]
+                   if total_tokens <= context[model] and self.fits(model, total_tokens)]
+        if not fitting:
+            # Nothing fits; let the largest model reject it rather than failing silently.
+            fitting = sorted(route["models"], key=lambda model: -context[model])[:1]
+        now = time.monotonic()
+        limited = sorted((model for model in fitting if self._rate_limited_until.get(model, 0) > now),
+                         key=lambda model: self._rate_limited_until[model])
+        available = [model for model in fitting if model not in limited]
+        healthy = [model for model in available if self._healthy(model, route.get("latency_slo"))]
+        degraded = sorted((model for model in available if model not in healthy), key=self._score)
+        return healthy + degraded + limited
+
+    def _score(self, model):
+        snapshot = self._window(model).snapshot()
+        return (snapshot["p95"] or 0.0) * (1 + 4 * snapshot["error_rate"])
+
+    def record(self, model, call_class, latency, ok):
+        self._window(model).record(latency, ok)
+        if ok and call_class in self._class_windows:
+            self._class_windows[call_class].record(latency, ok)
+
+    def mark_rate_limited(self, model, seconds):
+        with self._lock:
+            self.rate_limited_events += 1
+            until = time.monotonic() + (seconds if seconds is not None else 1.0)
+            self._rate_limited_until[model] = max(self._rate_limited_until.get(model, 0), until)
+
+    def class_percentile(self, call_class, q, min_samples=1):
+        """Live latency percentile of a call class (any model), or None without enough data."""
+        window = self._class_windows.get(call_class)
+        return window.percentile(q, min_samples) if window else None
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            "rate_limited_events": self.rate_limited_events,
+            "models": {
+                model: {
+                    **window.snapshot(),
+                    "rate_limited_for": round(max(0.0, self._rate_limited_until.get(model, 0) - now), 3),
+                }
+                for model, window in list(self._model_windows.items())
+            },
+            "call_classes": {call_class: window.snapshot() for call_class, window in self._class_windows.items()},
+        }
+
+
+def routing_table_from_env():
+    return load_routing_table(os.getenv("GROQ_ROUTING_TABLE"))
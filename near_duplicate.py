@@ -0,0 +1,205 @@
+"""
+Near-duplicate question cache for /api/chat.
+
+Questions are reduced to content-word unigram + bigram shingles, summarized with MinHash and
+indexed with LSH banding, so "what is photosynthesis" and "What is photosynthesis??
+explain" resolve to the same cached answer without any external embedding service.
+
+Operators and other symbols are tokens of their own and question words are features, so
+"what is 12+7" / "what is 12*7", "C#" / "C++" and "why ..." / "what ..." stay apart. On top
+of the similarity threshold, a match must have exactly the same numbers and symbols in the
+same order: a question whose digits or operators differ never gets another one's answer.
+"""
+import random
+import re
+import threading
+import zlib
+from array import array
+
+# Runs of letters and digits, and every other non-space character as a token of its own.
+_TOKEN = re.compile(r"[^\W_]+|\S")
+# Sentence punctuation that does not change what is asked ("photosynthesis??").
+PUNCTUATION = frozenset("?!.,;:'\"`")
+# Words that change the phrasing of a question but not what is being asked.
+FILLER_WORDS = frozenset({
+    "a", "an", "the", "please", "pls", "plz", "kindly", "explain", "describe", "briefly",
+    "tell", "me", "about", "can", "could", "would", "you",
+})
+
+# Function words only count as part of a bigram with a content word, otherwise every
+# "... is ..." question would share features and crowd the same LSH buckets. Question
+# words are kept as features: "why" and "what" ask different things.
+STOPWORDS = frozenset({
+    "is", "are", "was", "were", "be", "been", "do", "does", "did", "of", "in", "on", "at", "to",
+    "for", "from", "by", "with", "and", "or", "between", "into", "i", "it", "its", "this", "that",
+    "these", "those", "my", "we", "our", "your", "there", "their",
+})
+
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def tokenize(text):
+    """Lowercased word, number and symbol tokens of a question, without filler and punctuation."""
+    return [token for token in _TOKEN.findall(text.lower())
+            if token not in FILLER_WORDS and token not in PUNCTUATION]
+
+
+def literal_key(tokens):
+    """Hash of the question's numbers and symbols in order; 0 when it has none."""
+    literals = [token for token in tokens if not token.isalpha()]
+    return zlib.crc32("\0".join(literals).encode("utf-8")) if literals else 0
+
+
+def shingles(text, tokens=None):
+    """Returns the set of hashed unigram and bigram features of a question."""
+    if tokens is None:
+        tokens = tokenize(text)
+    features = {token for token in tokens if token not in STOPWORDS}
+    features.update(f"{first} {second}" for first, second in zip(tokens, tokens[1:])
+                    if first not in STOPWORDS or second not in STOPWORDS)
+    return {zlib.crc32(feature.encode("utf-8")) for feature in features}
+
+
+def _unpack(packed):
+    features = array("I")
+    features.frombytes(packed)
+    return set(features)
+
+
+class NearDuplicateIndex:
+    """MinHash + LSH index mapping questions to previously generated answers.
+
+    `bands * rows` hash functions are used per signature. Two questions become LSH
+    candidates when all rows of at least one band match; candidates are accepted when
+    the exact Jaccard similarity of their shingle sets is at least `threshold` and
+    they have the same literal_key() (numbers and symbols). Only the shingle hashes
+    and the literal key are stored per entry (signatures are recomputed on eviction),
+    which keeps a million-entry index compact. Once `max_entries` is reached the
+    oldest entries are overwritten.
+
+    Buckets holding more than `max_bucket_scan` entries are skipped during lookups:
+    they come from phrasing shared by many questions ("give examples of ...") and
+    would otherwise turn one lookup into thousands of comparisons. True near
+    duplicates still meet in the bands made of their content words.
+    """
+
+    def __init__(self, threshold=0.8, max_entries=100000, bands=8, rows=4, max_bucket_scan=64, seed=1):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.bands = bands
+        self.rows = rows
+        self.num_perm = bands * rows
+        self.max_bucket_scan = max_bucket_scan
+        rng = random.Random(seed)
+        self._perms = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+                       for _ in range(self.num_perm)]
+        self._features = []                  # entry id -> packed sorted shingle hashes
+        self._literals = array("I")          # entry id -> literal_key()
+        self._answers = []
+        self._tables = [{} for _ in range(bands)]  # band key -> entry id, or list of ids
+        self._next_slot = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def __len__(self):
+        return len(self._answers)
+
+    def signature(self, features):
+        features = list(features)
+        return [min([(a * x + b) % _MERSENNE_PRIME for x in features]) for a, b in self._perms]
+
+    def _band_keys(self, signature):
+        rows = self.rows
+        return [hash(tuple(signature[band * rows:(band + 1) * rows])) for band in range(self.bands)]
+
+    def lookup(self, question):
+        """Returns (answer, similarity) for the most similar indexed question, or (None, 0.0)."""
+        tokens = tokenize(question)
+        features = shingles(question, tokens)
+        if not features or not self.enabled:
+            return None, 0.0
+        literals = literal_key(tokens)
+        band_keys = self._band_keys(self.signature(features))
+        with self._lock:
+            candidates = set()
+            for table, key in zip(self._tables, band_keys):
+                bucket = table.get(key)
+                if bucket is None:
+                    continue
+                if isinstance(bucket, int):
+                    candidates.add(bucket)
+                elif len(bucket) <= self.max_bucket_scan:
+                    candidates.update(bucket)
+
+            best_id, best_similarity = None, 0.0
+            for entry_id in candidates:
+                if self._literals[entry_id] != literals:
+                    continue
+                other = _unpack(self._features[entry_id])
+                shared = len(features & other)
+                similarity = shared / (len(features) + len(other) - shared)
+                if similarity > best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+
+            if best_id is not None and best_similarity >= self.threshold:
+                self.hits += 1
+                return self._answers[best_id], best_similarity
+            self.misses += 1
+            return None, best_similarity
+
+    def add(self, question, answer):
+        tokens = tokenize(question)
+        features = shingles(question, tokens)
+        if not features or not self.enabled:
+            return
+        literals = literal_key(tokens)
+        band_keys = self._band_keys(self.signature(features))
+        packed = array("I", sorted(features)).tobytes()
+        with self._lock:
+            entry_id = self._next_slot
+            self._next_slot = (self._next_slot + 1) % self.max_entries
+            if entry_id < len(self._answers):
+                evicted = _unpack(self._features[entry_id])
+                self._unlink(entry_id, self._band_keys(self.signature(evicted)))
+                self._features[entry_id] = packed
+                self._literals[entry_id] = literals
+                self._answers[entry_id] = answer
+            else:
+                self._features.append(packed)
+                self._literals.append(literals)
+                self._answers.append(answer)
+            for table, key in zip(self._tables, band_keys):
+                bucket = table.get(key)
+                if bucket is None:
+                    table[key] = entry_id
+                elif isinstance(bucket, int):
+                    table[key] = [bucket, entry_id]
+                else:
+                    bucket.append(entry_id)
+
+    def _unlink(self, entry_id, band_keys):
+        for table, key in zip(self._tables, band_keys):
+            bucket = table.get(key)
+            if bucket == entry_id:
+                del table[key]
+            elif isinstance(bucket, list):
+                bucket.remove(entry_id)
+                if len(bucket) == 1:
+                    table[key] = bucket[0]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._answers),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
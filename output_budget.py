@@ -0,0 +1,85 @@
+"""
+Adaptive max_tokens per call site.
+
+Requesting the same large max_tokens for every call wastes quota: Groq counts it against
+the tokens-per-minute budget while the request is in flight, and the admission
+controller has to reserve it. Each call site (classification, chat, document Q&A,
+quiz) therefore keeps a rolling window of the completion lengths it has actually
+produced and asks for the window's p99 plus a margin, clamped to [floor, ceiling].
+
+Quiz output scales with the number of questions, so quiz budgets are learned per unit
+(tokens per question) and multiplied by the requested count. A completion cut off by
+the limit (finish_reason "length") only tells us the real length was larger, so it is
+recorded at twice the budget it hit, which widens the next budgets quickly.
+"""
+import math
+import threading
+from collections import deque
+
+
+class OutputBudget:
+    """max_tokens for one call site, learned from the last `window` completions."""
+
+    def __init__(self, prior, floor, ceiling, margin=0.25, window=500, min_samples=20, percentile=0.99, overhead=0):
+        self.prior = prior            # tokens per unit until min_samples completions are seen
+        self.floor = floor
+        self.ceiling = ceiling
+        self.margin = margin
+        self.min_samples = min_samples
+        self.percentile = percentile
+        self.overhead = overhead      # fixed tokens on top of the per-unit budget
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._per_unit = None         # cached learned tokens per unit; None = recompute
+        self.truncated = 0
+
+    def _learned_per_unit(self):
+        """p99 of the window plus the margin, or the prior while the window is small. Caller holds the lock."""
+        if len(self._samples) < self.min_samples:
+            return self.prior
+        if self._per_unit is None:
+            ordered = sorted(self._samples)
+            p99 = ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile))]
+            self._per_unit = p99 * (1 + self.margin)
+        return self._per_unit
+
+    def max_tokens(self, units=1):
+        with self._lock:
+            per_unit = self._learned_per_unit()
+        return max(self.floor, min(self.ceiling, math.ceil(per_unit * units) + self.overhead))
+
+    def observe(self, completion_tokens, units=1, max_tokens=None, finish_reason=None):
+        """Records one completion; max_tokens is the budget it was given."""
+        if completion_tokens is None or units <= 0:
+            return
+        if finish_reason == "length" and max_tokens:
+            self.truncated += 1
+            completion_tokens = max(completion_tokens, 2 * max_tokens)
+        with self._lock:
+            self._samples.append(max(0, completion_tokens - self.overhead) / units)
+            self._per_unit = None
+
+    def stats(self):
+        with self._lock:
+            samples = len(self._samples)
+            per_unit = self._learned_per_unit()
+        return {
+            "samples": samples,
+            "learned": samples >= self.min_samples,
+            "tokens_per_unit": round(per_unit, 1),
+            "max_tokens": self.max_tokens(),
+            "truncated": self.truncated,
+        }
+
+
+class OutputBudgets:
+    """Named OutputBudget per call site."""
+
+    def __init__(self, budgets):
+        self._budgets = dict(budgets)
+
+    def __getitem__(self, call_site):
+        return self._budgets[call_site]
+
+    def stats(self):
+        return {name: budget.stats() for name, budget in self._budgets.items()}
@@ -0,0 +1,92 @@
+"""
+Incremental parser for a streamed JSON array of objects.
+
+Used by the streaming quiz mode: the model emits `[{...}, {...}, ...]` token by token,
+and each question object is handed back as soon as its closing brace arrives instead
+of waiting for the whole array.
+"""
+import json
+import re
+
+# Characters that can change the parser state outside / inside a string literal.
+_STRUCTURAL = re.compile(r'["{}\[\]]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+
+class IncrementalArrayParser:
+    """Feeds text chunks in, gets completed top-level array elements out.
+
+    Anything before the opening `[` (introductory text, a ```json fence) is skipped,
+    and so is anything after the closing `]`.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.closed = False
+        self._depth = 0          # nesting depth inside the current element
+        self._in_string = False
+        self._escape = False
+        self._element = []       # text chunks of the element being assembled
+
+    def feed(self, chunk):
+        """Consumes `chunk` and returns the list of elements completed by it."""
+        completed = []
+        pos = 0
+        length = len(chunk)
+        while pos < length and not self.closed:
+            if not self.started:
+                start = chunk.find("[", pos)
+                if start == -1:
+                    return completed
+                self.started = True
+                pos = start + 1
+                continue
+
+            if self._depth == 0:
+                # Between elements: only whitespace, commas or the closing bracket.
+                char = chunk[pos]
+                if char == "]":
+                    self.closed = True
+                elif char == "{" or char == "[":
+                    self._depth = 1
+                    self._element.append(char)
+                pos += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                    self._element.append(chunk[pos])
+                    pos += 1
+                    continue
+                match = _STRING_SPECIAL.search(chunk, pos)
+                if match is None:
+                    self._element.append(chunk[pos:])
+                    return completed
+                end = match.end()
+                self._element.append(chunk[pos:end])
+                if match.group() == "\\":
+                    self._escape = True
+                else:
+                    self._in_string = False
+                pos = end
+                continue
+
+            match = _STRUCTURAL.search(chunk, pos)
+            if match is None:
+                self._element.append(chunk[pos:])
+                return completed
+            end = match.end()
+            self._element.append(chunk[pos:end])
+            char = match.group()
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    completed.append(json.loads("".join(self._element)))
+                    self._element = []
+            pos = end
+        return completed
@@ -0,0 +1,131 @@
+"""
+Token-budgeted prompt assembly.
+
+estimate_tokens() is a fast local approximation of the Llama 3 tokenizer (no model
+files, a few regex scans): ASCII words cost about one token each plus one per extra
+eight letters, digits are grouped in threes, and every symbol and non-ASCII character
+counts as its own token. It errs on the high side so a prompt that fits locally also
+fits upstream.
+
+fit_to_budget() shrinks a document to a token budget by keeping its head and its tail
+and dropping the middle. Cuts happen at the coarsest boundary that fits: sections
+(blank lines), then lines, sentences, words and, as a last resort, characters. The
+dropped span is replaced by a marker naming the headings it contained, and the number
+of dropped tokens is returned so callers can report it.
+"""
+import math
+import re
+from collections import namedtuple
+
+_ASCII_WORD = re.compile(r"[A-Za-z]+")
+_DIGIT_RUN = re.compile(r"\d+")
+_SYMBOL = re.compile(r"[^\w\s]")
+_NON_ASCII_WORD_CHAR = re.compile(r"[^\W\d_A-Za-z]")
+
+# Boundaries tried from coarsest to finest when a piece does not fit.
+_BOUNDARIES = (
+    re.compile(r"\n[ \t]*\n\s*"),     # sections
+    re.compile(r"\n"),                # lines
+    re.compile(r"(?<=[.!?;])\s+"),    # sentences
+    re.compile(r"\s+"),               # words
+)
+_MARKER_TOKENS = 128                   # reserved for the omission marker
+_MAX_LISTED_HEADINGS = 8
+
+FittedText = namedtuple("FittedText", "text tokens dropped_tokens")
+
+
+class PromptTooLarge(ValueError):
+    """Raised instead of sending a prompt that exceeds the upstream token limit."""
+
+    def __init__(self, tokens, limit):
+        super().__init__(f"prompt of ~{tokens} tokens exceeds the {limit} token limit")
+        self.tokens = tokens
+        self.limit = limit
+
+
+def estimate_tokens(text):
+    """Approximate Llama 3 token count of text."""
+    if not text:
+        return 0
+    words = _ASCII_WORD.findall(text)
+    letters = sum(map(len, words))
+    digits = sum(math.ceil(len(run) / 3) for run in _DIGIT_RUN.findall(text))
+    return (len(words) + letters // 8 + digits + len(_SYMBOL.findall(text))
+            + len(_NON_ASCII_WORD_CHAR.findall(text)))
+
+
+def _pieces(text, boundary):
+    """Yields (start, end) spans of the pieces between boundary matches."""
+    start = 0
+    for match in boundary.finditer(text):
+        if match.start() > start:
+            yield start, match.start()
+        start = match.end()
+    if start < len(text):
+        yield start, len(text)
+
+
+def _cut(text, budget, from_end, level=0):
+    """Index where a prefix (or, from_end, a suffix) of text fitting in budget tokens ends (starts)."""
+    if budget <= 0:
+        return len(text) if from_end else 0
+    if level == len(_BOUNDARIES):
+        chars = budget * 2                     # a token is rarely shorter than two characters
+        return max(0, len(text) - chars) if from_end else min(len(text), chars)
+    spans = list(_pieces(text, _BOUNDARIES[level]))
+    if from_end:
+        spans.reverse()
+    used = 0
+    cut = len(text) if from_end else 0
+    for start, end in spans:
+        cost = estimate_tokens(text[start:end]) + 1  # + separator
+        if used + cost <= budget:
+            used += cost
+            cut = start if from_end else end
+            continue
+        inner = _cut(text[start:end], budget - used, from_end, level + 1)
+        if from_end and inner < end - start:
+            cut = start + inner
+        elif not from_end and inner > 0:
+            cut = start + inner
+        break
+    return cut
+
+
+def _looks_like_heading(line):
+    line = line.strip()
+    if not 2 < len(line) <= 60 or line.endswith((".", ",", ";")):
+        return False
+    return line.isupper() or line.endswith(":") or (line.istitle() and len(line.split()) <= 6)
+
+
+def _headings(text):
+    headings = []
+    for line in text.splitlines():
+        if _looks_like_heading(line) and line.strip().rstrip(":") not in headings:
+            headings.append(line.strip().rstrip(":"))
+            if len(headings) == _MAX_LISTED_HEADINGS:
+                break
+    return headings
+
+
+def fit_to_budget(text, max_tokens, head_share=0.7):
+    """Returns FittedText(text, tokens, dropped_tokens) with text cut down to about max_tokens.
+
+    head_share of the budget keeps the beginning of the document and the rest its end.
+    """
+    total = estimate_tokens(text)
+    if total <= max_tokens:
+        return FittedText(text, total, 0)
+    available = max(0, max_tokens - _MARKER_TOKENS)
+    head_budget = int(available * head_share)
+    head_end = _cut(text, head_budget, from_end=False)
+    tail_start = max(head_end, _cut(text, available - head_budget, from_end=True))
+    head, middle, tail = text[:head_end].rstrip(), text[head_end:tail_start], text[tail_start:].lstrip()
+    dropped = estimate_tokens(middle)
+    headings = _headings(middle)
+    listed = f"; sections: {', '.join(headings)}" if headings else ""
+    marker = f"[... {dropped} tokens of the document omitted{listed} ...]"
+    fitted = "\n\n".join(part for part in (head, marker, tail) if part)
+    return FittedText(fitted, estimate_tokens(fitted), dropped)
@@ -0,0 +1,131 @@
+"""
+Per-topic pools of generated quiz questions.
+
+Every quiz generated for a topic is deduplicated into that topic's pool; later requests
+for the same topic are answered by sampling from the pool instead of calling the model.
+"""
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Whitespace and sentence punctuation; symbols such as + # - * / are part of the key, so
+# "C++", "C#" and "C" (or "12+7" and "12-7") never share a pool or a question slot.
+_SEPARATOR = re.compile(r"[\s!?.,;:'\"`_]+")
+
+
+def normalize_topic(topic):
+    """'  Python Basics!' and 'python basics' share a pool; 'C++ basics' and 'C# basics' do not."""
+    return _SEPARATOR.sub(" ", topic.lower()).strip()
+
+
+def _question_key(question):
+    return _SEPARATOR.sub(" ", question["text"].lower()).strip()
+
+
+def is_valid_question(question):
+    return (
+        isinstance(question, dict)
+        and isinstance(question.get("text"), str) and question["text"].strip() != ""
+        and isinstance(question.get("options"), list) and len(question["options"]) >= 2
+        and question.get("correctAnswer") in question["options"]
+    )
+
+
+class _TopicPool:
+    __slots__ = ("questions", "keys", "refreshed_at")
+
+    def __init__(self):
+        self.questions = []
+        self.keys = set()
+        self.refreshed_at = 0.0
+
+
+class QuizPool:
+    """Thread-safe map of normalized topic -> deduplicated question list.
+
+    A pool is only served while it holds enough questions and was refilled less than
+    `ttl` seconds ago. Each pool keeps at most `max_questions` (oldest dropped first)
+    and at most `max_topics` pools are kept (least recently used dropped first).
+    """
+
+    def __init__(self, max_questions=50, ttl=86400, max_topics=500):
+        self.max_questions = max_questions
+        self.ttl = ttl
+        self.max_topics = max_topics
+        self._pools = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.max_topics > 0 and self.max_questions > 0
+
+    def size(self, topic):
+        with self._lock:
+            pool = self._pools.get(normalize_topic(topic))
+            return len(pool.questions) if pool else 0
+
+    def is_stale(self, topic, margin=1.0):
+        """True if the pool is missing or was last refilled more than `margin * ttl` seconds ago."""
+        with self._lock:
+            pool = self._pools.get(normalize_topic(topic))
+            return pool is None or time.monotonic() - pool.refreshed_at > self.ttl * margin
+
+    def sample(self, topic, count):
+        """Returns `count` random questions for the topic, or None if the pool is too small or stale."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            key = normalize_topic(topic)
+            pool = self._pools.get(key)
+            if pool is None or len(pool.questions) < count or time.monotonic() - pool.refreshed_at > self.ttl:
+                self.misses += 1
+                return None
+            self._pools.move_to_end(key)
+            self.hits += 1
+            return random.sample(pool.questions, count)
+
+    def add(self, topic, questions):
+        """Adds new, valid questions to the topic's pool and returns how many were added."""
+        if not self.enabled:
+            return 0
+        with self._lock:
+            key = normalize_topic(topic)
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = _TopicPool()
+                while len(self._pools) > self.max_topics:
+                    self._pools.popitem(last=False)
+            self._pools.move_to_end(key)
+            pool.refreshed_at = time.monotonic()
+
+            added = 0
+            for question in questions:
+                if not is_valid_question(question):
+                    continue
+                question_key = _question_key(question)
+                if question_key in pool.keys:
+                    continue
+                pool.keys.add(question_key)
+                pool.questions.append(question)
+                added += 1
+            overflow = len(pool.questions) - self.max_questions
+            if overflow > 0:
+                for dropped in pool.questions[:overflow]:
+                    pool.keys.discard(_question_key(dropped))
+                del pool.questions[:overflow]
+            return added
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "topics": len(self._pools),
+                "questions": sum(len(pool.questions) for pool in self._pools.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
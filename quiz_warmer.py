@@ -0,0 +1,190 @@
+"""
+Background warmer for the per-topic quiz pools.
+
+/api/generate-quiz topics are counted with a count-min sketch and the hottest ones are
+tracked in a bounded top-k heap. A daemon thread refills the pools of those topics
+while no live upstream call is in flight, limited to a share of the upstream request
+budget so it never competes with user traffic.
+"""
+import heapq
+import logging
+import threading
+import time
+import zlib
+from array import array
+
+from quiz_pool import normalize_topic
+
+log = logging.getLogger("edugen.quiz_warmer")
+
+
+class CountMinSketch:
+    """Fixed-memory frequency estimator; estimates never undercount."""
+
+    def __init__(self, width=2048, depth=4):
+        self.width = width
+        self.depth = depth
+        self._rows = [array("L", bytes(array("L").itemsize * width)) for _ in range(depth)]
+
+    def _indexes(self, key):
+        data = key.encode("utf-8")
+        return [zlib.crc32(data, seed) % self.width for seed in range(1, self.depth + 1)]
+
+    def add(self, key, count=1):
+        """Adds `count` occurrences of key and returns its new estimate."""
+        estimate = None
+        for row, index in zip(self._rows, self._indexes(key)):
+            row[index] += count
+            estimate = row[index] if estimate is None else min(estimate, row[index])
+        return estimate
+
+    def estimate(self, key):
+        return min(row[index] for row, index in zip(self._rows, self._indexes(key)))
+
+    def decay(self):
+        """Halves every counter so old popularity fades out."""
+        for row in self._rows:
+            for index in range(self.width):
+                row[index] >>= 1
+
+
+class HeavyHitters:
+    """Top-k keys by count-min estimate, kept in a min-heap with lazy invalidation."""
+
+    def __init__(self, k=20, sketch=None):
+        self.k = k
+        self.sketch = sketch or CountMinSketch()
+        self._counts = {}  # key -> latest estimate
+        self._heap = []    # (estimate, key), may hold stale entries
+
+    def add(self, key):
+        estimate = self.sketch.add(key)
+        if key in self._counts or len(self._counts) < self.k:
+            self._counts[key] = estimate
+            heapq.heappush(self._heap, (estimate, key))
+        elif estimate > self._min_count():
+            _, evicted = heapq.heappop(self._heap)
+            del self._counts[evicted]
+            self._counts[key] = estimate
+            heapq.heappush(self._heap, (estimate, key))
+        if len(self._heap) > 4 * self.k:
+            self._rebuild()
+
+    def _min_count(self):
+        # Drop heap entries superseded by a later estimate of the same key.
+        while self._heap and self._counts.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0]
+
+    def _rebuild(self):
+        self._heap = [(count, key) for key, count in self._counts.items()]
+        heapq.heapify(self._heap)
+
+    def decay(self):
+        self.sketch.decay()
+        self._counts = {key: count >> 1 for key, count in self._counts.items() if count >> 1}
+        self._rebuild()
+
+    def top(self):
+        """Returns [(key, estimate)] sorted hottest first."""
+        return sorted(self._counts.items(), key=lambda item: item[1], reverse=True)
+
+
+class QuizPoolWarmer:
+    """Refills the quiz pools of the hottest topics from a daemon thread.
+
+    `generate(topic)` must return a list of questions. `is_idle()` gates every refill
+    on there being no live upstream traffic, and at most `calls_per_minute` refills
+    are made (the warmer's share of the upstream request budget). Topics rejected by
+    `accepts(topic)`, e.g. ones whose prompt would be too large to send, are never
+    tracked, so they take neither a top-k slot nor refill budget.
+    """
+
+    def __init__(self, pool, generate, is_idle, calls_per_minute=3.0, target_size=20,
+                 top_k=20, interval=5.0, decay_interval=600.0, accepts=None):
+        self.pool = pool
+        self.generate = generate
+        self.is_idle = is_idle
+        self.accepts = accepts
+        self.calls_per_minute = calls_per_minute
+        self.target_size = target_size
+        self.interval = interval
+        self.decay_interval = decay_interval
+        self.hitters = HeavyHitters(k=top_k)
+        self._display_names = {}  # normalized topic -> topic as last requested
+        self._lock = threading.Lock()
+        self._tokens = 1.0
+        self._last_refill_check = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = None
+        self.refills = 0
+        self.failures = 0
+
+    def record(self, topic):
+        key = normalize_topic(topic)
+        if not key or (self.accepts is not None and not self.accepts(topic)):
+            return
+        with self._lock:
+            self._display_names[key] = topic.strip()
+            self.hitters.add(key)
+
+    def start(self):
+        if self._thread is None and self.calls_per_minute > 0:
+            self._thread = threading.Thread(target=self._run, name="quiz-pool-warmer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _take_budget(self):
+        """Token bucket holding at most one call, refilled at calls_per_minute."""
+        now = time.monotonic()
+        self._tokens = min(1.0, self._tokens + (now - self._last_refill_check) * self.calls_per_minute / 60.0)
+        self._last_refill_check = now
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return True
+        return False
+
+    def _next_topic(self):
+        with self._lock:
+            for key, _ in self.hitters.top():
+                if self.pool.size(key) < self.target_size or self.pool.is_stale(key, margin=0.8):
+                    return self._display_names.get(key, key)
+        return None
+
+    def run_once(self):
+        """Performs at most one refill; returns the refilled topic or None."""
+        if not self.is_idle():
+            return None
+        topic = self._next_topic()
+        if topic is None or not self._take_budget():
+            return None
+        try:
+            added = self.pool.add(topic, self.generate(topic))
+            self.refills += 1
+            log.info("Quiz pool warmer added %d questions for %r", added, topic)
+        except Exception as e:
+            self.failures += 1
+            log.warning("Quiz pool warmer error for %r: %s", topic, e)
+        return topic
+
+    def _run(self):
+        last_decay = time.monotonic()
+        while not self._stop.wait(self.interval):
+            if time.monotonic() - last_decay > self.decay_interval:
+                with self._lock:
+                    self.hitters.decay()
+                last_decay = time.monotonic()
+            self.run_once()
+
+    def stats(self):
+        with self._lock:
+            hot = self.hitters.top()[:5]
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "calls_per_minute": self.calls_per_minute,
+            "refills": self.refills,
+            "failures": self.failures,
+            "hot_topics": [{"topic": key, "estimate": count} for key, count in hot],
+        }
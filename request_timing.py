@@ -0,0 +1,123 @@
+"""
+Per-request stage timing, reported as a Server-Timing header and a structured log line.
+
+Code on the request path wraps its stages in `with stage("parse"):` (or calls
+record() for durations it measured itself). The timer lives in a context variable that
+begin_request() sets, so the stages of the current request are collected without passing
+anything around; this also follows requests into the hedging threads and the ASGI
+threadpool, which copy the context.
+
+With REQUEST_TIMING_ENABLED unset, begin_request() stores nothing and stage() returns a
+shared no-op context manager: one context variable lookup per stage.
+"""
+import contextvars
+import logging
+import os
+import time
+
+ENABLED = os.getenv("REQUEST_TIMING_ENABLED", "false").lower() == "true"
+
+log = logging.getLogger("edugen.request_timing")
+
+
+class _Stage:
+    __slots__ = ("timer", "name", "started")
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.record(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class _NoStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+class RequestTimer:
+    """Stages of one request in the order they finished, as (name, seconds) pairs.
+
+    A name may appear more than once (e.g. two upstream calls from the same call site);
+    Server-Timing allows repeated metric names.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = []
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def record(self, name, seconds):
+        self.stages.append((name, seconds))
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def header(self):
+        """The Server-Timing header value, with the time spent so far as `total`."""
+        metrics = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages]
+        metrics.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(metrics)
+
+    def log(self, method, path, status):
+        """Logs the request's stages as one structured line."""
+        log.info("request timing", extra={"fields": {
+            "event": "request_timing",
+            "method": method,
+            "path": path,
+            "status": status,
+            "total_ms": round(self.elapsed() * 1000, 1),
+            "stages": [{"name": name, "ms": round(seconds * 1000, 1)} for name, seconds in self.stages],
+        }})
+
+
+_current_timer = contextvars.ContextVar("request_timer", default=None)
+
+
+def begin_request():
+    """Starts timing the current request (or task); returns the timer, or None when disabled."""
+    if not ENABLED:
+        return None
+    timer = RequestTimer()
+    _current_timer.set(timer)
+    return timer
+
+
+def end_request():
+    """Drops the current request's timer, so a later request on this thread cannot report it."""
+    _current_timer.set(None)
+
+
+def current_timer():
+    return _current_timer.get()
+
+
+def stage(name):
+    """Context manager timing one stage of the current request; a no-op when timing is off."""
+    timer = _current_timer.get()
+    if timer is None:
+        return _NO_STAGE
+    return timer.stage(name)
+
+
+def record(name, seconds):
+    """Adds a stage measured by the caller to the current request."""
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.record(name, seconds)
@@ -0,0 +1,319 @@
+"""
+On-demand sampling profiler for finding where request time goes in production.
+
+A session starts a daemon thread that reads every thread's Python stack with
+sys._current_frames() every `interval` seconds and counts identical stacks. Nothing is
+traced or hooked in the meantime, so a running session only costs the sampler's own
+time (a few tens of microseconds per sample), and no session costs nothing.
+
+By default only threads that are serving a request matching the session's route are
+sampled (the web layer calls request_started()/request_finished()); all_threads=True
+samples everything, background threads included. On the ASGI path all async requests
+share the event loop thread, which is sampled while any matching request is in flight.
+
+A session ends after `seconds`, after `requests` matching requests have finished, or at
+whichever comes first. Starting one does not wait for it: the caller gets the session id
+and fetches the result later with result(). Results are exported as collapsed stacks
+(flamegraph.pl, speedscope, inferno) or as a speedscope JSON document.
+
+Sessions are per process: with several gunicorn workers only the worker that received the
+profiling call is profiled. Their status and results are written to `results_dir`, so any
+worker on the host can answer a result() call.
+"""
+import collections
+import contextvars
+import functools
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+
+MAX_SECONDS = 300
+MIN_INTERVAL = 0.001
+RESULT_TTL = 3600  # seconds a finished session's result file is kept
+LOST_GRACE = 30    # a session still "running" this long after its deadline died with its worker
+
+_SESSION_ID = re.compile(r"^[0-9a-f]{32}$")
+
+log = logging.getLogger("edugen.sampling_profiler")
+
+_current_session = contextvars.ContextVar("profiled_request_session", default=None)
+
+_ROOT = os.path.dirname(os.path.abspath(__file__)) + os.sep
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profiling session is already running in this process."""
+
+
+def _short_path(filename):
+    if filename.startswith(_ROOT):
+        return filename[len(_ROOT):]
+    for marker in ("site-packages" + os.sep, "dist-packages" + os.sep):
+        if marker in filename:
+            return filename.split(marker, 1)[1]
+    return os.path.basename(filename)
+
+
+class ProfileSession:
+    """Stack counts collected by one profiling run."""
+
+    def __init__(self, interval, seconds=None, requests=None, route=None, all_threads=False):
+        self.id = uuid.uuid4().hex
+        self.interval = interval
+        self.seconds = seconds
+        self.requests = requests
+        self.route = route
+        self.all_threads = all_threads
+        self.counts = collections.Counter()
+        self.samples = 0
+        self.completed_requests = 0
+        self.started = time.perf_counter()
+        self.ended = None
+        self.deadline = time.monotonic() + min(seconds or MAX_SECONDS, MAX_SECONDS)
+        self.deadline_at = time.time() + min(seconds or MAX_SECONDS, MAX_SECONDS)
+        self.done = threading.Event()       # asks the sampler to stop
+        self.finished = threading.Event()   # set by the sampler once it has stopped
+        self._threads = collections.Counter()  # thread ident -> matching requests in flight
+        self._lock = threading.Lock()
+
+    def matches(self, route):
+        return self.route is None or route == self.route
+
+    def enter(self, ident):
+        with self._lock:
+            self._threads[ident] += 1
+
+    def leave(self, ident, request_done=True):
+        with self._lock:
+            self._threads[ident] -= 1
+            if self._threads[ident] <= 0:
+                del self._threads[ident]
+            if not request_done:
+                return
+            self.completed_requests += 1
+            if self.requests and self.completed_requests >= self.requests:
+                self.done.set()
+
+    def _targets(self, frames, exclude):
+        if self.all_threads:
+            return [ident for ident in frames if ident not in exclude]
+        with self._lock:
+            return [ident for ident in self._threads if ident in frames]
+
+    def sample(self, exclude):
+        frames = sys._current_frames()
+        for ident in self._targets(frames, exclude):
+            stack = []
+            frame = frames[ident]
+            while frame is not None:
+                code = frame.f_code
+                stack.append((getattr(code, "co_qualname", code.co_name), code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            stack.reverse()
+            self.counts[tuple(stack)] += 1
+            self.samples += 1
+
+    def wait(self):
+        """Blocks until the sampler has stopped and the counts are final."""
+        self.finished.wait()
+
+    def summary(self):
+        return {
+            "id": self.id,
+            "samples": self.samples,
+            "distinct_stacks": len(self.counts),
+            "interval_ms": self.interval * 1000,
+            "duration_s": round((self.ended or time.perf_counter()) - self.started, 3),
+            "completed_requests": self.completed_requests,
+            "route": self.route,
+        }
+
+    @staticmethod
+    def _frame_name(frame):
+        name, filename, line = frame
+        return f"{name} ({_short_path(filename)}:{line})"
+
+    def collapsed(self):
+        """Brendan Gregg's collapsed-stack format: 'root;...;leaf count' per line."""
+        lines = [";".join(self._frame_name(frame) for frame in stack) + f" {count}"
+                 for stack, count in self.counts.most_common()]
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def speedscope(self, name="edugen"):
+        """A speedscope 'sampled' profile; identical stacks are merged and weighted in seconds."""
+        frames, index = [], {}
+        samples, weights = [], []
+        for stack, count in self.counts.most_common():
+            indices = []
+            for frame in stack:
+                if frame not in index:
+                    index[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": _short_path(frame[1]), "line": frame[2]})
+                indices.append(index[frame])
+            samples.append(indices)
+            weights.append(count * self.interval)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "exporter": "edugen sampling_profiler",
+            "name": name,
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }],
+        }
+
+
+class SamplingProfiler:
+    """Runs at most one ProfileSession at a time and tells it which threads to sample.
+
+    Requests to an excluded route, or below it ("/admin/profile/<id>"), are never sampled.
+    """
+
+    def __init__(self, excluded_routes=(), results_dir=None):
+        self.excluded_routes = set(excluded_routes)
+        self.results_dir = results_dir
+        self._session = None
+        self._results = {}  # session id -> result, when there is no results_dir
+        self._lock = threading.Lock()
+
+    def _excluded(self, route):
+        return any(route == excluded or route.startswith(excluded + "/") for excluded in self.excluded_routes)
+
+    def _result_path(self, session_id):
+        return os.path.join(self.results_dir, f"{session_id}.json")
+
+    def _store(self, result):
+        if self.results_dir is None:
+            with self._lock:
+                self._results[result["id"]] = result
+            return
+        os.makedirs(self.results_dir, mode=0o700, exist_ok=True)
+        path = self._result_path(result["id"])
+        with open(f"{path}.{os.getpid()}.tmp", "w") as handle:
+            json.dump(result, handle)
+        os.replace(f"{path}.{os.getpid()}.tmp", path)
+
+    def _expire_results(self):
+        cutoff = time.time() - RESULT_TTL
+        if self.results_dir is None:
+            with self._lock:
+                for session_id in [key for key, result in self._results.items() if result["updated"] < cutoff]:
+                    del self._results[session_id]
+            return
+        try:
+            names = os.listdir(self.results_dir)
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(self.results_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def result(self, session_id):
+        """The status of a session ("running", "done" or "lost") with its results once done,
+        or None for an unknown (or expired) id."""
+        if not _SESSION_ID.match(session_id or ""):
+            return None
+        if self.results_dir is None:
+            with self._lock:
+                result = self._results.get(session_id)
+        else:
+            try:
+                with open(self._result_path(session_id)) as handle:
+                    result = json.load(handle)
+            except (FileNotFoundError, ValueError):
+                return None
+        if result and result["status"] == "running" and time.time() > result["deadline_at"] + LOST_GRACE:
+            result = dict(result, status="lost")
+        return result
+
+    def start(self, interval=0.01, seconds=None, requests=None, route=None, all_threads=False):
+        """Starts a session and its sampler thread; raises ProfilerBusy if one is running."""
+        if not seconds and not requests:
+            raise ValueError("give seconds, requests or both")
+        session = ProfileSession(max(interval, MIN_INTERVAL), seconds, requests, route, all_threads)
+        with self._lock:
+            if self._session is not None:
+                raise ProfilerBusy()
+            self._session = session
+        self._expire_results()
+        self._store(self._status(session, "running"))
+        exclude = {threading.get_ident()}  # the thread that asked for the profile
+        threading.Thread(target=self._run, args=(session, exclude), name="sampling-profiler", daemon=True).start()
+        return session
+
+    def _run(self, session, exclude):
+        exclude.add(threading.get_ident())
+        try:
+            while not session.done.wait(session.interval):
+                if time.monotonic() >= session.deadline:
+                    break
+                session.sample(exclude)
+        finally:
+            session.ended = time.perf_counter()
+            with self._lock:
+                self._session = None
+            session.done.set()
+            log.info("Profiling session finished", extra={"fields": session.summary()})
+            try:
+                self._store(dict(self._status(session, "done"), collapsed=session.collapsed(),
+                                 speedscope=session.speedscope(name=f"{session.route or 'all routes'} ({os.getpid()})")))
+            finally:
+                session.finished.set()
+
+    @staticmethod
+    def _status(session, status):
+        return {"status": status, "pid": os.getpid(), "deadline_at": session.deadline_at, "updated": time.time(),
+                "requests": session.requests, "all_threads": session.all_threads, **session.summary()}
+
+    def request_started(self, route):
+        """Called by the web layer; returns a token for request_finished(), or None."""
+        session = self._session
+        if session is None:
+            return None
+        if self._excluded(route) or not session.matches(route):
+            _current_session.set(None)
+            return None
+        _current_session.set(session)
+        ident = threading.get_ident()
+        session.enter(ident)
+        return session, ident
+
+    def request_finished(self, token):
+        if token is not None:
+            session, ident = token
+            session.leave(ident)
+
+    def follow(self, fn):
+        """Wraps fn so that a profiled request's work handed to another thread (e.g. the ASGI
+        threadpool, which copies the context) is sampled on that thread too."""
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            session = _current_session.get()
+            if session is None or session.done.is_set():
+                return fn(*args, **kwargs)
+            ident = threading.get_ident()
+            session.enter(ident)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                session.leave(ident, request_done=False)
+        return wrapper
+
+    def stats(self):
+        session = self._session
+        return {"running": session is not None, **(session.summary() if session else {})}
@@ -0,0 +1,84 @@
+"""
+Single-flight request coalescing.
+
+Concurrent callers asking for the same key share one execution: the first caller runs
+the function, the others wait for its result (or exception) instead of issuing an
+identical upstream request of their own.
+"""
+import asyncio
+import threading
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls from threads (the WSGI serving path)."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.collapsed = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.collapsed += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        return {"executed": self.executed, "collapsed": self.collapsed, "in_flight": len(self._calls)}
+
+
+class AsyncSingleFlight:
+    """Coalesces concurrent coroutines on one event loop (the ASGI serving path).
+
+    The shared work runs as its own task, so a caller that disconnects and is
+    cancelled does not cancel the call for everyone else waiting on it.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+        self.executed = 0
+        self.collapsed = 0
+
+    async def do(self, key, coroutine_fn):
+        task = self._tasks.get(key)
+        if task is not None:
+            self.collapsed += 1
+        else:
+            task = asyncio.ensure_future(coroutine_fn())
+            self._tasks[key] = task
+            self.executed += 1
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {"executed": self.executed, "collapsed": self.collapsed, "in_flight": len(self._tasks)}
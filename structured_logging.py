@@ -0,0 +1,225 @@
+"""
+Non-blocking structured logging for the "edugen" loggers.
+
+Request threads only put log records on a bounded in-memory queue; a QueueListener thread
+formats them (JSON by default, one object per line) and writes them to stdout. Message
+interpolation and traceback formatting also happen on the listener thread, so logging an
+exception costs a request about as much as logging a line. When the queue is full the
+record is dropped and counted instead of blocking the caller.
+
+Every record carries the request_id of the request that logged it (a context variable set
+by begin_request(), taken from the X-Request-ID header or generated). Levels can be
+sampled with LOG_SAMPLE_RATES, e.g. "DEBUG=0.01,INFO=0.2": the decision is made per
+request id, so a request keeps either all or none of its lines at a sampled level.
+
+Modules log through logging.getLogger("edugen.<module>"); configure() is called once by
+app.py and leaves the root logger (gunicorn, httpx, ...) alone.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import traceback
+import uuid
+import zlib
+from datetime import datetime, timezone
+
+ROOT_LOGGER = "edugen"
+
+_request_id = contextvars.ContextVar("log_request_id", default=None)
+_REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+
+
+def begin_request(incoming=None):
+    """Sets the correlation id of the current request (or task) and returns it.
+
+    A well-formed incoming id (the client's X-Request-ID) is kept; otherwise one is generated.
+    """
+    request_id = incoming if incoming and _REQUEST_ID_PATTERN.match(incoming) else uuid.uuid4().hex
+    _request_id.set(request_id)
+    return request_id
+
+
+def end_request():
+    """Clears the correlation id, so nothing logged later on this thread claims the request."""
+    _request_id.set(None)
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+def parse_sample_rates(spec):
+    """Parses "DEBUG=0.01,INFO=0.2" into {logging.DEBUG: 0.01, logging.INFO: 0.2}."""
+    rates = {}
+    for part in filter(None, (item.strip() for item in (spec or "").split(","))):
+        name, _, rate = part.partition("=")
+        level = logging.getLevelName(name.strip().upper())
+        if not isinstance(level, int):
+            raise ValueError(f"unknown log level in LOG_SAMPLE_RATES: {name!r}")
+        rates[level] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; fields passed as extra={"fields": {...}} are merged in."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exc_type"] = record.exc_info[0].__name__
+            entry["traceback"] = "".join(traceback.format_exception(*record.exc_info))
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines for local development (LOG_FORMAT=text)."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record):
+        record.request_id = getattr(record, "request_id", None) or "-"
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        return f"{line} {json.dumps(fields, default=str)}" if fields else line
+
+
+class _ContextFilter(logging.Filter):
+    """Runs on the calling thread: attaches the request id and applies level sampling."""
+
+    def __init__(self, sample_rates, stats):
+        super().__init__()
+        self.sample_rates = sample_rates
+        self.stats = stats
+
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        rate = self.sample_rates.get(record.levelno, 1.0)
+        if rate >= 1.0:
+            return True
+        if record.request_id:
+            keep = zlib.crc32(record.request_id.encode()) / 0xFFFFFFFF < rate
+        else:
+            keep = random.random() < rate
+        if not keep:
+            self.stats.count("sampled_out")
+        return keep
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records when the queue is full.
+
+    prepare() keeps the record's args and exc_info instead of formatting them here: the
+    listener runs in this process, so the formatting can wait for its thread.
+    """
+
+    def __init__(self, log_queue, stats):
+        super().__init__(log_queue)
+        self.stats = stats
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.stats.count("dropped")
+        else:
+            self.stats.count("queued")
+
+
+class _Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {"queued": 0, "dropped": 0, "sampled_out": 0}
+
+    def count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+def build_queue_handler(stream, formatter, queue_size=10000, sample_rates=None):
+    """Returns (handler, listener, stats): a queue handler whose records the (not yet
+    started) listener formats and writes to stream, and the handler's counters."""
+    stats = _Stats()
+    log_queue = queue.Queue(maxsize=queue_size)
+    output = logging.StreamHandler(stream)
+    output.setFormatter(formatter)
+    listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    handler = NonBlockingQueueHandler(log_queue, stats)
+    handler.addFilter(_ContextFilter(sample_rates or {}, stats))
+    return handler, listener, stats
+
+
+_configured = None
+
+
+def configure(level=None, fmt=None, queue_size=None, sample_rates=None, stream=None):
+    """Attaches the queue handler to the "edugen" logger and starts the listener thread.
+
+    Arguments default to LOG_LEVEL (INFO), LOG_FORMAT (json), LOG_QUEUE_SIZE (10000) and
+    LOG_SAMPLE_RATES. Only the first call configures anything; it returns the settings.
+    """
+    global _configured
+    if _configured is not None:
+        return _configured
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    fmt = (fmt or os.getenv("LOG_FORMAT", "json")).lower()
+    queue_size = int(queue_size if queue_size is not None else os.getenv("LOG_QUEUE_SIZE", "10000"))
+    if sample_rates is None:
+        sample_rates = parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", ""))
+
+    formatter = TextFormatter() if fmt == "text" else JsonFormatter()
+    handler, listener, stats = build_queue_handler(stream or sys.stdout, formatter, queue_size, sample_rates)
+
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.setLevel(level)
+    logger.addHandler(handler)
+    logger.propagate = False
+    listener.start()
+    atexit.register(listener.stop)  # flushes what is still queued
+
+    _configured = {
+        "level": level,
+        "format": fmt,
+        "queue_size": queue_size,
+        "sample_rates": {logging.getLevelName(lvl): rate for lvl, rate in sample_rates.items()},
+        "queue": handler.queue,
+        "stats": stats,
+    }
+    return _configured
+
+
+def stats():
+    """Queue and sampling counters for /api/health."""
+    if _configured is None:
+        return {"configured": False}
+    return {
+        "level": _configured["level"],
+        "format": _configured["format"],
+        "sample_rates": _configured["sample_rates"],
+        "queue_depth": _configured["queue"].qsize(),
+        "queue_size": _configured["queue_size"],
+        **_configured["stats"].snapshot(),
+    }
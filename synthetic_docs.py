@@ -0,0 +1,125 @@
+"""
+Synthetic PDF and DOCX uploads for benchmarks and load tests.
+
+Documents are generated from a seeded random vocabulary, so the same arguments always
+give the same bytes. PDFs are written directly (one Helvetica text stream per page, no
+extra dependency); DOCX files need python-docx, which the app itself uses.
+
+Both can include tables and non-ASCII text: charset "latin1" mixes in accented words
+(WinAnsi-encoded in PDFs), "unicode" (DOCX only) adds Greek, CJK and emoji. PDF content
+streams can be Flate-compressed like most real-world PDFs.
+"""
+import base64
+import io
+import random
+import zlib
+
+WORDS = ("analysis", "budget", "chapter", "design", "energy", "feedback", "growth", "history", "impact",
+         "journal", "knowledge", "language", "method", "network", "outcome", "project", "quality",
+         "research", "student", "theory", "update", "value", "workflow", "example", "result", "system",
+         "the", "of", "and", "to", "in", "for", "with", "on", "by", "as", "is", "was", "from", "that")
+LATIN1_WORDS = ("café", "naïve", "über", "señor", "façade", "déjà", "straße", "coöperate")
+UNICODE_WORDS = ("αλγόριθμος", "数据", "学习", "Привет", "ζωή", "テスト", "🙂", "✓")
+HEADINGS = ("Introduction", "Background", "Methods", "Results", "Discussion", "Experience", "Education",
+            "Skills", "Projects", "Summary")
+MIME_TYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+
+
+def sentence(rng, words=12, charset="ascii"):
+    vocabulary = WORDS + {"ascii": (), "latin1": LATIN1_WORDS, "unicode": LATIN1_WORDS + UNICODE_WORDS}[charset]
+    text = " ".join(rng.choice(vocabulary) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def table_rows(rng, rows, columns=4):
+    """Header plus `rows` rows of short cells."""
+    header = [f"Column {c + 1}" for c in range(columns)]
+    return [header] + [[f"{rng.choice(WORDS)} {rng.randint(1, 999)}" for _ in range(columns)] for _ in range(rows)]
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _pdf_table(rows):
+    """Content stream operators drawing rows of cells 120pt apart, one text line per row."""
+    ops = []
+    for row in rows:
+        cells = " 120 0 Td ".join(f"({_pdf_escape(cell)}) Tj" for cell in row)
+        ops.append(f"{cells} {-120 * (len(row) - 1)} -12 Td")
+    return ops
+
+
+def make_pdf(pages=3, lines_per_page=40, seed=0, table_rows_per_page=0, charset="ascii", compress=False):
+    """Returns the bytes of a text PDF with `pages` pages of `lines_per_page` lines each.
+
+    table_rows_per_page adds a four-column table to every page; charset is "ascii" or
+    "latin1"; compress Flate-encodes the page content streams.
+    """
+    if charset not in ("ascii", "latin1"):
+        raise ValueError("PDFs support the ascii and latin1 charsets")
+    rng = random.Random(seed)
+    # 1: catalog, 2: page tree, 3: font, then a page object and a content stream per page
+    page_ids = [4 + 2 * i for i in range(pages)]
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        2: f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {pages} >>".encode(),
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    }
+    for number, page_id in enumerate(page_ids):
+        lines = [f"{HEADINGS[number % len(HEADINGS)]} {number + 1}"]
+        lines += [sentence(rng, charset=charset) for _ in range(lines_per_page - 1)]
+        ops = [f"({_pdf_escape(line)}) Tj T*" for line in lines]
+        if table_rows_per_page:
+            ops += _pdf_table(table_rows(rng, table_rows_per_page))
+        height = max(792, 24 + 12 * len(ops))
+        stream = (f"BT /F1 10 Tf 12 TL 50 {height - 12} Td\n" + "\n".join(ops) + "\nET").encode("cp1252")
+        filters = b""
+        if compress:
+            stream, filters = zlib.compress(stream), b" /Filter /FlateDecode"
+        objects[page_id] = (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 {height}] "
+                            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>").encode()
+        objects[page_id + 1] = b"<< /Length %d%s >>\nstream\n%s\nendstream" % (len(stream), filters, stream)
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = out.tell()
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (number, objects[number]))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for number in sorted(objects):
+        out.write(b"%010d 00000 n \n" % offsets[number])
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def make_docx(paragraphs=30, seed=0, tables=0, rows_per_table=10, charset="ascii"):
+    """Returns the bytes of a DOCX with headings every ten paragraphs and `tables` tables."""
+    from docx import Document
+
+    rng = random.Random(seed)
+    document = Document()
+    table_every = paragraphs // tables if tables else 0
+    for i in range(paragraphs):
+        if i % 10 == 0:
+            document.add_heading(HEADINGS[(i // 10) % len(HEADINGS)], level=1)
+        document.add_paragraph(" ".join(sentence(rng, charset=charset) for _ in range(3)))
+        if table_every and i % table_every == table_every - 1:
+            rows = table_rows(rng, rows_per_table)
+            table = document.add_table(rows=len(rows), cols=len(rows[0]))
+            for cells, values in zip(table.rows, rows):
+                for cell, value in zip(cells.cells, values):
+                    cell.text = value
+    out = io.BytesIO()
+    document.save(out)
+    return out.getvalue()
+
+
+def data_url(content, kind):
+    """Encodes file bytes the way the frontend sends them in `fileData`."""
+    return f"data:{MIME_TYPES[kind]};base64,{base64.b64encode(content).decode()}"
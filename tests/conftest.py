@@ -0,0 +1,9 @@
+import os
+
+# app.py reads its configuration at import: point it at a closed port and keep its
+# background warm-up calls and shared admission state out of the tests.
+os.environ.setdefault("GROQ_API_KEY", "test")
+os.environ.setdefault("GROQ_BASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("GROQ_WARMUP", "off")
+os.environ.setdefault("QUIZ_WARMER_ENABLED", "false")
+os.environ.setdefault("GROQ_ADMISSION_ENABLED", "false")
@@ -0,0 +1,89 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+pytest.importorskip("PyPDF2")
+
+import document_extraction
+from document_extraction import PDF, document_text, parse_document
+from synthetic_docs import make_pdf
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def parallel(monkeypatch):
+    monkeypatch.setattr(document_extraction, "PDF_EXTRACTION_WORKERS", 2)
+    monkeypatch.setattr(document_extraction, "PDF_PARALLEL_MIN_PAGES", 10)
+
+
+def serial_text(document):
+    return "".join(page.extract_text() or "" for page in document.pages)
+
+
+def test_parallel_extraction_matches_serial(parallel):
+    data = make_pdf(pages=45, seed=4)
+    document = parse_document(data, PDF)
+    assert document_text(document, PDF, data) == serial_text(document)
+
+
+def test_workers_never_run_the_main_script(tmp_path):
+    log = tmp_path / "imports.log"
+    script = tmp_path / "app.py"
+    script.write_text(textwrap.dedent(f"""
+        with open({str(log)!r}, "a") as f:
+            f.write(__name__ + "\\n")
+
+        import document_extraction
+        from synthetic_docs import make_pdf
+
+        if __name__ == "__main__":
+            document_extraction.PDF_EXTRACTION_WORKERS = 2
+            data = make_pdf(pages=45, seed=4)
+            document = document_extraction.parse_document(data, document_extraction.PDF)
+            print(len(document_extraction.document_text(document, document_extraction.PDF, data)))
+    """))
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    result = subprocess.run([sys.executable, str(script)], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert int(result.stdout) > 0
+    assert log.read_text().split() == ["__main__"]
+
+
+def test_timed_out_worker_is_killed_and_replaced(parallel, monkeypatch):
+    data = make_pdf(pages=45, seed=4)
+    document = parse_document(data, PDF)
+    extract = document_extraction._PageWorker.extract
+    stuck = []
+
+    def never_answers(worker, task, timeout):
+        stuck.append(worker)
+        return extract(worker, task, 0)
+
+    monkeypatch.setattr(document_extraction._PageWorker, "extract", never_answers)
+    assert document_text(document, PDF, data) == ""
+    assert stuck and all(worker.process.returncode is not None for worker in stuck)
+
+    monkeypatch.setattr(document_extraction._PageWorker, "extract", extract)
+    assert document_text(document, PDF, data) == serial_text(document)
+
+
+def test_workers_share_one_temporary_copy_of_the_pdf(parallel, monkeypatch, tmp_path):
+    monkeypatch.setattr(document_extraction.tempfile, "tempdir", str(tmp_path))
+    tasks = []
+    extract = document_extraction._PageWorker.extract
+
+    def record(worker, task, timeout):
+        tasks.append(task)
+        return extract(worker, task, timeout)
+
+    monkeypatch.setattr(document_extraction._PageWorker, "extract", record)
+    data = make_pdf(pages=45, seed=4)
+    document = parse_document(data, PDF)
+    assert document_text(document, PDF, data) == serial_text(document)
+    assert len(tasks) > 1 and len({task[0] for task in tasks}) == 1
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,56 @@
+import pytest
+
+from near_duplicate import NearDuplicateIndex, literal_key, tokenize
+
+
+def index_of(*questions):
+    index = NearDuplicateIndex()
+    for question in questions:
+        index.add(question, f"answer to {question}")
+    return index
+
+
+@pytest.mark.parametrize("question", [
+    "What is photosynthesis?",
+    "what is photosynthesis?? explain",
+    "Can you tell me what is photosynthesis",
+    "Please explain what is photosynthesis.",
+])
+def test_rephrasings_share_an_answer(question):
+    answer, similarity = index_of("What is photosynthesis").lookup(question)
+    assert answer == "answer to What is photosynthesis"
+    assert similarity >= 0.8
+
+
+@pytest.mark.parametrize("indexed, asked", [
+    ("What is 12+7", "What is 12-7"),
+    ("What is 12+7", "What is 12*7"),
+    ("What is 12-7", "What is 7-12"),
+    ("What is 3.5 squared", "What is 35 squared"),
+    ("What is C++?", "What is C#?"),
+    ("What is C++?", "What is C?"),
+    ("What is photosynthesis", "Why is photosynthesis"),
+    ("How does photosynthesis work in plants", "Where does photosynthesis work in plants"),
+])
+def test_different_questions_do_not_collide(indexed, asked):
+    answer, _ = index_of(indexed).lookup(asked)
+    assert answer is None
+
+
+def test_operators_are_tokens_and_punctuation_is_not():
+    assert tokenize("What is 12+7??") == ["what", "is", "12", "+", "7"]
+    assert tokenize("C# vs C++.") == ["c", "#", "vs", "c", "+", "+"]
+
+
+def test_literal_key_depends_on_numbers_and_symbols_only():
+    assert literal_key(tokenize("what is 12+7")) == literal_key(tokenize("please explain 12 + 7"))
+    assert literal_key(tokenize("what is 12+7")) != literal_key(tokenize("what is 12*7"))
+    assert literal_key(tokenize("what is photosynthesis")) == 0
+
+
+def test_same_literals_are_required_after_eviction():
+    index = NearDuplicateIndex(max_entries=1)
+    index.add("What is 12+7", "19")
+    index.add("What is 12*7", "84")
+    assert index.lookup("what is 12*7")[0] == "84"
+    assert index.lookup("what is 12+7")[0] is None
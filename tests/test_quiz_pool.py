@@ -0,0 +1,39 @@
+import pytest
+
+from quiz_pool import QuizPool, normalize_topic
+
+
+def question(text, answer="a"):
+    return {"text": text, "options": ["a", "b", "c", "d"], "correctAnswer": answer}
+
+
+@pytest.mark.parametrize("first, second", [
+    ("  Python Basics!", "python basics"),
+    ("What is photosynthesis?", "what is photosynthesis"),
+    ("C++ basics", "c++  Basics."),
+])
+def test_phrasings_of_a_topic_share_a_key(first, second):
+    assert normalize_topic(first) == normalize_topic(second)
+
+
+@pytest.mark.parametrize("topics", [
+    ("C++ basics", "C# basics", "C basics"),
+    ("F# intro", "F intro"),
+    ("12+7", "12-7", "12*7"),
+])
+def test_topics_differing_in_symbols_get_their_own_pools(topics):
+    assert len({normalize_topic(topic) for topic in topics}) == len(topics)
+
+
+def test_pooled_questions_are_not_served_for_another_language():
+    pool = QuizPool(max_questions=10)
+    pool.add("C++ basics", [question(f"C++ question {n}") for n in range(5)])
+    assert pool.sample("C++ basics", 3) is not None
+    assert pool.sample("C# basics", 3) is None
+    assert pool.sample("C basics", 3) is None
+
+
+def test_questions_differing_in_operators_are_not_deduplicated():
+    pool = QuizPool(max_questions=10)
+    assert pool.add("arithmetic", [question("What is 12+7?"), question("What is 12-7?"),
+                                   question("what is 12+7")]) == 2
@@ -0,0 +1,38 @@
+import pytest
+from starlette.testclient import TestClient
+
+import app
+import asgi
+from quiz_pool import QuizPool
+from quiz_warmer import QuizPoolWarmer
+
+OVERSIZED_TOPIC = "word " * 8000
+
+
+@pytest.fixture(autouse=True)
+def no_rate_limit(monkeypatch):
+    monkeypatch.setattr(app.limiter, "enabled", False)
+
+
+def test_oversized_quiz_topic_is_rejected_with_413():
+    response = app.app.test_client().post("/api/generate-quiz", json={"topic": OVERSIZED_TOPIC, "count": 5})
+    assert response.status_code == 413
+    assert response.get_json() == {"error": app.PROMPT_TOO_LARGE_MESSAGE}
+
+
+def test_oversized_quiz_topic_is_rejected_with_413_on_the_async_path():
+    response = TestClient(asgi.asgi_app).post("/api/generate-quiz", json={"topic": OVERSIZED_TOPIC, "count": 5})
+    assert response.status_code == 413
+    assert response.json() == {"error": app.PROMPT_TOO_LARGE_MESSAGE}
+
+
+def test_warmer_never_tracks_topics_it_cannot_generate():
+    generated = []
+    warmer = QuizPoolWarmer(QuizPool(), generate=lambda topic: generated.append(topic) or [], is_idle=lambda: True,
+                            calls_per_minute=60, accepts=app.warmable_topic)
+    for _ in range(5):
+        warmer.record(OVERSIZED_TOPIC)
+    warmer.record("photosynthesis")
+    assert warmer.run_once() == "photosynthesis"
+    assert generated == ["photosynthesis"]
+    assert [topic["topic"] for topic in warmer.stats()["hot_topics"]] == ["photosynthesis"]
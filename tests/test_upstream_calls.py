@@ -0,0 +1,143 @@
+import asyncio
+import time
+
+import pytest
+from groq import AsyncGroq, Groq
+
+import app
+from circuit_breaker import HALF_OPEN, CircuitBreaker
+from fake_groq import FakeGroqConfig, start_fake_groq
+from model_router import ModelRouter
+from output_budget import OutputBudget, OutputBudgets
+from prompt_budget import PromptTooLarge
+from response_cache import ResponseCache
+
+
+@pytest.fixture
+def half_open(monkeypatch):
+    breaker = CircuitBreaker(min_calls=1, open_seconds=0.01, trial_calls=1)
+    breaker.record_failure()
+    time.sleep(0.02)
+    monkeypatch.setattr(app, "circuit_breaker", breaker)
+    return breaker
+
+
+def request_kwargs(prompt):
+    kwargs = app._groq_request_kwargs(prompt)
+    return kwargs, app._call_class("chat", kwargs)
+
+
+def test_oversized_prompt_gives_back_the_trial_slot(half_open):
+    oversized, call_class = request_kwargs("word " * 8000)
+    for _ in range(3):
+        with pytest.raises(PromptTooLarge):
+            app._reserve_attempt(call_class, oversized, max_wait=0, tried=[])
+    assert half_open.state == HALF_OPEN
+
+    kwargs, call_class = request_kwargs("What is photosynthesis?")
+    model, _, trial = app._reserve_attempt(call_class, kwargs, max_wait=0, tried=[])
+    assert trial is True
+
+
+def test_cancelled_async_reservation_gives_back_the_trial_slot(half_open, monkeypatch):
+    reserve = app._reserve_attempt
+
+    def slow_reserve(*args):
+        time.sleep(0.05)
+        return reserve(*args)
+
+    monkeypatch.setattr(app, "_reserve_attempt", slow_reserve)
+    kwargs, call_class = request_kwargs("What is photosynthesis?")
+
+    async def cancel_during_reservation():
+        task = asyncio.ensure_future(app._create_completion_async(kwargs, call_class))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0.1)
+
+    asyncio.run(cancel_during_reservation())
+    assert half_open.stats()["trials_in_flight"] == 0
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """The stand-in Groq server, with budgets far too small for its chat and quiz replies."""
+    server = start_fake_groq(FakeGroqConfig(latency="0", tokens_per_second=0, reply_words=200))
+    monkeypatch.setattr(app, "client", Groq(api_key="test", base_url=server.base_url, max_retries=0))
+    monkeypatch.setattr(app, "async_client", AsyncGroq(api_key="test", base_url=server.base_url, max_retries=0))
+    monkeypatch.setattr(app, "response_cache", ResponseCache(max_size=100, ttl=60))
+    monkeypatch.setattr(app, "output_budgets", OutputBudgets({
+        site: OutputBudget(prior=8, floor=8, ceiling=app.GROQ_MAX_TOKENS) for site in ("chat", "quiz")}))
+    yield server
+    server.shutdown()
+
+
+def test_truncated_answer_is_neither_cached_nor_indexed(upstream):
+    remembered = []
+    reply = app.get_groq_response("Explain photosynthesis", use_cache=True, on_complete=remembered.append)
+    assert reply
+    assert remembered == []
+    assert app.response_cache.stats()["size"] == 0
+    assert app.output_budgets["chat"].truncated == 1
+
+
+def test_truncated_stream_is_neither_cached_nor_indexed(upstream):
+    remembered = []
+    deltas = list(app.stream_groq_response("Explain photosynthesis", use_cache=True, on_complete=remembered.append))
+    assert deltas
+    assert remembered == []
+    assert app.response_cache.stats()["size"] == 0
+
+
+def test_truncated_async_answer_is_neither_cached_nor_indexed(upstream):
+    remembered = []
+    reply = asyncio.run(app.get_groq_response_async("Explain photosynthesis", use_cache=True,
+                                                    on_complete=remembered.append))
+    assert reply
+    assert remembered == []
+    assert app.response_cache.stats()["size"] == 0
+
+
+@pytest.mark.parametrize("fetch", [
+    lambda prompt: app.get_groq_response(prompt, call_site="quiz", units=3),
+    lambda prompt: asyncio.run(app.get_groq_response_async(prompt, call_site="quiz", units=3)),
+])
+def test_truncated_quiz_is_retried_at_the_ceiling(upstream, fetch):
+    questions = app.parse_quiz_content(fetch(app.build_quiz_prompt("Photosynthesis", 3)))
+    assert len(questions) == 3
+    assert app.output_budgets["quiz"].truncated == 1
+    assert upstream.counters["requests"] == 2
+
+
+@pytest.fixture
+def roomy_budgets(monkeypatch):
+    budgets = OutputBudgets({site: OutputBudget(prior=app.GROQ_MAX_TOKENS, floor=8, ceiling=app.GROQ_MAX_TOKENS)
+                             for site in ("chat", "quiz")})
+    monkeypatch.setattr(app, "output_budgets", budgets)
+    return budgets
+
+
+def test_fallback_model_answer_is_not_cached(upstream, roomy_budgets, monkeypatch):
+    router = ModelRouter(app.routing_table)
+    monkeypatch.setattr(app, "model_router", router)
+    router.mark_rate_limited(router.preferred("chat"), 60)
+    remembered = []
+    assert app.get_groq_response("Explain photosynthesis", use_cache=True, on_complete=remembered.append)
+    assert remembered == []
+    assert app.response_cache.stats()["size"] == 0
+
+
+def test_cached_answer_survives_a_budget_change(upstream, roomy_budgets, monkeypatch):
+    first = app.get_groq_response("Explain photosynthesis", use_cache=True)
+    assert app.response_cache.stats()["size"] == 1
+    monkeypatch.setattr(roomy_budgets["chat"], "prior", app.GROQ_MAX_TOKENS // 2)
+    assert app.get_groq_response("Explain photosynthesis", use_cache=True) == first
+    assert upstream.counters["requests"] == 1
+
+
+def test_calls_with_different_budgets_are_not_coalesced():
+    prompt = "Explain photosynthesis"
+    assert app._flight_key(prompt, "chat", {"max_tokens": 256}) != app._flight_key(prompt, "chat", {"max_tokens": 512})
+    assert app._flight_key(prompt, "chat", {"max_tokens": 256}) != app._flight_key(prompt, "quiz", {"max_tokens": 256})
@@ -0,0 +1,298 @@
+"""
+Retry scheduling for upstream Groq calls.
+
+Errors are classified from the SDK's exception types instead of matching "429" in the
+message: rate limits, server errors, timeouts and connection failures are retried,
+everything else (bad requests, auth errors, ...) fails immediately. The wait before the
+next attempt comes from the server's own hints when present (retry-after-ms,
+retry-after, x-ratelimit-reset-requests / -tokens), otherwise from jittered exponential
+backoff.
+
+Every policy has a total wait budget per request. The sync (WSGI) path uses a small one,
+so a worker thread is never parked for long: when the server asks for a longer pause
+the call gives up at once and the caller can pass Retry-After on to the client. The
+async path waits with asyncio.sleep, which does not hold a worker, and can afford a
+larger budget.
+
+The retries and wait time of the current request are recorded in a context variable
+(see begin_request / current_record), so the web layer can report them per response.
+"""
+import asyncio
+import contextvars
+import logging
+import math
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import groq
+
+log = logging.getLogger("edugen.upstream_retry")
+
+RATE_LIMIT = "rate_limit"
+SERVER_ERROR = "server_error"
+TIMEOUT = "timeout"
+CONNECTION = "connection"
+NON_RETRYABLE = "non_retryable"
+RETRYABLE_KINDS = (RATE_LIMIT, SERVER_ERROR, TIMEOUT, CONNECTION)
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def classify_error(error):
+    """Returns one of RATE_LIMIT, SERVER_ERROR, TIMEOUT, CONNECTION or NON_RETRYABLE."""
+    if isinstance(error, groq.APITimeoutError):  # subclass of APIConnectionError
+        return TIMEOUT
+    if isinstance(error, groq.APIConnectionError):
+        return CONNECTION
+    if isinstance(error, groq.APIStatusError):
+        if error.status_code == 429:
+            return RATE_LIMIT
+        if error.status_code == 408:
+            return TIMEOUT
+        if error.status_code >= 500:
+            return SERVER_ERROR
+    return NON_RETRYABLE
+
+
+def parse_duration(value):
+    """Parses Groq's reset durations ("7.66s", "2m59.56s", "120ms") or plain seconds."""
+    if value is None:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts or "".join(number + unit for number, unit in parts) != value:
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+def _parse_retry_after(value):
+    """Parses a Retry-After header given either as delta-seconds or as an HTTP date."""
+    seconds = parse_duration(value)
+    if seconds is not None:
+        return seconds
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max(0.0, (moment - datetime.now(timezone.utc)).total_seconds())
+
+
+def retry_after_hint(error):
+    """Returns the server-suggested wait in seconds for a failed call, or None."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    return headers_retry_after(response.headers)
+
+
+def headers_retry_after(headers):
+    """Returns the wait in seconds suggested by a response's rate-limit headers, or None."""
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms is not None:
+        try:
+            return max(0.0, float(retry_after_ms) / 1000)
+        except ValueError:
+            pass
+    if headers.get("retry-after") is not None:
+        seconds = _parse_retry_after(headers["retry-after"])
+        if seconds is not None:
+            return seconds
+    # Without Retry-After, wait for whichever exhausted window resets last.
+    resets = []
+    for window in ("requests", "tokens"):
+        remaining = headers.get(f"x-ratelimit-remaining-{window}")
+        reset = parse_duration(headers.get(f"x-ratelimit-reset-{window}"))
+        if reset is not None and (remaining is None or remaining.strip() == "0"):
+            resets.append(reset)
+    return max(resets) if resets else None
+
+
+class RetryRecord:
+    """Retries and wait time accumulated by one incoming request."""
+
+    def __init__(self):
+        self.attempts = 0
+        self.retries = 0
+        self.wait_seconds = 0.0
+        self.retry_after = None   # seconds the client should wait when we gave up early
+        self.errors = {}
+
+    def headers(self):
+        if not self.attempts:
+            return {}
+        headers = {
+            "X-Upstream-Retries": str(self.retries),
+            "X-Upstream-Retry-Wait": f"{self.wait_seconds:.3f}",
+        }
+        if self.retry_after is not None:
+            headers["Retry-After"] = str(math.ceil(self.retry_after))
+        return headers
+
+
+_current_record = contextvars.ContextVar("upstream_retry_record", default=None)
+
+
+def begin_request():
+    """Starts a fresh RetryRecord for the current request (or task) and returns it."""
+    record = RetryRecord()
+    _current_record.set(record)
+    return record
+
+
+def end_request():
+    """Forgets the current request's RetryRecord, so nothing on this thread reports it again."""
+    _current_record.set(None)
+
+
+def current_record():
+    return _current_record.get()
+
+
+_current_attempt = contextvars.ContextVar("upstream_retry_attempt", default=1)
+
+
+def current_attempt():
+    """1-based attempt number of the retry loop the caller is running in."""
+    return _current_attempt.get()
+
+
+def note_retry_after(seconds):
+    """Records a wait to suggest to the client of the current request."""
+    record = _current_record.get()
+    if record is not None and seconds is not None:
+        record.retry_after = max(seconds, record.retry_after or 0)
+
+
+class RetriesExhausted(Exception):
+    """Raised when a retryable error could not be recovered within the attempt or wait budget."""
+
+    def __init__(self, kind, error, retry_after=None):
+        super().__init__(f"{kind}: {error}")
+        self.kind = kind
+        self.error = error
+        self.retry_after = retry_after
+
+
+class RetryPolicy:
+    """Decides whether and when to retry a failed upstream call.
+
+    max_attempts bounds the calls per request, max_wait the total seconds spent waiting
+    between them, and max_delay a single backoff step. on_retry(kind), if given, is
+    called for every retry that gets scheduled.
+    """
+
+    def __init__(self, max_attempts=3, base_delay=1.0, max_delay=8.0, max_wait=2.0, jitter=0.1, on_retry=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_wait = max_wait
+        self.jitter = jitter
+        self.on_retry = on_retry
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._retries = {kind: 0 for kind in RETRYABLE_KINDS}
+        self._gave_up = 0
+        self._total_wait = 0.0
+
+    def backoff(self, attempt):
+        """Equal-jitter exponential backoff: half the step plus a random share of the other half."""
+        step = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return step / 2 + random.uniform(0, step / 2)
+
+    def next_delay(self, kind, error, attempt, waited):
+        """Returns (delay, retry_after).
+
+        While retrying, delay is the wait before the next attempt and retry_after the
+        server's hint (or None). When the call should not be retried, delay is None and
+        retry_after is the wait to suggest to the client instead.
+        """
+        if kind not in RETRYABLE_KINDS:
+            return None, None
+        hint = retry_after_hint(error) if kind in (RATE_LIMIT, SERVER_ERROR) else None
+        if hint is not None:
+            # Never wake before the server's hint; spread the wake-ups of concurrent callers.
+            delay = hint + random.uniform(0, self.jitter * max(hint, self.base_delay))
+        else:
+            delay = self.backoff(attempt)
+        if attempt >= self.max_attempts - 1 or waited + delay > self.max_wait:
+            return None, hint if hint is not None else delay
+        return delay, hint
+
+    def _attempt_failed(self, error, attempt, waited, record):
+        kind = classify_error(error)
+        if record is not None:
+            record.errors[kind] = record.errors.get(kind, 0) + 1
+        delay, retry_after = self.next_delay(kind, error, attempt, waited)
+        if kind == NON_RETRYABLE:
+            raise error
+        log.warning("Groq API error (attempt %d, %s): %s", attempt + 1, kind, error)
+        if delay is None:
+            with self._lock:
+                self._gave_up += 1
+            if record is not None:
+                record.retry_after = retry_after
+            raise RetriesExhausted(kind, error, retry_after=retry_after) from error
+        log.info("Retrying in %.2fs%s", delay, " (server hint)" if retry_after is not None else "")
+        with self._lock:
+            self._retries[kind] += 1
+            self._total_wait += delay
+        if record is not None:
+            record.retries += 1
+            record.wait_seconds += delay
+        if self.on_retry is not None:
+            self.on_retry(kind)
+        return delay
+
+    def call(self, fn):
+        """Calls fn() until it succeeds, sleeping between attempts (sync path)."""
+        record, waited = current_record(), 0.0
+        for attempt in range(self.max_attempts):
+            with self._lock:
+                self._calls += 1
+            if record is not None:
+                record.attempts += 1
+            _current_attempt.set(attempt + 1)
+            try:
+                return fn()
+            except Exception as e:
+                delay = self._attempt_failed(e, attempt, waited, record)
+            waited += delay
+            time.sleep(delay)
+
+    async def acall(self, fn):
+        """Awaits fn() until it succeeds; waiting yields to the event loop (async path)."""
+        record, waited = current_record(), 0.0
+        for attempt in range(self.max_attempts):
+            with self._lock:
+                self._calls += 1
+            if record is not None:
+                record.attempts += 1
+            _current_attempt.set(attempt + 1)
+            try:
+                return await fn()
+            except Exception as e:
+                delay = self._attempt_failed(e, attempt, waited, record)
+            waited += delay
+            await asyncio.sleep(delay)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_attempts": self.max_attempts,
+                "max_wait": self.max_wait,
+                "attempts": self._calls,
+                "retries": dict(self._retries),
+                "gave_up": self._gave_up,
+                "total_wait_seconds": round(self._total_wait, 3),
+            }
@@ -0,0 +1,215 @@
+"""
+Managed HTTP transport for the Groq clients.
+
+Both the sync and the async Groq client share one explicitly configured connection
+pool each: tunable size, long-lived keep-alive (so bursts reuse warm TLS connections
+instead of handshaking again), optional HTTP/2 multiplexing, split connect/read
+timeouts, and counters for pool saturation and new connections.
+
+Proxy-related environment variables are ignored (trust_env=False) rather than deleted
+from os.environ.
+"""
+import asyncio
+import logging
+import os
+import threading
+
+import httpx
+
+try:
+    import h2  # noqa: F401  (only needed for HTTP/2)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+log = logging.getLogger("edugen.upstream_transport")
+
+
+def _env_float(name, default):
+    return float(os.getenv(name, default))
+
+
+def transport_settings():
+    """Reads the pool configuration from the environment."""
+    http2 = os.getenv("GROQ_HTTP2", "false").lower() == "true"
+    if http2 and not HTTP2_AVAILABLE:
+        log.warning("GROQ_HTTP2=true but the 'h2' package is not installed; using HTTP/1.1 "
+                    "(install it with: pip install h2)")
+        http2 = False
+    return {
+        "max_connections": int(os.getenv("GROQ_MAX_CONNECTIONS", "100")),
+        "max_keepalive_connections": int(os.getenv("GROQ_MAX_KEEPALIVE_CONNECTIONS", "20")),
+        "keepalive_expiry": _env_float("GROQ_KEEPALIVE_EXPIRY", "120"),
+        "http2": http2,
+        "connect_timeout": _env_float("GROQ_CONNECT_TIMEOUT", "5"),
+        "read_timeout": _env_float("GROQ_READ_TIMEOUT", "60"),
+        "pool_timeout": _env_float("GROQ_POOL_TIMEOUT", "10"),
+    }
+
+
+class TransportStats:
+    """Counts requests, in-flight requests, pool saturation and new TCP/TLS connections."""
+
+    def __init__(self, max_connections):
+        self.max_connections = max_connections
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.saturated = 0        # requests that had to wait for a free pool connection
+        self.connections_opened = 0
+        self.tls_handshakes = 0
+
+    def acquire(self):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            if self.in_flight > self.max_connections:
+                self.saturated += 1
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def trace(self, event_name, info):
+        # httpcore trace callback; fires once per completed connect / TLS handshake.
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self.connections_opened += 1
+        elif event_name == "connection.start_tls.complete":
+            with self._lock:
+                self.tls_handshakes += 1
+
+    async def atrace(self, event_name, info):
+        self.trace(event_name, info)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "max_connections": self.max_connections,
+                "saturated_requests": self.saturated,
+                "connections_opened": self.connections_opened,
+                "tls_handshakes": self.tls_handshakes,
+            }
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Keeps a request counted as in flight until its response body is closed."""
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+        self._released = False
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            if not self._released:
+                self._released = True
+                self._release()
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+        self._released = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                self._release()
+
+
+class InstrumentedTransport(httpx.HTTPTransport):
+    def __init__(self, stats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    def handle_request(self, request):
+        request.extensions["trace"] = self.stats.trace
+        self.stats.acquire()
+        try:
+            response = super().handle_request(request)
+        except BaseException:
+            self.stats.release()
+            raise
+        response.stream = _ReleasingStream(response.stream, self.stats.release)
+        return response
+
+
+class AsyncInstrumentedTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, stats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    async def handle_async_request(self, request):
+        request.extensions["trace"] = self.stats.atrace
+        self.stats.acquire()
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            self.stats.release()
+            raise
+        response.stream = _AsyncReleasingStream(response.stream, self.stats.release)
+        return response
+
+
+def _client_kwargs(settings):
+    limits = httpx.Limits(
+        max_connections=settings["max_connections"],
+        max_keepalive_connections=settings["max_keepalive_connections"],
+        keepalive_expiry=settings["keepalive_expiry"],
+    )
+    timeout = httpx.Timeout(
+        connect=settings["connect_timeout"],
+        read=settings["read_timeout"],
+        write=settings["read_timeout"],
+        pool=settings["pool_timeout"],
+    )
+    return limits, timeout
+
+
+def build_http_client(settings=None, verify=True, on_response=None):
+    """Returns (httpx.Client, TransportStats) for the sync Groq client.
+
+    on_response, if given, is called with every upstream response (an httpx response hook).
+    """
+    settings = settings or transport_settings()
+    limits, timeout = _client_kwargs(settings)
+    stats = TransportStats(settings["max_connections"])
+    transport = InstrumentedTransport(stats, limits=limits, http2=settings["http2"], verify=verify, trust_env=False)
+    hooks = {"response": [on_response]} if on_response else {}
+    return httpx.Client(transport=transport, timeout=timeout, trust_env=False, event_hooks=hooks), stats
+
+
+def build_async_http_client(settings=None, verify=True, on_response=None):
+    """Returns (httpx.AsyncClient, TransportStats) for the async Groq client.
+
+    on_response runs in a worker thread, since it may block (admission takes file locks).
+    """
+    settings = settings or transport_settings()
+    limits, timeout = _client_kwargs(settings)
+    stats = TransportStats(settings["max_connections"])
+    transport = AsyncInstrumentedTransport(stats, limits=limits, http2=settings["http2"], verify=verify, trust_env=False)
+    hooks = {}
+    if on_response:
+        async def response_hook(response):
+            await asyncio.to_thread(on_response, response)
+        hooks = {"response": [response_hook]}
+    return httpx.AsyncClient(transport=transport, timeout=timeout, trust_env=False, event_hooks=hooks), stats